@@ -0,0 +1,392 @@
+"""
+Offline API benchmark: scripted user journeys run against the app in-process.
+
+Each virtual user repeatedly registers, verifies the emailed link, logs in,
+autosaves a synthetic design (element patches, falling back to full saves as
+the editor does), creates / lists / reads / updates / exports / deletes a saved
+session and logs out. MongoDB is mongomock by default, or a local `mongod`
+with --mongo-uri (a throwaway database, dropped first). Email is never sent
+(MAIL_SUPPRESS_SEND) and rate limits are off. Latency percentiles, throughput
+and process RSS are reported per endpoint:
+
+    python -m benchmarks.api_journeys --users 4 --journeys 5 --autosaves 20
+    python -m benchmarks.api_journeys --mongo-uri mongodb://localhost:27017 --output benchmarks/baselines/local.json
+    python -m benchmarks.api_journeys --compare benchmarks/baselines/local.json
+
+--compare exits with status 1 when an endpoint's p95 is more than --tolerance
+(and --floor-ms) slower than the baseline. mongomock does not implement array filters, so on
+mongomock the autosave loop sends full saves only; the wall design PATCH journey is measured
+against mongod.
+"""
+import argparse
+import base64
+import json
+import os
+import platform
+import random
+import resource
+import struct
+import sys
+import tempfile
+import threading
+import time
+import zlib
+from datetime import datetime, timezone
+from benchmarks.http_load import percentile
+
+WALLS = ('front', 'back', 'left', 'right')
+FRAME_TYPES = ('square', 'rounded', 'circle')
+
+
+def synthetic_png(rng, size_bytes):
+    """Valid RGB PNG of random pixels, about `size_bytes` long (noise does not compress)"""
+    side = max(1, int((size_bytes / 3) ** 0.5))
+    rows = b''.join(b'\x00' + rng.randbytes(side * 3) for _ in range(side))
+
+    def chunk(kind, data):
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+
+    return (
+        b'\x89PNG\r\n\x1a\n'
+        + chunk(b'IHDR', struct.pack('>IIBBBBB', side, side, 8, 2, 0, 0, 0))
+        + chunk(b'IDAT', zlib.compress(rows, 1))
+        + chunk(b'IEND', b'')
+    )
+
+
+def synthetic_data_url(rng, size_bytes):
+    return 'data:image/png;base64,' + base64.b64encode(synthetic_png(rng, size_bytes)).decode('ascii')
+
+
+def synthetic_element(rng, element_id, image_bytes=0):
+    """One frame or sticker in the editor's format, with an inline image if `image_bytes`"""
+    element = {
+        'id': element_id,
+        'type': rng.choice(('frame', 'sticker')),
+        'x': rng.randint(0, 800),
+        'y': rng.randint(0, 500),
+        'width': rng.randint(60, 240),
+        'height': rng.randint(60, 240),
+        'rotation': rng.choice((0, 0, 0, 15, -10, 90))
+    }
+    if element['type'] == 'frame':
+        element['frameType'] = rng.choice(FRAME_TYPES)
+        element['borderColor'] = '#%06x' % rng.randrange(0x1000000)
+    if image_bytes:
+        element['content'] = synthetic_data_url(rng, image_bytes)
+    return element
+
+
+def synthetic_design(rng, elements=12, images=4, image_bytes=24 * 1024):
+    """Editor payload with `elements` spread over the walls, the first `images` of them with inline PNGs"""
+    wall_designs = {wall: {'elements': [], 'wallpaper': None} for wall in WALLS}
+    for index in range(elements):
+        element = synthetic_element(rng, f'el-{index}', image_bytes if index < images else 0)
+        wall_designs[WALLS[index % len(WALLS)]]['elements'].append(element)
+    return {
+        'wallDesigns': wall_designs,
+        'roomType': rng.choice(('living', 'bedroom', 'office')),
+        'roomDimensions': {'width': 8, 'length': 8, 'height': 4},
+        'selectedWall': 'front'
+    }
+
+
+def rss_bytes():
+    """Current resident set size of this process (peak size where /proc is unavailable)"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class Recorder:
+    """Collects latency, status and RSS growth per endpoint across client threads"""
+
+    def __init__(self):
+        self.samples = {}
+        self._lock = threading.Lock()
+
+    def record(self, endpoint, seconds, ok, rss_growth, rss):
+        with self._lock:
+            entry = self.samples.setdefault(endpoint, {'latencies': [], 'errors': 0, 'rss_growth': 0, 'rss_max': 0})
+            if ok:
+                entry['latencies'].append(seconds)
+            else:
+                entry['errors'] += 1
+            entry['rss_growth'] += rss_growth
+            entry['rss_max'] = max(entry['rss_max'], rss)
+
+    def summary(self, elapsed):
+        """{endpoint: stats} plus a 'total' entry, latencies in ms and memory in MB"""
+        def stats(latencies, errors, rss_growth, rss_max):
+            latencies = sorted(latencies)
+            return {
+                'requests': len(latencies),
+                'errors': errors,
+                'rps': round(len(latencies) / elapsed, 1) if elapsed else None,
+                'mean_ms': round(sum(latencies) / len(latencies) * 1000, 2) if latencies else None,
+                'p50_ms': round(percentile(latencies, 0.50) * 1000, 2) if latencies else None,
+                'p95_ms': round(percentile(latencies, 0.95) * 1000, 2) if latencies else None,
+                'p99_ms': round(percentile(latencies, 0.99) * 1000, 2) if latencies else None,
+                'rss_growth_mb': round(rss_growth / 2 ** 20, 2),
+                'rss_max_mb': round(rss_max / 2 ** 20, 1)
+            }
+
+        endpoints = {name: stats(**entry) for name, entry in sorted(self.samples.items())}
+        total = stats(
+            [seconds for entry in self.samples.values() for seconds in entry['latencies']],
+            sum(entry['errors'] for entry in self.samples.values()),
+            sum(entry['rss_growth'] for entry in self.samples.values()),
+            max((entry['rss_max'] for entry in self.samples.values()), default=0)
+        )
+        return endpoints, total
+
+
+class Journey:
+    """One virtual user's test client, timing every call it makes"""
+
+    def __init__(self, app, db, recorder, rng, options):
+        self.client = app.test_client()
+        self.db = db
+        self.recorder = recorder
+        self.rng = rng
+        self.options = options
+
+    def call(self, endpoint, method, path, expect=(200,), **kwargs):
+        rss = rss_bytes()
+        started = time.perf_counter()
+        response = self.client.open(path, method=method, **kwargs)
+        response.get_data()  # Drain streamed bodies (session lists, exports) inside the timing
+        seconds = time.perf_counter() - started
+        after = rss_bytes()
+        self.recorder.record(endpoint, seconds, response.status_code in expect, max(0, after - rss), after)
+        return response
+
+    def run(self, name):
+        options = self.options
+        password = 'Bench-password-1'
+        email = f'{name}@bench.example.com'
+
+        self.call('POST /api/auth/register', 'POST', '/api/auth/register', expect=(201,),
+                  json={'username': name, 'password': password, 'email': email})
+        # The token the verification email links to
+        user = self.db.users.find_one({'email_lower': email}, {'verification_token': 1})
+        self.call('GET /api/auth/verify-email', 'GET', '/api/auth/verify-email',
+                  query_string={'token': user['verification_token']})
+        self.call('POST /api/auth/login', 'POST', '/api/auth/login', json={'username': name, 'password': password})
+        self.call('GET /api/auth/status', 'GET', '/api/auth/status')
+        self.call('GET /api/designs/wall-designs', 'GET', '/api/designs/wall-designs')
+
+        design = synthetic_design(self.rng, options.elements, options.images, options.image_kb * 1024)
+        self.autosave(design)
+
+        response = self.call('POST /api/sessions', 'POST', '/api/sessions', expect=(201,), json={
+            'session_name': f'{name} room',
+            'room_type': design['roomType'],
+            'room_dimensions': design['roomDimensions'],
+            'wall_designs': design['wallDesigns'],
+            'selected_wall': design['selectedWall']
+        })
+        session_id = (response.get_json() or {}).get('session', {}).get('_id')
+        self.call('GET /api/sessions', 'GET', '/api/sessions')
+        self.call('GET /api/sessions?format=ndjson', 'GET', '/api/sessions', query_string={'format': 'ndjson'})
+        if session_id:
+            self.call('GET /api/sessions/<id>', 'GET', f'/api/sessions/{session_id}')
+            self.call('PUT /api/sessions/<id>', 'PUT', f'/api/sessions/{session_id}', json={
+                'session_name': f'{name} room (edited)',
+                'wall_designs': design['wallDesigns']
+            })
+            if options.export:
+                self.call('GET /api/sessions/<id>/export', 'GET', f'/api/sessions/{session_id}/export')
+            self.call('DELETE /api/sessions/<id>', 'DELETE', f'/api/sessions/{session_id}')
+        self.call('GET /api/designs/wall-designs/history', 'GET', '/api/designs/wall-designs/history')
+        self.call('POST /api/auth/logout', 'POST', '/api/auth/logout')
+
+    def autosave(self, design):
+        """Full save, then element patches (moves, and now and then a new image), as the editor sends them"""
+        response = self.call('POST /api/designs/wall-designs', 'POST', '/api/designs/wall-designs', json=design)
+        revision = (response.get_json() or {}).get('revision')
+        elements = [(wall, element) for wall in WALLS for element in design['wallDesigns'][wall]['elements']]
+
+        for step in range(self.options.autosaves):
+            if step % 10 == 9 or not elements:
+                element = synthetic_element(self.rng, f'new-{step}', self.options.image_kb * 1024)
+                wall = self.rng.choice(WALLS)
+                design['wallDesigns'][wall]['elements'].append(element)
+                elements.append((wall, element))
+                operation = {'op': 'add', 'wall': wall, 'element': element}
+            else:
+                wall, element = self.rng.choice(elements)
+                element['x'], element['y'] = self.rng.randint(0, 800), self.rng.randint(0, 500)
+                operation = {'op': 'move', 'wall': wall, 'id': element['id'], 'x': element['x'], 'y': element['y']}
+
+            if revision and self.options.patches:
+                response = self.call('PATCH /api/designs/wall-designs', 'PATCH', '/api/designs/wall-designs',
+                                     json={'baseRevision': revision, 'operations': [operation]})
+                if response.status_code == 200:
+                    revision = response.get_json()['revision']
+                    continue
+            response = self.call('POST /api/designs/wall-designs', 'POST', '/api/designs/wall-designs', json=design)
+            revision = (response.get_json() or {}).get('revision')
+
+
+def configure_environment(options, scratch_dir):
+    """Settings for an offline run; must be applied before the app (and its config) is imported"""
+    os.environ.update({
+        'MAIL_SUPPRESS_SEND': 'true',
+        'MAIL_DEFAULT_SENDER': os.getenv('MAIL_DEFAULT_SENDER') or 'benchmark@example.com',
+        'RATE_LIMIT_ENABLED': 'false',
+        'SCHEMA_CHECK_ON_STARTUP': 'false',
+        'HEALTH_CHECK_INTERVAL': '0',
+        'ADMIN_STATS_REFRESH_INTERVAL': '0',
+        'IMAGE_DERIVATIVE_PREBUILD_WIDTHS': '',
+        'LOG_LEVEL': os.getenv('LOG_LEVEL', 'WARNING'),
+        'ASSET_STORAGE_DIR': os.path.join(scratch_dir, 'assets'),
+        'EXPORT_CACHE_DIR': os.path.join(scratch_dir, 'exports'),
+        'USER_CACHE_SHARED_PATH': ''
+    })
+    if options.mongo_uri:
+        os.environ['MONGO_URI'] = options.mongo_uri
+        os.environ['MONGO_DB_NAME'] = options.database
+
+
+def load_app(options):
+    """Import the app against mongomock or the benchmark database, with the schema applied"""
+    from configs import mongo
+    if not options.mongo_uri:
+        try:
+            import mongomock
+        except ImportError:
+            raise SystemExit('Install mongomock (pip install -r requirements-dev.txt) or pass --mongo-uri')
+        mongo.use_client(mongomock.MongoClient())
+    else:
+        mongo.get_client().drop_database(options.database)
+
+    from configs.schema import apply_schema
+    from routes.app import app, start_worker_services
+    apply_schema(mongo.db)
+    start_worker_services()
+    return app, mongo.db
+
+
+def run(options):
+    """Run the journeys and return the report (also what --output writes)"""
+    # mongomock rejects every array-filter update, so patches would only time the failure
+    options.patches = bool(options.mongo_uri)
+    with tempfile.TemporaryDirectory(prefix='api-journeys-') as scratch_dir:
+        configure_environment(options, scratch_dir)
+        app, db = load_app(options)
+        recorder = Recorder()
+        run_id = f'{int(time.time())}{os.getpid()}'
+        rss_start = rss_bytes()
+
+        def user(index):
+            journey = Journey(app, db, recorder, random.Random(options.seed + index), options)
+            for number in range(options.journeys):
+                journey.run(f'bench{run_id}u{index}j{number}')
+
+        # One unmeasured journey so imports, pools and caches are warm
+        Journey(app, db, Recorder(), random.Random(options.seed - 1), options).run(f'bench{run_id}warmup')
+
+        started = time.perf_counter()
+        threads = [threading.Thread(target=user, args=(index,)) for index in range(options.users)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        endpoints, total = recorder.summary(elapsed)
+        if options.mongo_uri:
+            from configs.mongo import get_client
+            get_client().drop_database(options.database)
+
+    return {
+        'meta': {
+            'created_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'mongo': 'mongod' if options.mongo_uri else 'mongomock',
+            'options': {
+                key: getattr(options, key)
+                for key in ('users', 'journeys', 'autosaves', 'elements', 'images', 'image_kb', 'export', 'patches', 'seed')
+            }
+        },
+        'elapsed_s': round(elapsed, 2),
+        'rss_start_mb': round(rss_start / 2 ** 20, 1),
+        'total': total,
+        'endpoints': endpoints
+    }
+
+
+def compare(report, baseline, tolerance, floor_ms=2.0):
+    """Endpoints whose p95 grew by more than `tolerance` (and `floor_ms`) over the baseline"""
+    regressions = []
+    for endpoint, current in report['endpoints'].items():
+        previous = baseline.get('endpoints', {}).get(endpoint)
+        if not previous or previous.get('p95_ms') is None or current['p95_ms'] is None:
+            continue
+        if current['p95_ms'] > previous['p95_ms'] * (1 + tolerance) and current['p95_ms'] - previous['p95_ms'] > floor_ms:
+            regressions.append((endpoint, previous['p95_ms'], current['p95_ms']))
+    return regressions
+
+
+def print_report(report):
+    print(f"{'endpoint':<40} {'ok':>6} {'err':>5} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'RSS +MB':>8}")
+    rows = list(report['endpoints'].items()) + [('total', report['total'])]
+    for endpoint, stats in rows:
+        print(
+            f"{endpoint:<40} {stats['requests']:>6} {stats['errors']:>5} {stats['rps']:>8} "
+            f"{stats['p50_ms']!s:>8} {stats['p95_ms']!s:>8} {stats['p99_ms']!s:>8} {stats['rss_growth_mb']:>8}"
+        )
+    print(
+        f"{report['elapsed_s']} s, {report['meta']['mongo']}, "
+        f"RSS {report['rss_start_mb']} -> {report['total']['rss_max_mb']} MB"
+    )
+
+
+def main(argv=None):
+    """Run the user journeys offline and print per-endpoint latency, throughput and memory"""
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.api_journeys', description=main.__doc__)
+    parser.add_argument('--users', type=int, default=4, help='concurrent virtual users')
+    parser.add_argument('--journeys', type=int, default=3, help='journeys per user')
+    parser.add_argument('--autosaves', type=int, default=20, help='autosaves per journey')
+    parser.add_argument('--elements', type=int, default=12, help='elements in the synthetic design')
+    parser.add_argument('--images', type=int, default=4, help='elements with an inline data URL image')
+    parser.add_argument('--image-kb', type=int, default=24, help='size of each synthetic image')
+    parser.add_argument('--no-export', dest='export', action='store_false', help='skip the ZIP export (needs Pillow)')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--mongo-uri', help='local mongod instead of mongomock')
+    parser.add_argument('--database', default='altarmaker_benchmark', help='database used (and dropped) on mongod')
+    parser.add_argument('--output', help='write the report as JSON, e.g. a new baseline')
+    parser.add_argument('--compare', help='baseline JSON to check for p95 regressions')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed p95 slowdown, 0.25 = 25%%')
+    parser.add_argument('--floor-ms', type=float, default=2.0, help='ignore p95 slowdowns smaller than this')
+    options = parser.parse_args(argv)
+
+    report = run(options)
+    print_report(report)
+
+    if options.output:
+        os.makedirs(os.path.dirname(os.path.abspath(options.output)), exist_ok=True)
+        with open(options.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {options.output}")
+
+    if options.compare:
+        with open(options.compare) as f:
+            baseline = json.load(f)
+        if baseline.get('meta', {}).get('mongo') != report['meta']['mongo']:
+            print(f"Warning: the baseline ran on {baseline.get('meta', {}).get('mongo')}, this run on {report['meta']['mongo']}")
+        regressions = compare(report, baseline, options.tolerance, options.floor_ms)
+        for endpoint, before, after in regressions:
+            print(f"REGRESSION {endpoint}: p95 {before} ms -> {after} ms")
+        if regressions:
+            sys.exit(1)
+        print(f"No p95 regressions beyond {options.tolerance:.0%} against {options.compare}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+"""
+Closed-loop HTTP load generator (standard library only).
+
+Each client thread keeps one keep-alive connection and sends requests back to
+back for the given duration, then requests/second and latency percentiles are
+printed:
+
+    python -m benchmarks.http_load http://127.0.0.1:5000/api/health/live -c 16 -d 15
+"""
+import argparse
+import http.client
+import threading
+import time
+from urllib.parse import urlsplit
+
+
+def percentile(ordered, fraction):
+    """Value at `fraction` (0-1) of an ascending list"""
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def run(url, concurrency=16, duration=15.0, warmup=2.0):
+    """Load `url` and return {'requests', 'errors', 'rps', 'p50_ms', 'p95_ms', 'p99_ms'}"""
+    parts = urlsplit(url)
+    path = parts.path or '/'
+    if parts.query:
+        path += '?' + parts.query
+    connection_class = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+
+    started = time.perf_counter()
+    measure_from = started + warmup
+    stop_at = measure_from + duration
+    latencies, errors = [], [0]
+    lock = threading.Lock()
+
+    def client():
+        connection = connection_class(parts.netloc, timeout=10)
+        local, local_errors = [], 0
+        while True:
+            sent = time.perf_counter()
+            if sent >= stop_at:
+                break
+            ok = False
+            # Retry once on a fresh connection, as browsers do when a kept-alive one was closed
+            for _ in range(2):
+                try:
+                    connection.request('GET', path)
+                    response = connection.getresponse()
+                    response.read()
+                    ok = response.status < 500
+                    break
+                except (OSError, http.client.HTTPException):
+                    connection.close()
+                    connection = connection_class(parts.netloc, timeout=10)
+            if sent >= measure_from:
+                if ok:
+                    local.append(time.perf_counter() - sent)
+                else:
+                    local_errors += 1
+        connection.close()
+        with lock:
+            latencies.extend(local)
+            errors[0] += local_errors
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'errors': errors[0],
+        'rps': round(len(latencies) / duration, 1),
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 2) if latencies else None,
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 2) if latencies else None,
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 2) if latencies else None
+    }
+
+
+def main(argv=None):
+    """Load one URL from the command line and print the results"""
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.http_load', description=main.__doc__)
+    parser.add_argument('url')
+    parser.add_argument('-c', '--concurrency', type=int, default=16, help='client connections')
+    parser.add_argument('-d', '--duration', type=float, default=15, help='measured seconds')
+    parser.add_argument('-w', '--warmup', type=float, default=2, help='unmeasured seconds first')
+    args = parser.parse_args(argv)
+
+    result = run(args.url, args.concurrency, args.duration, args.warmup)
+    print(
+        f"{result['rps']} req/s  p50 {result['p50_ms']} ms  p95 {result['p95_ms']} ms  "
+        f"p99 {result['p99_ms']} ms  ({result['requests']} ok, {result['errors']} errors)"
+    )
+
+
+if __name__ == '__main__':
+    main()
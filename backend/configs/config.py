@@ -11,10 +11,19 @@ class Config:
     # Flask Configuration
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'dev-key-please-change-in-production'
     SECURITY_PASSWORD_SALT = os.environ.get('SECURITY_PASSWORD_SALT') or 'email-verification-salt'
-    DEBUG = os.getenv('FLASK_DEBUG', 'true').lower() == 'true'
+    DEBUG = os.getenv('FLASK_DEBUG', 'false').lower() == 'true'
     
     # MongoDB Configuration
     MONGO_URI = os.environ.get('MONGO_URI') or 'mongodb://localhost:27017/altarmaker'
+    MONGO_DB_NAME = os.getenv('MONGO_DB_NAME', 'altarmaker')
+    MONGO_MAX_POOL_SIZE = int(os.getenv('MONGO_MAX_POOL_SIZE', 50))  # Per process
+    MONGO_MIN_POOL_SIZE = int(os.getenv('MONGO_MIN_POOL_SIZE', 0))
+    MONGO_MAX_IDLE_TIME_MS = int(os.getenv('MONGO_MAX_IDLE_TIME_MS', 60000))
+    MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv('MONGO_WAIT_QUEUE_TIMEOUT_MS', 2000))  # Fail fast when the pool is exhausted
+    MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv('MONGO_SERVER_SELECTION_TIMEOUT_MS', 5000))
+    MONGO_CONNECT_TIMEOUT_MS = int(os.getenv('MONGO_CONNECT_TIMEOUT_MS', 5000))
+    MONGO_SOCKET_TIMEOUT_MS = int(os.getenv('MONGO_SOCKET_TIMEOUT_MS', 20000))
+    MONGO_READ_PREFERENCE = os.getenv('MONGO_READ_PREFERENCE', 'primary')
     
     # Session Configuration
     SESSION_EXPIRATION = 24 * 60 * 60  # 24 hours
@@ -29,6 +38,80 @@ class Config:
     MAIL_USERNAME = os.getenv('MAIL_USERNAME')
     MAIL_PASSWORD = os.getenv('MAIL_PASSWORD')
     MAIL_DEFAULT_SENDER = os.getenv('MAIL_DEFAULT_SENDER')
+    MAIL_SUPPRESS_SEND = os.getenv('MAIL_SUPPRESS_SEND', 'false').lower() == 'true'  # Record emails as sent without connecting to SMTP
+    
+    # Email Delivery (outbox worker)
+    EMAIL_OUTBOX_WORKER = os.getenv('EMAIL_OUTBOX_WORKER', 'thread')  # 'thread' or 'off' when run as a separate process
+    EMAIL_OUTBOX_BATCH_SIZE = int(os.getenv('EMAIL_OUTBOX_BATCH_SIZE', 20))  # Messages claimed per batch
+    EMAIL_OUTBOX_MAX_ATTEMPTS = int(os.getenv('EMAIL_OUTBOX_MAX_ATTEMPTS', 6))
+    EMAIL_OUTBOX_RETRY_DELAY = int(os.getenv('EMAIL_OUTBOX_RETRY_DELAY', 30))  # Seconds, doubled per attempt
+    EMAIL_OUTBOX_POLL_INTERVAL = float(os.getenv('EMAIL_OUTBOX_POLL_INTERVAL', 5))  # Seconds between idle polls
+    EMAIL_OUTBOX_LEASE = int(os.getenv('EMAIL_OUTBOX_LEASE', 120))  # Seconds before a stuck claim is retried
+    EMAIL_SMTP_TIMEOUT = float(os.getenv('EMAIL_SMTP_TIMEOUT', 10))
+    EMAIL_SMTP_IDLE_TIMEOUT = float(os.getenv('EMAIL_SMTP_IDLE_TIMEOUT', 30))  # Close the SMTP connection after this idle time
+    
+    # Session Listing
+    SESSIONS_MAX_PAGE_SIZE = int(os.getenv('SESSIONS_MAX_PAGE_SIZE', 100))  # Upper bound for GET /api/sessions?limit=
+    
+    # Admin User Listing
+    ADMIN_USERS_PAGE_SIZE = int(os.getenv('ADMIN_USERS_PAGE_SIZE', 50))
+    ADMIN_USERS_MAX_PAGE_SIZE = int(os.getenv('ADMIN_USERS_MAX_PAGE_SIZE', 500))
+    
+    # Admin Dashboard Statistics
+    ADMIN_STATS_REFRESH_INTERVAL = float(os.getenv('ADMIN_STATS_REFRESH_INTERVAL', 60))  # Seconds, 0 disables the background refresh
+    ADMIN_STATS_DAYS = int(os.getenv('ADMIN_STATS_DAYS', 30))  # Days of signups / sessions per day
+    
+    # Public Feedback Feed
+    FEEDBACK_PAGE_SIZE = int(os.getenv('FEEDBACK_PAGE_SIZE', 20))
+    FEEDBACK_MAX_PAGE_SIZE = int(os.getenv('FEEDBACK_MAX_PAGE_SIZE', 50))  # Hard cap on ?limit=
+    FEEDBACK_CACHE_TTL = float(os.getenv('FEEDBACK_CACHE_TTL', 60))  # Seconds a cached page is served
+    
+    # Rate Limiting (token buckets: "<count>/<period>", e.g. "10/minute" or "5/15minutes")
+    RATE_LIMIT_ENABLED = os.getenv('RATE_LIMIT_ENABLED', 'True').lower() in ('true', '1', 't')
+    RATE_LIMIT_STORAGE_URL = os.getenv('RATE_LIMIT_STORAGE_URL', '')  # redis://... to share buckets between workers
+    RATE_LIMIT_PROXY_COUNT = int(os.getenv('RATE_LIMIT_PROXY_COUNT', 0))  # Trusted proxies setting X-Forwarded-For
+    RATE_LIMIT_LOGIN_IP = os.getenv('RATE_LIMIT_LOGIN_IP', '20/minute')
+    RATE_LIMIT_LOGIN_ACCOUNT = os.getenv('RATE_LIMIT_LOGIN_ACCOUNT', '10/15minutes')
+    RATE_LIMIT_REGISTER_IP = os.getenv('RATE_LIMIT_REGISTER_IP', '10/hour')
+    RATE_LIMIT_RESEND_IP = os.getenv('RATE_LIMIT_RESEND_IP', '5/hour')
+    RATE_LIMIT_RESEND_ACCOUNT = os.getenv('RATE_LIMIT_RESEND_ACCOUNT', '3/hour')
+    RATE_LIMIT_FEEDBACK_IP = os.getenv('RATE_LIMIT_FEEDBACK_IP', '5/10minutes')
+    
+    # Password Hashing
+    PASSWORD_HASH_SCHEME = os.getenv('PASSWORD_HASH_SCHEME', 'bcrypt')  # 'bcrypt', 'scrypt' or 'pbkdf2'
+    PASSWORD_HASH_COST = int(os.getenv('PASSWORD_HASH_COST', 0))  # bcrypt rounds / scrypt N / pbkdf2 iterations, 0 for the default
+    PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', 2))  # Hashing processes per server worker, 0 hashes inline
+    PASSWORD_HASH_QUEUE_SIZE = int(os.getenv('PASSWORD_HASH_QUEUE_SIZE', 8))  # Waiting hashes before requests get a 503
+    PASSWORD_HASH_TIMEOUT = float(os.getenv('PASSWORD_HASH_TIMEOUT', 10))  # Seconds
+    
+    # Auth Status User Cache
+    USER_CACHE_TTL = float(os.getenv('USER_CACHE_TTL', 30))  # Seconds
+    USER_CACHE_MAX_ENTRIES = int(os.getenv('USER_CACHE_MAX_ENTRIES', 10000))  # Per process
+    USER_CACHE_SHARED_PATH = os.getenv('USER_CACHE_SHARED_PATH', '')  # SQLite file shared by workers on one host
+    USER_CACHE_LOCAL_TTL = float(os.getenv('USER_CACHE_LOCAL_TTL', 5))  # In-process TTL when the shared cache is on
+    USER_CACHE_SYNC_INTERVAL = float(os.getenv('USER_CACHE_SYNC_INTERVAL', 1))  # Seconds between reads of other workers' invalidations, 0 disables
+    
+    # Health Monitoring
+    HEALTH_CHECK_INTERVAL = float(os.getenv('HEALTH_CHECK_INTERVAL', 10))  # Seconds between MongoDB pings, 0 pings when probed instead
+    HEALTH_SMTP_CHECK_INTERVAL = float(os.getenv('HEALTH_SMTP_CHECK_INTERVAL', 60))
+    HEALTH_STALE_AFTER = float(os.getenv('HEALTH_STALE_AFTER', 35))  # Older results are reported as unknown
+    
+    # Logging
+    LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+    LOG_LEVELS = os.getenv('LOG_LEVELS', '')  # Per-logger overrides, e.g. 'pymongo=WARNING,services.email_outbox=DEBUG'
+    LOG_FORMAT = os.getenv('LOG_FORMAT', 'json')  # 'json' or 'text'
+    LOG_DEBUG_SAMPLE_RATE = float(os.getenv('LOG_DEBUG_SAMPLE_RATE', 0.1))  # Share of DEBUG records kept
+    LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', 10000))  # Records waiting to be written before new ones are dropped
+    
+    # Metrics
+    METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'true').lower() == 'true'  # Prometheus metrics on /metrics (needs prometheus_client)
+    SERVER_TIMING = os.getenv('SERVER_TIMING', 'false').lower() == 'true'  # Server-Timing header with db / hash / serialize / email time
+    
+    # Database Schema
+    SCHEMA_CHECK_ON_STARTUP = os.getenv('SCHEMA_CHECK_ON_STARTUP', 'true').lower() == 'true'  # Warn about missing indexes / pending migrations
+    
+    # Async API (routes.async_app)
+    ASYNC_FLASK_THREADS = int(os.getenv('ASYNC_FLASK_THREADS', 10))  # Threads running the Flask routes the async app does not serve
     
     # Email Verification
     EMAIL_VERIFICATION_EXPIRE = 24 * 60 * 60  # 24 hours
@@ -37,6 +120,43 @@ class Config:
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
     APP_URL = os.getenv('APP_URL', 'http://localhost:3000')  # Frontend URL
     
+    # Wall Design History
+    WALL_DESIGN_HISTORY_LIMIT = int(os.getenv('WALL_DESIGN_HISTORY_LIMIT', 20))  # Snapshots kept per user, 0 keeps none
+    WALL_DESIGN_SNAPSHOT_INTERVAL = int(os.getenv('WALL_DESIGN_SNAPSHOT_INTERVAL', 5 * 60))  # Seconds between snapshots
+    
+    # Asset Storage (uploaded images)
+    ASSET_STORAGE = os.getenv('ASSET_STORAGE', 'local')  # 'local' or 'gridfs'
+    ASSET_STORAGE_DIR = os.getenv('ASSET_STORAGE_DIR') or os.path.join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'instance', 'assets'
+    )
+    ASSET_BASE_URL = os.getenv('ASSET_BASE_URL', '')  # For links in responses; defaults to the API host of the request
+    
+    # Static Frontend Serving
+    STATIC_ROOT = os.getenv('STATIC_ROOT') or os.path.join(
+        os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'frontend', 'dist'
+    )
+    STATIC_CACHE_DIR = os.getenv('STATIC_CACHE_DIR') or os.path.join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'instance', 'static-cache'
+    )
+    STATIC_PRECOMPRESS = os.getenv('STATIC_PRECOMPRESS', 'true').lower() == 'true'
+    
+    # Image Derivatives (thumbnails / WebP variants)
+    IMAGE_CATALOG_ROOT = os.getenv('IMAGE_CATALOG_ROOT') or os.path.join(
+        os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'frontend', 'public'
+    )
+    IMAGE_DERIVATIVE_CACHE_DIR = os.getenv('IMAGE_DERIVATIVE_CACHE_DIR') or os.path.join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'instance', 'derivatives'
+    )
+    IMAGE_DERIVATIVE_WIDTHS = [int(w) for w in os.getenv('IMAGE_DERIVATIVE_WIDTHS', '64,128,256,512,1024').split(',') if w]
+    IMAGE_DERIVATIVE_PREBUILD_WIDTHS = [int(w) for w in os.getenv('IMAGE_DERIVATIVE_PREBUILD_WIDTHS', '128').split(',') if w]
+    IMAGE_DERIVATIVE_WORKERS = int(os.getenv('IMAGE_DERIVATIVE_WORKERS', 2))
+    
+    # Wall Design ZIP Export
+    EXPORT_CACHE_DIR = os.getenv('EXPORT_CACHE_DIR') or os.path.join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'instance', 'exports'
+    )
+    EXPORT_WORKERS = int(os.getenv('EXPORT_WORKERS', 2))  # Render processes
+    
     @staticmethod
     def init_app(app):
         """Initialize application with configuration"""
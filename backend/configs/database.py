@@ -1,8 +1,9 @@
-from pymongo import MongoClient
 from pymongo.errors import ConnectionFailure, ServerSelectionTimeoutError
 import os
 from dotenv import load_dotenv
 import logging
+from configs.schema import apply_schema
+from configs.mongo import db, get_client, close_client
 
 # Load environment variables
 load_dotenv()
@@ -12,22 +13,18 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
-client = MongoClient(os.getenv('MONGO_URI'))
-db = client.altarmaker
-
 class DatabaseManager:
     def __init__(self):
         self.client = None
         self.db = None
-        self.mongo_uri = os.getenv('MONGO_URI')
         
     def connect(self):
-        """Connect to MongoDB"""
+        """Connect to MongoDB through the shared pool"""
         try:
-            self.client = MongoClient(self.mongo_uri, serverSelectionTimeoutMS=5000)
+            self.client = get_client()
             # Test the connection
             self.client.admin.command('ping')
-            self.db = self.client.altarmaker
+            self.db = db
             logger.info("Successfully connected to MongoDB")
             return True
         except (ConnectionFailure, ServerSelectionTimeoutError) as e:
@@ -40,27 +37,14 @@ class DatabaseManager:
     def disconnect(self):
         """Disconnect from MongoDB"""
         if self.client:
-            self.client.close()
+            close_client()
+            self.client = None
             logger.info("Disconnected from MongoDB")
     
     def create_indexes(self):
-        """Create database indexes for better performance"""
+        """Run pending migrations and create the indexes declared in configs/schema.py"""
         try:
-            # Users collection indexes
-            self.db.users.create_index("username", unique=True)
-            self.db.users.create_index("email", unique=True)
-            self.db.users.create_index("role")
-            self.db.users.create_index("created_at")
-            
-            # Sessions collection indexes
-            self.db.sessions.create_index("user_id")
-            self.db.sessions.create_index("created_at")
-            self.db.sessions.create_index([("user_id", 1), ("created_at", -1)])
-            
-
-            
-            logger.info("Database indexes created successfully")
-            return True
+            return apply_schema(self.db)
         except Exception as e:
             logger.error(f"Error creating indexes: {e}")
             return False
@@ -101,34 +85,9 @@ class DatabaseManager:
 db_manager = DatabaseManager()
 
 def init_database():
-    """Initialize database connection and create indexes"""
+    """Initialize database connection, run migrations and create indexes"""
     if db_manager.connect():
-        try:
-            # Create indexes for better performance
-            db = db_manager.db
-            
-            # Users collection indexes
-            db.users.create_index("username", unique=True)
-            db.users.create_index("email", unique=True)
-            db.users.create_index("role")
-            db.users.create_index("created_at")
-            
-            # Sessions collection indexes
-            db.sessions.create_index("user_id")
-            db.sessions.create_index("created_at")
-            db.sessions.create_index([("user_id", 1), ("created_at", -1)])
-            
-            # Wall designs collection indexes (new)
-            db.wall_designs.create_index("user_id")
-            db.wall_designs.create_index("created_at")
-            db.wall_designs.create_index([("user_id", 1), ("created_at", -1)])
-            db.wall_designs.create_index("room_type")
-            
-            logger.info("Database indexes created successfully")
-            return True
-        except Exception as e:
-            logger.error(f"Error creating indexes: {e}")
-            return False
+        return db_manager.create_indexes()
     else:
         return False
 
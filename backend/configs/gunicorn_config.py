@@ -0,0 +1,102 @@
+"""
+Gunicorn settings for serving the API in production.
+
+    gunicorn -c configs/gunicorn_config.py routes.app:app
+
+Worker and thread counts are derived from the CPUs available to the process
+and can be overridden with the GUNICORN_* environment variables below. The app
+is imported once in the master (GUNICORN_PRELOAD), which also builds the static
+manifest and catalog thumbnails, and each forked worker then opens its own
+MongoDB pool and starts its background threads in `post_fork`. Importing the
+app starts nothing, so the master holds no threads or connections when it forks.
+
+Reloading:
+    kill -HUP <master pid>    restart workers gracefully with the current code
+                              (re-reads this file; with preload, code changes
+                              need USR2 to start a new master, then QUIT the old one)
+    kill -TERM <master pid>   graceful shutdown, waiting up to graceful_timeout
+"""
+import os
+
+
+def _cpu_count():
+    # Respect container / taskset CPU limits where the platform reports them
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+cpus = _cpu_count()
+
+bind = os.getenv('GUNICORN_BIND', f"0.0.0.0:{os.getenv('PORT', 5000)}")
+
+# 'gthread' (default), 'gevent' (needs the gevent package), 'sync', or
+# 'uvicorn.workers.UvicornWorker' for the ASGI app (routes.async_app:app, install
+# requirements-async.txt)
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gthread')
+
+# Requests mostly wait on MongoDB and password hashing runs in its own pool, so a
+# few threaded workers per CPU go further than many single-threaded ones
+if worker_class == 'gthread':
+    default_workers = cpus + 1
+elif worker_class == 'gevent' or 'uvicorn' in worker_class.lower():
+    # One event loop per CPU
+    default_workers = cpus
+else:
+    default_workers = cpus * 2 + 1
+workers = int(os.getenv('GUNICORN_WORKERS', 0)) or default_workers
+threads = int(os.getenv('GUNICORN_THREADS', 4))  # Per worker, gthread only
+worker_connections = int(os.getenv('GUNICORN_WORKER_CONNECTIONS', 1000))  # Per worker, gevent only
+
+# gevent must patch the standard library before the app creates its threads and
+# locks, which preloading in the master would do first
+preload_app = os.getenv('GUNICORN_PRELOAD', 'true').lower() == 'true' and worker_class != 'gevent'
+
+# Recycle workers now and then so slow leaks cannot grow unbounded; the jitter
+# keeps them from all restarting at once
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', 2000))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', 200))
+
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 30))  # Seconds before a silent worker is killed
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', 30))  # Seconds to finish in-flight requests
+# Keep above the idle timeout of the load balancer in front, or it may reuse a closed connection
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', 75))
+
+accesslog = os.getenv('GUNICORN_ACCESS_LOG') or None  # '-' for stdout
+errorlog = '-'
+loglevel = os.getenv('GUNICORN_LOG_LEVEL', 'info')
+forwarded_allow_ips = os.getenv('FORWARDED_ALLOW_IPS', '127.0.0.1')
+
+
+def post_fork(server, worker):
+    """Give each preloaded worker its own MongoDB pool and background threads"""
+    if server.cfg.preload_app:
+        from routes.app import start_worker_services
+        start_worker_services()
+
+
+def post_worker_init(worker):
+    """Without preloading each worker imports the app itself, then starts its services"""
+    if not worker.cfg.preload_app:
+        from routes.app import start_worker_services
+        start_worker_services()
+
+
+def child_exit(server, worker):
+    """Drop a dead worker's live gauges from the shared metrics (PROMETHEUS_MULTIPROC_DIR)"""
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
+
+
+def when_ready(server):
+    if server.cfg.preload_app:
+        # Once, before any worker is forked (rendered in this thread so no pool threads are left)
+        from routes.app import prepare_assets
+        prepare_assets(wait=True)
+    server.log.info(
+        f"Serving with {workers} {worker_class} worker(s)"
+        + (f" x {threads} threads" if worker_class == 'gthread' else '')
+        + f" on {cpus} CPU(s), preload={preload_app}"
+    )
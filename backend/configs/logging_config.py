@@ -0,0 +1,227 @@
+"""
+Application logging pipeline.
+
+Request threads only put records on an in-memory queue; a listener thread
+formats and writes them, so slow stderr / file I/O never adds to request
+latency. The queue is bounded (LOG_QUEUE_SIZE): when it is full records are
+dropped, counted, and reported once the listener catches up, instead of
+blocking the request. The listener is started per worker process; until then
+(and in the gunicorn master) records are written directly.
+
+Records are written as one JSON object per line (LOG_FORMAT=json) or as plain
+text. LOG_LEVEL sets the root level and LOG_LEVELS overrides it per logger,
+e.g. `pymongo=WARNING,services.email_outbox=DEBUG`. DEBUG records are sampled
+at LOG_DEBUG_SAMPLE_RATE before they are queued. Passwords, tokens, cookies and
+Authorization headers are redacted from messages and extra fields.
+"""
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import re
+import sys
+import threading
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from flask import has_request_context, request
+from flask.logging import default_handler
+
+REDACTED = '[REDACTED]'
+
+# Field names whose values are never written out
+SENSITIVE_KEYS = re.compile(r'pass(word)?|token|secret|authorization|cookie|api[_-]?key', re.IGNORECASE)
+
+# `password: x`, `"token": "x"`, `token=x` and `Bearer x` inside free-form messages
+_SENSITIVE_VALUES = re.compile(
+    r'''(?P<key>['"]?[\w-]*(?:pass(?:word)?|token|secret|authorization|cookie|api[_-]?key)['"]?\s*[:=]\s*)'''
+    r'''(?P<value>(?:(?:Bearer|Basic)\s+)?(?:b?'[^']*'|"[^"]*"|[^\s,;&}]+))''',
+    re.IGNORECASE
+)
+_BEARER = re.compile(r'\b(Bearer|Basic)\s+[\w.~+/=-]+', re.IGNORECASE)
+
+# Attributes every LogRecord has; anything else came from `extra=`
+_RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime'}
+
+
+def redact(value):
+    """Copy of `value` with credentials masked (strings, dicts and lists, recursively)"""
+    if isinstance(value, str):
+        value = _SENSITIVE_VALUES.sub(lambda match: match.group('key') + REDACTED, value)
+        return _BEARER.sub(lambda match: f'{match.group(1)} {REDACTED}', value)
+    if isinstance(value, dict):
+        return {
+            key: REDACTED if isinstance(key, str) and SENSITIVE_KEYS.search(key) else redact(item)
+            for key, item in value.items()
+        }
+    if isinstance(value, (list, tuple)):
+        return [redact(item) for item in value]
+    return value
+
+
+def _extra_fields(record):
+    return {key: value for key, value in vars(record).items() if key not in _RECORD_ATTRIBUTES}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record, credentials redacted"""
+
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': redact(record.getMessage()),
+            'pid': record.process,
+            'thread': record.threadName
+        }
+        entry.update(redact(_extra_fields(record)))
+        if record.exc_info:
+            entry['exc_info'] = redact(self.formatException(record.exc_info))
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """`time level logger: message`, credentials redacted"""
+
+    def __init__(self):
+        super().__init__('%(asctime)s %(levelname)s %(name)s: %(message)s')
+
+    def formatMessage(self, record):
+        return redact(super().formatMessage(record))
+
+    def formatException(self, exc_info):
+        return redact(super().formatException(exc_info))
+
+
+class DebugSampler(logging.Filter):
+    """Keeps `rate` of DEBUG records (all of them at 1.0), every other level untouched"""
+
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        return record.levelno > logging.DEBUG or self.rate >= 1 or random.random() < self.rate
+
+
+class _Listener(QueueListener):
+    def enqueue_sentinel(self):
+        # Wait for room rather than fail when stopping with a full queue
+        try:
+            self.queue.put(self._sentinel, timeout=5)
+        except queue.Full:
+            pass
+
+    def stop(self):
+        if self._thread is not None:
+            self.enqueue_sentinel()
+            self._thread.join(timeout=5)
+            self._thread = None
+
+
+class LogPipeline(QueueHandler):
+    """Queues records for a listener thread once `start()` runs in the worker process"""
+
+    def __init__(self, handlers, queue_size=10000):
+        super().__init__(queue.Queue(queue_size))
+        self.handlers = handlers
+        self.queue_size = queue_size
+        self.dropped = 0
+        self.listener = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Start the listener thread for this process"""
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            # A queue inherited from the parent process may hold records nobody will read
+            self.queue = queue.Queue(self.queue_size)
+            self.listener = _Listener(self.queue, *self.handlers, respect_handler_level=True)
+            self.listener.start()
+            self._pid = os.getpid()
+
+    def stop(self):
+        """Flush the queue and stop the listener"""
+        with self._lock:
+            if self.listener is not None and self._pid == os.getpid():
+                self.listener.stop()
+            self.listener = None
+            self._pid = None
+
+    def prepare(self, record):
+        # Only resolve the message here; formatting and redaction happen on the listener thread
+        record = logging.makeLogRecord(vars(record))
+        record.msg = record.getMessage()
+        record.args = None
+        if has_request_context():
+            record.method = request.method
+            record.path = request.path
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            return
+        if self.dropped:
+            dropped, self.dropped = self.dropped, 0
+            notice = logging.makeLogRecord({
+                'name': __name__, 'levelno': logging.WARNING, 'levelname': 'WARNING',
+                'msg': f'Log queue was full, dropped {dropped} record(s)'
+            })
+            try:
+                self.queue.put_nowait(notice)
+            except queue.Full:
+                self.dropped += dropped
+
+    def emit(self, record):
+        if self._pid != os.getpid():
+            # Not started in this process (a preloading master, a pool child): write directly
+            self.handle_directly(self.prepare(record))
+            return
+        super().emit(record)
+
+    def handle_directly(self, record):
+        for handler in self.handlers:
+            if record.levelno >= handler.level:
+                handler.handle(record)
+
+
+def parse_levels(spec):
+    """`name=LEVEL,name=LEVEL` into {logger name: level}"""
+    levels = {}
+    for item in filter(None, (part.strip() for part in spec.split(','))):
+        name, _, level = item.partition('=')
+        if not level or not isinstance(logging.getLevelName(level.strip().upper()), int):
+            raise ValueError(f"Invalid LOG_LEVELS entry: {item!r}")
+        levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def init_logging(app):
+    """Route every logger through the queued pipeline configured in app.config"""
+    output = logging.StreamHandler(sys.stderr)
+    output.setFormatter(JsonFormatter() if app.config['LOG_FORMAT'] == 'json' else TextFormatter())
+
+    pipeline = LogPipeline([output], queue_size=app.config['LOG_QUEUE_SIZE'])
+    pipeline.addFilter(DebugSampler(app.config['LOG_DEBUG_SAMPLE_RATE']))
+
+    # Replace handlers installed by basicConfig() calls in the modules imported so far
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(pipeline)
+    root.setLevel(app.config['LOG_LEVEL'].upper())
+    app.logger.removeHandler(default_handler)
+
+    for name, level in parse_levels(app.config['LOG_LEVELS']).items():
+        logging.getLogger(name).setLevel(level)
+
+    atexit.register(pipeline.stop)
+    app.extensions['log_pipeline'] = pipeline
+    return pipeline
@@ -0,0 +1,273 @@
+"""
+Shared MongoDB connection pool.
+
+The app, the admin blueprint, background workers and the maintenance scripts
+all go through the one `MongoClient` created here. The client is created
+lazily on first use in each process, so gunicorn workers forked from a
+preloaded master each open their own pool instead of sharing sockets.
+
+`db` is a stand-in for the database that resolves to the current process's
+client on every access and applies the per-collection read preference /
+write concern from COLLECTION_OPTIONS.
+
+The ASGI app (routes/async_app.py) uses a Motor client with the same options,
+from `get_async_database()`; Motor is only imported when installed.
+"""
+import os
+import threading
+from pymongo import MongoClient, ReadPreference
+from pymongo.monitoring import ConnectionPoolListener
+from pymongo.write_concern import WriteConcern
+from configs.config import Config
+import logging
+
+try:
+    from motor.motor_asyncio import AsyncIOMotorClient
+except ImportError:  # Only the ASGI app needs Motor
+    AsyncIOMotorClient = None
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Per-collection overrides of the client-wide read preference / write concern
+COLLECTION_OPTIONS = {
+    # Accounts and queued mail must survive a primary failover
+    'users': {'write_concern': WriteConcern(w='majority')},
+    'email_outbox': {'write_concern': WriteConcern(w='majority')},
+    # Read-mostly data that tolerates slightly stale reads
+    'feedback': {'read_preference': ReadPreference.SECONDARY_PREFERRED},
+    'wall_design_history': {'read_preference': ReadPreference.SECONDARY_PREFERRED}
+}
+
+
+class PoolStats(ConnectionPoolListener):
+    """Connection pool counters for this process"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.created = 0
+            self.closed = 0
+            self.checked_out = 0
+            self.checkouts = 0
+            self.checkout_failures = 0
+            self.wait_queue_timeouts = 0
+            self.pool_clears = 0
+
+    def _count(self, **changes):
+        with self._lock:
+            for name, delta in changes.items():
+                setattr(self, name, getattr(self, name) + delta)
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        self._count(pool_clears=1)
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        self._count(created=1)
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self._count(closed=1)
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        if event.reason == 'timeout':
+            self._count(checkout_failures=1, wait_queue_timeouts=1)
+        else:
+            self._count(checkout_failures=1)
+
+    def connection_checked_out(self, event):
+        self._count(checkouts=1, checked_out=1)
+
+    def connection_checked_in(self, event):
+        self._count(checked_out=-1)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'open': self.created - self.closed,
+                'in_use': self.checked_out,
+                'created': self.created,
+                'closed': self.closed,
+                'checkouts': self.checkouts,
+                'checkout_failures': self.checkout_failures,
+                'wait_queue_timeouts': self.wait_queue_timeouts,
+                'pool_clears': self.pool_clears
+            }
+
+
+_lock = threading.Lock()
+_client = None
+_client_pid = None
+_async_client = None
+_async_client_pid = None
+_stats = PoolStats()
+_listeners = [_stats]
+
+
+def client_options():
+    """Keyword arguments for the shared MongoClient, from the app config"""
+    return {
+        'maxPoolSize': Config.MONGO_MAX_POOL_SIZE,
+        'minPoolSize': Config.MONGO_MIN_POOL_SIZE,
+        'maxIdleTimeMS': Config.MONGO_MAX_IDLE_TIME_MS,
+        'waitQueueTimeoutMS': Config.MONGO_WAIT_QUEUE_TIMEOUT_MS,
+        'serverSelectionTimeoutMS': Config.MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        'connectTimeoutMS': Config.MONGO_CONNECT_TIMEOUT_MS,
+        'socketTimeoutMS': Config.MONGO_SOCKET_TIMEOUT_MS,
+        'readPreference': Config.MONGO_READ_PREFERENCE,
+        'retryWrites': True,
+        'appname': 'altarmaker'
+    }
+
+
+def get_client():
+    """The MongoClient for this process, created on first use (and again after a fork)"""
+    global _client, _client_pid
+    client = _client
+    if client is not None and _client_pid == os.getpid():
+        return client
+
+    with _lock:
+        if _client is None or _client_pid != os.getpid():
+            # A client inherited across fork must not be used (or closed) in the child
+            _stats.reset()
+            _client = MongoClient(Config.MONGO_URI, event_listeners=list(_listeners), **client_options())
+            _client_pid = os.getpid()
+            logger.info(
+                f"MongoDB pool created in process {_client_pid} "
+                f"(maxPoolSize={Config.MONGO_MAX_POOL_SIZE}, minPoolSize={Config.MONGO_MIN_POOL_SIZE})"
+            )
+        return _client
+
+
+def use_client(client):
+    """Serve this process from an existing client (e.g. mongomock in the offline benchmarks)"""
+    global _client, _client_pid
+    with _lock:
+        _client = client
+        _client_pid = os.getpid()
+
+
+def get_async_client():
+    """The Motor client for this process, created on first use (inside its event loop)"""
+    global _async_client, _async_client_pid
+    if AsyncIOMotorClient is None:
+        raise RuntimeError('The async API needs the motor package')
+    with _lock:
+        if _async_client is None or _async_client_pid != os.getpid():
+            _async_client = AsyncIOMotorClient(Config.MONGO_URI, event_listeners=list(_listeners), **client_options())
+            _async_client_pid = os.getpid()
+            logger.info(f"Motor pool created in process {_async_client_pid} (maxPoolSize={Config.MONGO_MAX_POOL_SIZE})")
+        return _async_client
+
+
+def close_async_client():
+    """Close this process's Motor pool (on ASGI shutdown)"""
+    global _async_client, _async_client_pid
+    with _lock:
+        if _async_client is not None and _async_client_pid == os.getpid():
+            _async_client.close()
+        _async_client = None
+        _async_client_pid = None
+
+
+def register_listener(listener):
+    """Add a pymongo event listener to clients created from now on (call before first use)"""
+    if listener not in _listeners:
+        _listeners.append(listener)
+
+
+def get_database():
+    """The application database on the shared client"""
+    return get_client()[Config.MONGO_DB_NAME]
+
+
+def get_collection(name):
+    """A collection with its configured read preference / write concern"""
+    return get_database().get_collection(name, **COLLECTION_OPTIONS.get(name, {}))
+
+
+def close_client():
+    """Close this process's pool (e.g. at the end of a script)"""
+    global _client, _client_pid
+    with _lock:
+        if _client is not None and _client_pid == os.getpid():
+            _client.close()
+        _client = None
+        _client_pid = None
+
+
+def pool_stats():
+    """Pool settings and counters for this process"""
+    return {
+        'pid': os.getpid(),
+        'connected': _client is not None and _client_pid == os.getpid(),
+        'max_pool_size': Config.MONGO_MAX_POOL_SIZE,
+        'min_pool_size': Config.MONGO_MIN_POOL_SIZE,
+        'wait_queue_timeout_ms': Config.MONGO_WAIT_QUEUE_TIMEOUT_MS,
+        **_stats.snapshot()
+    }
+
+
+def resolve_database(database):
+    """The real pymongo Database behind `database` (for APIs such as GridFS that type-check it)"""
+    return get_database() if isinstance(database, LazyDatabase) else database
+
+
+class LazyDatabase:
+    """Database stand-in that resolves the shared client on each access"""
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        database = get_database()
+        if name in COLLECTION_OPTIONS or not hasattr(type(database), name):
+            return get_collection(name)
+        return getattr(database, name)
+
+    def __getitem__(self, name):
+        return get_collection(name)
+
+    def __repr__(self):
+        return f"LazyDatabase({Config.MONGO_DB_NAME!r})"
+
+
+class AsyncDatabase:
+    """Motor database whose collections carry their COLLECTION_OPTIONS, like `db`"""
+
+    def __init__(self, database):
+        self._database = database
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return self[name]
+
+    def __getitem__(self, name):
+        return self._database.get_collection(name, **COLLECTION_OPTIONS.get(name, {}))
+
+
+def get_async_database():
+    """The application database on this process's Motor client"""
+    return AsyncDatabase(get_async_client()[Config.MONGO_DB_NAME])
+
+
+# Import this instead of creating clients
+db = LazyDatabase()
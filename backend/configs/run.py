@@ -8,6 +8,7 @@ This script initializes the database and starts the Flask application.
 import os
 import sys
 from dotenv import load_dotenv
+from configs.config import config
 from configs.database import init_database
 from routes.app import app
 
@@ -39,8 +40,8 @@ def check_environment():
     
     return True
 
-def init_database():
-    """Initialize database connection and create indexes"""
+def initialize_database():
+    """Initialize database connection, run migrations and create indexes"""
     try:
         
         logger.info("🔗 Connecting to MongoDB...")
@@ -61,7 +62,7 @@ def run_app():
         
         # Get configuration
         config_name = os.getenv('FLASK_ENV', 'development')
-        config_class = getattr(__import__('config'), f'{config_name.capitalize()}Config')
+        config_class = config.get(config_name, config['default'])
         app.config.from_object(config_class)
         
         # Initialize app with config
@@ -75,6 +76,11 @@ def run_app():
         logger.info(f"📊 Environment: {config_name}")
         logger.info(f"🔗 API Health Check: http://{host}:{port}/api/health")
         
+        if config_name == 'production':
+            # Replace this process with gunicorn; the development server is not for production traffic
+            os.environ.setdefault('GUNICORN_BIND', f'{host}:{port}')
+            os.execvp('gunicorn', ['gunicorn', '-c', 'configs/gunicorn_config.py', 'routes.app:app'])
+        
         app.run(host=host, port=port, debug=app.config['DEBUG'])
         
     except Exception as e:
@@ -91,7 +97,7 @@ def main():
         sys.exit(1)
     
     # Initialize database
-    if not init_database():
+    if not initialize_database():
         sys.exit(1)
     
     # Run application
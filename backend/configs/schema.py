@@ -0,0 +1,296 @@
+"""
+Declarative MongoDB indexes and versioned data migrations.
+
+INDEXES lists every index the application's queries rely on, per collection.
+MIGRATIONS are one-off data changes, applied in order and recorded in the
+`migrations` collection so each runs once. `apply_schema` runs pending
+migrations and creates missing indexes, recreating any whose options changed;
+both are idempotent. Indexes that exist but are not declared are reported,
+never dropped.
+
+    python -m configs.schema plan     # show what apply would do
+    python -m configs.schema apply    # run migrations, build indexes
+    python -m configs.schema verify   # exit 1 if anything is missing or pending
+
+Each app worker also checks the indexes once at startup (SCHEMA_CHECK_ON_STARTUP)
+and logs a warning for any that are missing.
+"""
+import sys
+import threading
+import time
+from datetime import datetime
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import PyMongoError
+import logging
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Covers every users field the admin stats read (services/admin_stats.py)
+USER_STATS_INDEX = [('created_at', ASCENDING), ('role', ASCENDING), ('email_verified', ASCENDING), ('is_active', ASCENDING)]
+
+# Index options that make two indexes on the same keys different
+INDEX_OPTIONS = ('unique', 'sparse', 'expireAfterSeconds', 'partialFilterExpression')
+
+
+class Index:
+    """One declared index: its keys plus creation options"""
+
+    def __init__(self, keys, **options):
+        if isinstance(keys, str):
+            keys = [(keys, ASCENDING)]
+        self.keys = [(field, direction) for field, direction in keys]
+        self.options = options
+
+    @property
+    def name(self):
+        """The name MongoDB gives the index by default, e.g. `user_id_1_created_at_-1`"""
+        return '_'.join(f'{field}_{direction}' for field, direction in self.keys)
+
+    def matches_keys(self, info):
+        # The server may report directions as floats (1.0); text / hashed keys stay strings
+        keys = [(field, direction if isinstance(direction, str) else int(direction)) for field, direction in info['key']]
+        return keys == self.keys
+
+    def matches_options(self, info):
+        return all(info.get(option) == self.options.get(option) for option in INDEX_OPTIONS)
+
+    def __repr__(self):
+        options = ''.join(f', {key}={value!r}' for key, value in self.options.items())
+        return f"Index({self.keys!r}{options})"
+
+
+INDEXES = {
+    'users': [
+        Index('username', unique=True),
+        Index('email', unique=True),
+        Index('role'),
+        Index('created_at'),
+        # Admin user listing (keyset paging, optionally by role)
+        Index([('created_at', DESCENDING), ('_id', DESCENDING)]),
+        Index([('role', ASCENDING), ('created_at', DESCENDING), ('_id', DESCENDING)]),
+        # Admin stats read only this index
+        Index(USER_STATS_INDEX),
+        # Case-insensitive login / email lookups
+        Index('username_lower', unique=True, partialFilterExpression={'username_lower': {'$exists': True}}),
+        Index('email_lower', unique=True, partialFilterExpression={'email_lower': {'$exists': True}})
+    ],
+    'sessions': [
+        Index('user_id'),
+        Index('created_at'),
+        Index([('user_id', ASCENDING), ('created_at', DESCENDING)]),
+        # Session list keyset paging
+        Index([('user_id', ASCENDING), ('updated_at', DESCENDING), ('_id', DESCENDING)])
+    ],
+    'wall_designs': [
+        # One current design per user (migrations 0001 / 0003 remove duplicates first)
+        Index('user_id', unique=True),
+        Index('created_at'),
+        Index([('user_id', ASCENDING), ('created_at', DESCENDING)]),
+        Index('room_type'),
+        Index([('user_id', ASCENDING), ('updated_at', DESCENDING)])
+    ],
+    'wall_design_history': [
+        Index([('user_id', ASCENDING), ('revision', DESCENDING)], unique=True)
+    ],
+    'feedback': [
+        Index('date'),
+        Index('rating'),
+        Index('approved'),
+        # Public feed keyset paging
+        Index([('date', DESCENDING), ('_id', DESCENDING)])
+    ],
+    'user_cache_invalidations': [
+        # Workers only read back a few seconds; keep an hour for stragglers
+        Index('at', expireAfterSeconds=60 * 60)
+    ],
+    'email_outbox': [
+        Index([('status', ASCENDING), ('next_attempt_at', ASCENDING)]),
+        # Sent messages expire after a week
+        Index('sent_at', expireAfterSeconds=7 * 24 * 60 * 60)
+    ]
+}
+
+
+def _compact_legacy_designs(db):
+    from services.design_store import compact_legacy_designs
+    compact_legacy_designs(db)
+
+
+def _backfill_user_lookup_fields(db):
+    from services.user_lookup_migration import migrate_user_lookup
+    if not migrate_user_lookup(db):
+        raise RuntimeError('Users differ only by case; see the log, rename them and apply again')
+
+
+# (id, description, function(db)), applied in this order; never reorder or rename applied entries
+MIGRATIONS = [
+    ('0001_compact_legacy_designs', 'Collapse insert-per-autosave wall designs into one per user', _compact_legacy_designs),
+    ('0002_user_lookup_fields', 'Backfill username_lower / email_lower', _backfill_user_lookup_fields),
+    # Racing first saves could create duplicates after 0001; the unique user_id index needs them gone
+    ('0003_unique_current_design', 'Collapse duplicate current wall designs again', _compact_legacy_designs)
+]
+
+
+def index_plan(db):
+    """Per collection: declared indexes that are missing or changed, and undeclared ones"""
+    plan = {}
+    for collection, declared in INDEXES.items():
+        existing = db[collection].index_information()
+        missing, changed = [], []
+        matched = {'_id_'}
+        for index in declared:
+            name, info = next(
+                ((name, info) for name, info in existing.items() if index.matches_keys(info)),
+                (None, None)
+            )
+            if info is None:
+                missing.append(index)
+                continue
+            matched.add(name)
+            if not index.matches_options(info):
+                changed.append((name, index))
+        extra = sorted(name for name in existing if name not in matched)
+        if missing or changed or extra:
+            plan[collection] = {'missing': missing, 'changed': changed, 'extra': extra}
+    return plan
+
+
+def pending_migrations(db):
+    """Migrations not yet recorded in the `migrations` collection"""
+    applied = {record['_id'] for record in db.migrations.find({}, {'_id': 1})}
+    return [migration for migration in MIGRATIONS if migration[0] not in applied]
+
+
+def apply_migrations(db):
+    """Run pending migrations in order, recording each; stops at the first failure and returns False"""
+    for migration_id, description, function in pending_migrations(db):
+        logger.info(f"Applying migration {migration_id}: {description}")
+        started = time.perf_counter()
+        try:
+            function(db)
+        except Exception as e:
+            logger.error(f"Migration {migration_id} failed: {e}")
+            return False
+        db.migrations.insert_one({
+            '_id': migration_id,
+            'description': description,
+            'applied_at': datetime.utcnow(),
+            'duration_ms': round((time.perf_counter() - started) * 1000)
+        })
+    return True
+
+
+def ensure_indexes(db):
+    """Create missing indexes and rebuild changed ones; returns the indexes that failed"""
+    failed = []
+    for collection, changes in index_plan(db).items():
+        for name, index in changes['changed']:
+            logger.warning(f"Rebuilding index {collection}.{name} with new options {index.options}")
+            db[collection].drop_index(name)
+        for index in changes['missing'] + [index for _, index in changes['changed']]:
+            try:
+                db[collection].create_index(index.keys, **index.options)
+            except PyMongoError as e:
+                logger.error(f"Could not create index {collection}.{index.name}: {e}")
+                failed.append((collection, index))
+    return failed
+
+
+def apply_schema(db):
+    """Run pending migrations then build the declared indexes; True when nothing failed"""
+    migrated = apply_migrations(db)
+    # Indexes are built even after a failed migration; ones its data blocks are reported
+    failed = ensure_indexes(db)
+    if migrated and not failed:
+        logger.info("Database schema is up to date")
+    return migrated and not failed
+
+
+def check_schema(db):
+    """Log a warning for every missing or changed index and pending migration; True if none"""
+    ok = True
+    for collection, changes in index_plan(db).items():
+        for index in changes['missing']:
+            ok = False
+            logger.warning(f"Missing index {collection}.{index.name}; run `python -m configs.schema apply`")
+        for name, index in changes['changed']:
+            ok = False
+            logger.warning(f"Index {collection}.{name} differs from the declared options {index.options}")
+    for migration_id, _, _ in pending_migrations(db):
+        ok = False
+        logger.warning(f"Pending migration {migration_id}; run `python -m configs.schema apply`")
+    return ok
+
+
+def start_schema_check(app, db):
+    """Check the schema once in the background so startup never waits on MongoDB"""
+    if not app.config['SCHEMA_CHECK_ON_STARTUP']:
+        return None
+
+    def run():
+        try:
+            check_schema(db)
+        except Exception as e:
+            logger.warning(f"Schema check skipped: {e}")
+
+    thread = threading.Thread(target=run, name='schema-check', daemon=True)
+    thread.start()
+    return thread
+
+
+def schema_status(db):
+    """JSON-ready summary of pending migrations and index differences"""
+    indexes = {
+        collection: {
+            'missing': [index.name for index in changes['missing']],
+            'changed': [name for name, _ in changes['changed']],
+            'extra': changes['extra']
+        }
+        for collection, changes in index_plan(db).items()
+    }
+    pending = [migration_id for migration_id, _, _ in pending_migrations(db)]
+    up_to_date = not pending and not any(changes['missing'] or changes['changed'] for changes in indexes.values())
+    return {'up_to_date': up_to_date, 'pending_migrations': pending, 'indexes': indexes}
+
+
+def describe_plan(db):
+    """Human-readable lines for `plan`"""
+    lines = []
+    for migration_id, description, _ in pending_migrations(db):
+        lines.append(f"migrate  {migration_id}: {description}")
+    for collection, changes in index_plan(db).items():
+        for index in changes['missing']:
+            lines.append(f"create   {collection}.{index.name} {index.options or ''}".rstrip())
+        for name, index in changes['changed']:
+            lines.append(f"rebuild  {collection}.{name} {index.options}")
+        for name in changes['extra']:
+            lines.append(f"extra    {collection}.{name} (not declared, left in place)")
+    return lines
+
+
+def main(argv=None):
+    """plan / apply / verify against the configured database"""
+    import argparse
+    from configs.mongo import close_client, get_database
+
+    parser = argparse.ArgumentParser(prog='python -m configs.schema', description=main.__doc__)
+    parser.add_argument('command', choices=['plan', 'apply', 'verify'])
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+
+    db = get_database()
+    try:
+        if args.command == 'plan':
+            lines = describe_plan(db)
+            print('\n'.join(lines) if lines else 'Schema is up to date')
+            return 0
+        if args.command == 'apply':
+            return 0 if apply_schema(db) else 1
+        return 0 if check_schema(db) else 1
+    finally:
+        close_client()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
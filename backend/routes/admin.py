@@ -1,29 +1,157 @@
+import csv
+import io
+import re
 from datetime import datetime
-from flask import Blueprint, request, jsonify
-from werkzeug.security import generate_password_hash
+from flask import Blueprint, Response, request, jsonify, current_app, stream_with_context
 from bson import ObjectId
+from pymongo.errors import DuplicateKeyError
 from dotenv import load_dotenv
-from configs.database import db
+from configs.mongo import db, pool_stats
 from utils.auth_utils import require_auth, require_admin
+from services.user_cache import invalidate_user
+from services.repositories import UserRepository
+from services.password_hasher import get_password_hasher, HasherBusy, hasher_busy_response
+from services.admin_stats import get_admin_stats as get_admin_stats_store
+from configs.schema import schema_status
 
 load_dotenv()
 
 admin_bp = Blueprint('admin', __name__, url_prefix='/api/admin')
 
 
+# Columns of the user export, in order
+EXPORT_FIELDS = ['_id', 'username', 'email', 'role', 'email_verified', 'is_active', 'created_at', 'last_login']
+
+
+def _parse_bool(value, name):
+    if value.lower() in ('true', '1', 'yes'):
+        return True
+    if value.lower() in ('false', '0', 'no'):
+        return False
+    raise ValueError(f"{name} must be true or false")
+
+
+def _parse_date(value, name):
+    try:
+        return datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        raise ValueError(f"{name} must be an ISO 8601 date")
+
+
+def _user_filters(args):
+    """MongoDB query for the user list filters in the request args"""
+    query = {}
+    if args.get('role'):
+        query['role'] = args['role']
+    if args.get('verified'):
+        verified = _parse_bool(args['verified'], 'verified')
+        query['email_verified'] = True if verified else {'$ne': True}
+    if args.get('active'):
+        # Users without the flag have never been deactivated
+        active = _parse_bool(args['active'], 'active')
+        query['is_active'] = {'$ne': False} if active else False
+    created = {}
+    if args.get('created_from'):
+        created['$gte'] = _parse_date(args['created_from'], 'created_from')
+    if args.get('created_to'):
+        created['$lt'] = _parse_date(args['created_to'], 'created_to')
+    if created:
+        query['created_at'] = created
+    search = args.get('q', '').strip().lower()
+    if search:
+        # Anchored on the lowercased copies, so each is a bounded range of its index
+        prefix = {'$regex': '^' + re.escape(search)}
+        query['$or'] = [{'username_lower': prefix}, {'email_lower': prefix}]
+    return query
+
+
+def _page_size(args):
+    try:
+        limit = int(args.get('limit', current_app.config['ADMIN_USERS_PAGE_SIZE']))
+    except ValueError:
+        raise ValueError('limit must be an integer')
+    if limit < 1:
+        raise ValueError('limit must be positive')
+    return min(limit, current_app.config['ADMIN_USERS_MAX_PAGE_SIZE'])
+
+
 @admin_bp.route('/users', methods=['GET'])
 @require_auth
 @require_admin
 def get_all_users():
-    """Get all users (admin only)"""
+    """List users a page at a time, with optional filters and sort (admin only)"""
     try:
-        users = list(db.users.find({}, {'password': 0}))
+        sort = request.args.get('sort', '-created_at')
+        try:
+            limit = _page_size(request.args)
+            # Read one extra user to know whether there is a next page
+            cursor = UserRepository(db).page(
+                _user_filters(request.args), sort, limit=limit + 1, after=request.args.get('after')
+            )
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        users = list(cursor)
+        next_cursor = None
+        if len(users) > limit:
+            users = users[:limit]
+            next_cursor = UserRepository.page_cursor(users[-1], sort)
         
         # Convert ObjectId to string
         for user in users:
             user['_id'] = str(user['_id'])
         
-        return jsonify({'users': users}), 200
+        return jsonify({'users': users, 'next_cursor': next_cursor}), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def _export_rows(cursor, export_format):
+    """CSV or NDJSON lines for the users in `cursor`, one at a time"""
+    try:
+        if export_format == 'csv':
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(EXPORT_FIELDS)
+            for user in cursor:
+                writer.writerow([
+                    value.isoformat() if isinstance(value, datetime) else value
+                    for value in (user.get(field, '') for field in EXPORT_FIELDS)
+                ])
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+            yield buffer.getvalue()
+        else:
+            for user in cursor:
+                user['_id'] = str(user['_id'])
+                yield current_app.json.dumps(user) + '\n'
+    finally:
+        cursor.close()
+
+@admin_bp.route('/users/export', methods=['GET'])
+@require_auth
+@require_admin
+def export_users():
+    """Stream the filtered user list as CSV or NDJSON (admin only)"""
+    try:
+        export_format = request.args.get('format', 'csv')
+        if export_format not in ('csv', 'ndjson'):
+            return jsonify({'error': 'format must be csv or ndjson'}), 400
+        try:
+            cursor = UserRepository(db).page(
+                _user_filters(request.args), request.args.get('sort', '-created_at'), view='export'
+            )
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        mimetype = 'text/csv' if export_format == 'csv' else 'application/x-ndjson'
+        filename = f"users-{datetime.utcnow():%Y%m%d-%H%M%S}.{export_format}"
+        return Response(
+            stream_with_context(_export_rows(cursor, export_format)),
+            mimetype=mimetype,
+            headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+        )
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -43,22 +171,31 @@ def create_admin_user():
             return jsonify({'error': 'Username, password, and email are required'}), 400
         
         # Check if user already exists
-        existing_user = db.users.find_one({'$or': [{'email': email}, {'username': username}]})
+        existing_user = UserRepository(db).find_existing(username, email)
         if existing_user:
             return jsonify({'error': 'User with this email or username already exists'}), 409
         
+        try:
+            password_hash = get_password_hasher().hash(password)
+        except HasherBusy:
+            return hasher_busy_response()
+        
         # Create new admin user
         user_data = {
             'username': username,
             'email': email,
-            'password': generate_password_hash(password),
+            'password': password_hash,
+            **UserRepository.lookup_fields(username, email),
             'role': 'admin',
             'created_at': datetime.utcnow(),
             'last_login': None,
             'created_by': request.user_data['user_id']
         }
         
-        result = db.users.insert_one(user_data)
+        try:
+            result = db.users.insert_one(user_data)
+        except DuplicateKeyError:
+            return jsonify({'error': 'User with this email or username already exists'}), 409
         user_data['_id'] = str(result.inserted_id)
         del user_data['password']
         
@@ -85,6 +222,7 @@ def delete_user(user_id):
             return jsonify({'error': 'Cannot delete your own account'}), 400
         
         result = db.users.delete_one({'_id': ObjectId(user_id)})
+        invalidate_user(db, user_id)
         
         if result.deleted_count == 0:
             return jsonify({'error': 'User not found'}), 404
@@ -116,6 +254,7 @@ def promote_user_to_admin(user_id):
             {'_id': ObjectId(user_id)},
             {'$set': {'role': 'admin', 'updated_at': datetime.utcnow()}}
         )
+        invalidate_user(db, user_id)
         
         if result.matched_count == 0:
             return jsonify({'error': 'User not found'}), 404
@@ -134,21 +273,13 @@ def promote_user_to_admin(user_id):
 def demote_admin_to_user(user_id):
     """Demote an admin to regular user role (admin only)"""
     try:
-        print(f"[DEBUG] Demote request for user_id: {user_id}, type: {type(user_id)}")
-        print(f"[DEBUG] Request data: {request.data}")
-        print(f"[DEBUG] Request headers: {dict(request.headers)}")
-        print(f"[DEBUG] Current user: {request.user_data}")
-        
         # Validate ObjectId
         if not ObjectId.is_valid(user_id):
-            print(f"[ERROR] Invalid ObjectId: {user_id}")
             return jsonify({'error': 'Invalid user ID'}), 400
         
         # Don't allow admin to demote themselves
         current_user_id = request.user_data.get('user_id')
-        print(f"[DEBUG] Current user ID: {current_user_id}, Target user ID: {user_id}")
         if user_id == current_user_id:
-            print("[ERROR] User attempted to demote themselves")
             return jsonify({'error': 'You cannot demote yourself'}), 400
         
         # Update user role to user
@@ -156,6 +287,7 @@ def demote_admin_to_user(user_id):
             {'_id': ObjectId(user_id)},
             {'$set': {'role': 'user', 'updated_at': datetime.utcnow()}}
         )
+        invalidate_user(db, user_id)
         
         if result.matched_count == 0:
             return jsonify({'error': 'User not found'}), 404
@@ -168,31 +300,87 @@ def demote_admin_to_user(user_id):
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def _set_user_active(user_id, is_active):
+    """Activate or deactivate a user and drop them from the user cache"""
+    if not ObjectId.is_valid(user_id):
+        return jsonify({'error': 'Invalid user ID'}), 400
+
+    if user_id == request.user_data['user_id']:
+        return jsonify({'error': 'You cannot change the status of your own account'}), 400
+
+    result = db.users.update_one(
+        {'_id': ObjectId(user_id)},
+        {'$set': {'is_active': is_active, 'updated_at': datetime.utcnow()}}
+    )
+    invalidate_user(db, user_id)
+
+    if result.matched_count == 0:
+        return jsonify({'error': 'User not found'}), 404
+
+    state = 'activated' if is_active else 'deactivated'
+    if result.modified_count == 0:
+        return jsonify({'error': f'User is already {state}'}), 400
+
+    return jsonify({'message': f'User {state} successfully'}), 200
+
+@admin_bp.route('/users/<user_id>/deactivate', methods=['PUT'])
+@require_auth
+@require_admin
+def deactivate_user(user_id):
+    """Deactivate a user account (admin only)"""
+    try:
+        return _set_user_active(user_id, False)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@admin_bp.route('/users/<user_id>/activate', methods=['PUT'])
+@require_auth
+@require_admin
+def activate_user(user_id):
+    """Reactivate a deactivated user account (admin only)"""
+    try:
+        return _set_user_active(user_id, True)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @admin_bp.route('/stats', methods=['GET'])
 @require_auth
 @require_admin
 def get_admin_stats():
-    """Get admin statistics"""
+    """Get admin statistics (the materialized dashboard document; `?refresh=true` recomputes it)"""
     try:
-        total_users = db.users.count_documents({})
-        total_sessions = db.sessions.count_documents({})
-        admin_users = db.users.count_documents({'role': 'admin'})
-        regular_users = db.users.count_documents({'role': 'user'})
-        
-        # Get recent activity
-        recent_sessions = list(db.sessions.find().sort('created_at', -1).limit(10))
-        for session in recent_sessions:
-            session['_id'] = str(session['_id'])
-        
-        stats = {
-            'total_users': total_users,
-            'total_sessions': total_sessions,
-            'admin_users': admin_users,
-            'regular_users': regular_users,
-            'recent_sessions': recent_sessions
-        }
-        
-        return jsonify(stats), 200
+        refresh = request.args.get('refresh', '').lower() in ('true', '1', 'yes')
+        return jsonify(get_admin_stats_store().get(refresh=refresh)), 200
         
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
\ No newline at end of file
+        return jsonify({'error': str(e)}), 500
+
+@admin_bp.route('/db-pool', methods=['GET'])
+@require_auth
+@require_admin
+def get_db_pool_stats():
+    """Get MongoDB connection pool stats for the worker that served the request"""
+    try:
+        return jsonify(pool_stats()), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@admin_bp.route('/password-hashing', methods=['GET'])
+@require_auth
+@require_admin
+def get_password_hashing_stats():
+    """Get password hashing settings and recent latency for the worker that served the request"""
+    try:
+        return jsonify(get_password_hasher().snapshot()), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@admin_bp.route('/schema', methods=['GET'])
+@require_auth
+@require_admin
+def get_schema_status():
+    """Get pending migrations and missing / changed / undeclared indexes"""
+    try:
+        return jsonify(schema_status(db)), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
@@ -5,18 +5,38 @@ if backend_path not in sys.path:
     sys.path.insert(0, backend_path)
 from datetime import datetime, timedelta
 from functools import wraps
-from flask import Flask, request, jsonify, session, send_from_directory, current_app
+from flask import Flask, Response, request, jsonify, session, current_app, stream_with_context
 from flask_cors import CORS
 from configs.extensions import mail
-from pymongo import MongoClient
-from werkzeug.security import generate_password_hash, check_password_hash
 from bson import ObjectId
+from pymongo.errors import DuplicateKeyError
 from dotenv import load_dotenv
-import traceback
+import time
 from routes.admin import admin_bp
+from routes.assets import assets_bp
 
 # Import email utilities
 from services.email_utils import generate_verification_token, send_verification_email, send_welcome_email, verify_token
+from services.design_store import (
+    get_current_design, save_current_design, apply_design_patch, list_design_history, get_design_snapshot,
+    design_from_client, design_for_client, DesignConflict
+)
+from services.asset_store import init_asset_store, externalize_data_urls, absolute_asset_urls
+from services.static_assets import init_static_assets, get_static_assets
+from services.image_derivatives import init_image_derivatives, build_image_derivatives
+from services.design_export import init_design_exporter, get_design_exporter, send_export
+from services.email_outbox import init_email_outbox
+from services.email_templates import init_email_templates
+from services.health import init_health_monitor, get_health_monitor
+from services.admin_stats import init_admin_stats, get_admin_stats
+from services.password_hasher import init_password_hasher, get_password_hasher, HasherBusy, hasher_busy_response
+from services.rate_limit import init_rate_limiter, rate_limit
+from services.feedback_feed import init_feedback_feed, get_feedback_feed, invalidate_feedback_feed
+from services.repositories import UserRepository, SessionRepository
+from configs.schema import start_schema_check
+from configs.logging_config import init_logging
+from services.metrics import init_metrics
+from services.user_cache import init_user_cache, get_user_cache, invalidate_user
 
 import logging
 load_dotenv()
@@ -24,13 +44,19 @@ load_dotenv()
 # Set environment to development if not set
 os.environ['FLASK_ENV'] = os.getenv('FLASK_ENV', 'development')
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = Flask(__name__, static_folder='client/build"', static_url_path='')
+# Static files are served from a fingerprinted manifest (see services.static_assets)
+app = Flask(__name__, static_folder=None)
 app.config.from_object('configs.config.Config')
 
+# Structured, redacted logs written off the request threads
+init_logging(app)
+
+# Per-route latency / size metrics on /metrics and optional Server-Timing headers
+# (before anything creates the MongoDB client, so its commands are timed too)
+init_metrics(app)
+
 # Set environment in app config
 app.config['ENV'] = os.getenv('FLASK_ENV', 'development')
 logger.info(f"Running in {app.config['ENV']} mode")
@@ -39,59 +65,103 @@ logger.info(f"Running in {app.config['ENV']} mode")
 from configs.extensions import init_mail
 init_mail(app)
 
+# Compile email templates once
+init_email_templates(app)
+
+# Fingerprinted, precompressed frontend build (built by prepare_assets)
+init_static_assets(app)
+
+# Resized catalog images for the sidebar (indexed by prepare_assets)
+init_image_derivatives(app)
+
+# Server-side renderer for the "download all walls" ZIP
+init_design_exporter(app)
+
 app.register_blueprint(admin_bp)
+app.register_blueprint(assets_bp)
 
 CORS_ORIGINS = os.getenv('CORS_ORIGINS', '*').split(',')
 port = int(os.getenv("PORT", 5000))       # fallback 5000
-debug = os.getenv("DEBUG", "True") == "True"
+debug = os.getenv("DEBUG", "False") == "True"
 
-# Initialize MongoDB Atlas connection
-client = MongoClient(os.getenv('MONGO_URI'))
-db = client.altarmaker
+# Shared MongoDB pool, connected lazily in each worker process
+from configs.mongo import db, get_client
 
-logger.info(f"MongoDB connected: {db}")
+# Initialize content-addressed storage for uploaded images
+init_asset_store(app, db)
 
-# MongoDB connection validation
-def get_db():
-    """Get database with connection validation"""
-    try:
-        # Test the connection
-        client.admin.command('ping')
-        return db
-    except Exception as e:
-        logger.info(f"MongoDB connection error: {e}")
-        return None
+# Verification / welcome emails are queued and delivered in the background
+init_email_outbox(app, db)
 
-def validate_db_connection():
-    """Validate MongoDB connection"""
-    try:
-        db_instance = get_db()
-        if db_instance:
-            # Test the connection
-            client.admin.command('ping')
-            return True
-        return False
-    except Exception as e:
-        logger.info(f"MongoDB connection error: {e}")
-        return False
+# Dependency health is checked in the background and cached
+init_health_monitor(app)
+
+# Cache of the user fields /api/auth/status needs
+init_user_cache(app)
+
+# Admin dashboard statistics, refreshed in the background
+init_admin_stats(app, db)
+
+# Public feedback feed, served from cached pages
+init_feedback_feed(app, db)
+
+# Token bucket limits for the unauthenticated endpoints
+init_rate_limiter(app)
+
+# Password hashing runs in a bounded process pool
+init_password_hasher(app)
+
+# Importing this module only builds the app: no threads, asset builds or MongoDB. A gunicorn
+# master preloads it and forks, and spawned process pools re-import it.
+_worker_pid = None
+
+
+def prepare_assets(wait=False):
+    """Fingerprint and precompress the frontend build, index catalog images and prebuild thumbnails"""
+    static_assets = app.extensions['static_assets']
+    if static_assets.built:
+        return
+    static_assets.build()
+    build_image_derivatives(app, wait=wait)
+
+
+def start_worker_services():
+    """Start this process's log writer, background threads and MongoDB pool (once per worker)"""
+    global _worker_pid
+    if _worker_pid == os.getpid():
+        return
+    _worker_pid = os.getpid()
+
+    app.extensions['log_pipeline'].start()
+    prepare_assets()
+    with app.app_context():
+        get_health_monitor()
+        get_admin_stats()
+        if app.config['EMAIL_OUTBOX_WORKER'] == 'thread':
+            app.extensions['email_outbox'].start()
+    # Warn (without blocking startup) when indexes are missing or migrations are pending
+    start_schema_check(app, db)
+    # Connect now rather than on the worker's first request
+    get_client()
 
 # Enable CORS with specific origins and headers
 app.config['CORS_HEADERS'] = 'Content-Type'
 app.config['CORS_SUPPORTS_CREDENTIALS'] = True
 
+# CORS settings for /api/* (shared with the ASGI app in routes/async_app.py)
+CORS_API_RESOURCE = {
+    "origins": CORS_ORIGINS,  # Single origin to avoid duplicates
+    "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS", "PATCH"],
+    "allow_headers": ["Content-Type", "Authorization", "X-Requested-With", "X-CSRFToken"],
+    "supports_credentials": True,
+    "expose_headers": ["Content-Type", "X-CSRFToken", "Content-Length"],
+    "max_age": 3600,
+}
+
 # Configure CORS with specific settings
 cors = CORS(
     app,
-    resources={
-        r"/api/*": {
-            "origins": CORS_ORIGINS,  # Single origin to avoid duplicates
-            "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS", "PATCH"],
-            "allow_headers": ["Content-Type", "Authorization", "X-Requested-With", "X-CSRFToken"],
-            "supports_credentials": True,
-            "expose_headers": ["Content-Type", "X-CSRFToken", "Content-Length"],
-            "max_age": 3600,
-        }
-    },
+    resources={r"/api/*": CORS_API_RESOURCE},
     supports_credentials=True
 )
 
@@ -158,42 +228,43 @@ def require_admin(f):
 
 @app.route('/api/health', methods=['GET'])
 def health_check():
-    """Health check endpoint"""
-    try:
-        # Check database connection
-        db_instance = get_db()
-        
-        if db_instance is not None:
-            # Test the connection
-            try:
-                client.admin.command('ping')
-                return jsonify({
-                    'status': 'healthy', 
-                    'message': 'AltarMaker API is running',
-                    'database': 'connected'
-                })
-            except Exception as e:
-                return jsonify({
-                    'status': 'unhealthy',
-                    'message': 'Database connection failed',
-                    'database': 'disconnected'
-                }), 500
-        else:
-            return jsonify({
-                'status': 'unhealthy',
-                'message': 'Database connection failed',
-                'database': 'disconnected'
-            }), 500
-    except Exception as e:
+    """Health check endpoint (answered from the cached health state)"""
+    monitor = get_health_monitor()
+    state = monitor.snapshot()
+    if monitor.ready():
         return jsonify({
-            'status': 'error',
-            'message': str(e),
-            'database': 'error'
-        }), 500
+            'status': 'healthy',
+            'message': 'AltarMaker API is running',
+            'database': 'connected',
+            'checks': state
+        })
+    return jsonify({
+        'status': 'unhealthy',
+        'message': 'Database connection failed',
+        'database': 'disconnected',
+        'checks': state
+    }), 503
+
+@app.route('/api/health/live', methods=['GET'])
+def liveness_check():
+    """Liveness probe: the process is up and serving requests, no dependency checks"""
+    return jsonify({'status': 'alive'})
+
+@app.route('/api/health/ready', methods=['GET'])
+def readiness_check():
+    """Readiness probe: MongoDB reachable according to the latest background check"""
+    monitor = get_health_monitor()
+    ready = monitor.ready()
+    return jsonify({
+        'status': 'ready' if ready else 'not_ready',
+        'uptime_seconds': round(time.time() - monitor.started_at),
+        'checks': monitor.snapshot()
+    }), 200 if ready else 503
 
 
 
 @app.route('/api/auth/register', methods=['POST'])
+@rate_limit('register')
 def register():
     """Register a new user"""
     try:
@@ -216,10 +287,15 @@ def register():
         
         # Check if user already exists
         try:
-            existing_user = db.users.find_one({'$or': [{'email': email}, {'username': username}]})
+            existing_user = UserRepository(db).find_existing(username, email)
             if existing_user:
                 return jsonify({'error': 'User with this email or username already exists'}), 409
             
+            try:
+                password_hash = get_password_hasher().hash(password)
+            except HasherBusy:
+                return hasher_busy_response()
+            
             # Generate verification token
             verification_token = generate_verification_token(email)
             
@@ -227,7 +303,8 @@ def register():
             user_data = {
                 'username': username,
                 'email': email,
-                'password': generate_password_hash(password),
+                'password': password_hash,
+                **UserRepository.lookup_fields(username, email),
                 'role': 'user',  # Always create as user
                 'email_verified': False,  # Email not verified yet
                 'verification_token': verification_token,
@@ -236,8 +313,11 @@ def register():
                 'is_active': True
             }
             
-            # Insert user into database
-            result = db.users.insert_one(user_data)
+            # Insert user into database (the unique indexes catch a concurrent registration)
+            try:
+                result = db.users.insert_one(user_data)
+            except DuplicateKeyError:
+                return jsonify({'error': 'User with this email or username already exists'}), 409
             user_id = result.inserted_id
             
             # Send verification email
@@ -276,10 +356,8 @@ def verify_email():
     """Verify user's email using the verification token"""
     try:
         token = request.args.get('token')
-        logger.info(f"Verification attempt with token: {token}")
         
         if not token:
-            logger.info("Error: No token provided")
             return jsonify({
                 'error': 'Verification link is invalid',
                 'message': 'The verification link is missing the required token. Please try the link from your email again or request a new verification email.',
@@ -288,10 +366,8 @@ def verify_email():
         
         # Verify token and get email
         email = verify_token(token)
-        logger.info(f"Decoded email from token: {email}")
         
         if not email:
-            logger.info("Error: Invalid or expired token")
             return jsonify({
                 'error': 'Verification link has expired or is invalid',
                 'message': 'This verification link has expired. Please request a new verification email.',
@@ -299,23 +375,15 @@ def verify_email():
                 'can_retry': True
             }), 400
         
-        # Find user by email (case-insensitive search)
-        user = db.users.find_one({
-            'email': {'$regex': f'^{email}$', '$options': 'i'},
-            'verification_token': token
-        })
-        
-        logger.info(f"User found in DB: {user is not None}")
+        # Find user by email (case-insensitive, exact match on the normalized field)
+        users = UserRepository(db)
+        user = users.find_by_email(email, verification_token=token)
         
         if not user:
             # Check if user is already verified
-            existing_user = db.users.find_one({
-                'email': {'$regex': f'^{email}$', '$options': 'i'},
-                'email_verified': True
-            })
+            existing_user = users.find_by_email(email, view='summary', email_verified=True)
             
             if existing_user:
-                logger.info(f"User {email} is already verified")
                 return jsonify({
                     'message': 'Your email has already been verified. You can now log in.',
                     'code': 'ALREADY_VERIFIED',
@@ -323,7 +391,7 @@ def verify_email():
                     'email': email
                 }), 200
                 
-            logger.info(f"No unverified user found with email: {email}")
+            logger.debug(f"No unverified user found with email: {email}")
             return jsonify({
                 'error': 'Verification failed',
                 'message': 'We could not verify your email. The verification link may be invalid or expired. Please request a new verification email.',
@@ -337,7 +405,7 @@ def verify_email():
         if verification_sent_at:
             time_since_sent = datetime.utcnow() - verification_sent_at
             if time_since_sent.total_seconds() > 900:  # 15 minutes
-                logger.info(f"Verification link expired for user {email}")
+                logger.debug(f"Verification link expired for user {email}")
                 return jsonify({
                     'error': 'Verification link has expired',
                     'message': 'This verification link has expired. Please request a new verification email.',
@@ -361,12 +429,12 @@ def verify_email():
             }
         )
         
-        logger.info(f"Update result - Matched: {result.matched_count}, Modified: {result.modified_count}")
+        logger.info(f"Verified email for user {user['_id']}")
+        invalidate_user(db, user['_id'])
         
         # Send welcome email
         try:
             send_welcome_email(email, user['username'])
-            logger.info(f"Welcome email sent to {email}")
         except Exception as e:
             logger.error(f"Failed to send welcome email: {str(e)}")
             # Continue even if welcome email fails
@@ -381,8 +449,7 @@ def verify_email():
         }), 200
         
     except Exception as e:
-        logger.error(f"Error in verify_email: {str(e)}")
-        logger.error(traceback.format_exc())
+        logger.error(f"Error in verify_email: {str(e)}", exc_info=True)
         return jsonify({
             'error': 'An error occurred during email verification',
             'message': 'We encountered an error while verifying your email. Please try again or contact support if the problem persists.',
@@ -390,6 +457,7 @@ def verify_email():
         }), 500
 
 @app.route('/api/auth/login', methods=['POST', 'OPTIONS'])
+@rate_limit('login', account_field='username')
 def login():
     """Login user"""
     if request.method == 'OPTIONS':
@@ -400,45 +468,38 @@ def login():
         response.headers.add('Access-Control-Allow-Headers', 'Content-Type,Authorization')
         response.headers.add('Access-Control-Allow-Methods', 'GET,PUT,POST,DELETE,OPTIONS')
         return response
-        
-    # Log request details for debugging
-    logger.info(f"Login request received. Headers: {dict(request.headers)}")
-    logger.info(f"Request data: {request.get_data(as_text=True)}")
+
 
     try:
         data = request.get_json()
         if not data:
             logger.error("No JSON data in request")
             return jsonify({'error': 'No data provided'}), 400
-            
-        logger.info(f"Login attempt with data: {data}")
         
         username = data.get('username')
         password = data.get('password')
         role = data.get('role', 'user')
         
         if not username or not password:
-            logger.error(f"Missing credentials. Username: {'provided' if username else 'missing'}, Password: {'provided' if password else 'missing'}")
             return jsonify({'error': 'Username and password are required'}), 400
         
         if not username or not password:
             return jsonify({'error': 'Username and password are required'}), 400
         
         try:
-            # Find user by username or email
-            user = db.users.find_one({
-                '$or': [
-                    {'username': username},
-                    {'email': username}
-                ]
-            })
+            # Find user by username or email (only the fields login uses)
+            user = UserRepository(db).find_by_login(username)
             
             if not user:
                 logger.info(f"Login failed: User {username} not found")
                 return jsonify({'error': 'No account found with this username/email'}), 401
             
-            # Check password
-            if not check_password_hash(user['password'], password):
+            # Check password (hashes made with old parameters are upgraded)
+            try:
+                password_ok, new_hash = get_password_hasher().verify(password, user['password'])
+            except HasherBusy:
+                return hasher_busy_response()
+            if not password_ok:
                 logger.info(f"Login failed: Invalid password for user {username}")
                 return jsonify({'error': 'Incorrect password'}), 401
             
@@ -451,14 +512,14 @@ def login():
             if not user.get('is_active', True):
                 logger.info(f"Login failed: Inactive account for user {username}")
                 return jsonify({'error': 'Your account has been deactivated. Please contact support.'}), 403
-                
-            # Log user details for debugging
-            logger.info(f"User found: {user.get('username')}, role: {user.get('role')}")
             
             # Update last login
+            login_update = {'last_login': datetime.now()}
+            if new_hash:
+                login_update['password'] = new_hash
             db.users.update_one(
                 {'_id': user['_id']},
-                {'$set': {'last_login': datetime.now()}}
+                {'$set': login_update}
             )
             
             # Create user session
@@ -514,8 +575,8 @@ def auth_status():
     try:
         user = get_current_user()
         if user:
-            # Get fresh user data from database
-            user_data = db.users.find_one({'_id': ObjectId(user['user_id'])})
+            # Projected user fields, usually served from the in-memory cache
+            user_data = get_user_cache().get_user(db, user['user_id'])
             if not user_data or not user_data.get('is_active', True):
                 # Clear session if user no longer exists or is inactive
                 session.clear()
@@ -554,31 +615,9 @@ def get_wall_designs():
     try:
         user_id = request.user_data['user_id']
         
-        # Get the most recent wall design for the user
-        wall_design = db.wall_designs.find_one(
-            {'user_id': user_id},
-            sort=[('created_at', -1)]
-        )
-        
-        if wall_design:
-            return jsonify({
-                'wallDesigns': wall_design.get('wall_designs', {}),
-                'roomType': wall_design.get('room_type', ''),
-                'roomDimensions': wall_design.get('room_dimensions', {}),
-                'selectedWall': wall_design.get('selected_wall', '')
-            })
-        else:
-            return jsonify({
-                'wallDesigns': {
-                    'front': {'elements': [], 'wallpaper': None},
-                    'back': {'elements': [], 'wallpaper': None},
-                    'left': {'elements': [], 'wallpaper': None},
-                    'right': {'elements': [], 'wallpaper': None}
-                },
-                'roomType': '',
-                'roomDimensions': {'length': 8, 'width': 8, 'height': 4},
-                'selectedWall': ''
-            })
+        # Get the current wall design for the user (an empty one if nothing is saved yet)
+        wall_design = get_current_design(db, user_id)
+        return jsonify(absolute_asset_urls(design_for_client(wall_design)))
     except Exception as e:
         logger.info(f"Error getting wall designs: {e}")
         return jsonify({'error': 'Failed to get wall designs'}), 500
@@ -591,56 +630,188 @@ def save_wall_designs():
         user_id = request.user_data['user_id']
         data = request.get_json()
         
-        # Optimize wall designs data before saving
-        wall_designs = data.get('wallDesigns', {})
-        optimized_designs = {}
+        # Only walls with content are saved
+        wall_design_data = design_from_client(data)
         
-        for wall_name, wall_data in wall_designs.items():
-            if wall_data and (wall_data.get('elements') or wall_data.get('wallpaper')):
-                # Only save walls that have actual content
-                optimized_designs[wall_name] = {
-                    'elements': wall_data.get('elements', []),
-                    'wallpaper': wall_data.get('wallpaper')
-                }
-        
-        wall_design_data = {
-            'user_id': user_id,
-            'wall_designs': optimized_designs,
-            'room_type': data.get('roomType', ''),
-            'room_dimensions': data.get('roomDimensions', {}),
-            'selected_wall': data.get('selectedWall', ''),
-            'created_at': datetime.utcnow(),
-            'updated_at': datetime.utcnow()
-        }
+        # Store inline images once and keep only their URLs in the document
+        wall_design_data['wall_designs'] = externalize_data_urls(wall_design_data['wall_designs'])
         
-        # Insert new wall design record
-        result = db.wall_designs.insert_one(wall_design_data)
+        # Update the current wall design in place (snapshots are kept separately)
+        wall_design = save_current_design(
+            db,
+            user_id,
+            wall_design_data,
+            history_limit=app.config['WALL_DESIGN_HISTORY_LIMIT'],
+            snapshot_interval=app.config['WALL_DESIGN_SNAPSHOT_INTERVAL']
+        )
         
         return jsonify({
             'success': True,
-            'message': 'Wall designs saved successfully'
+            'message': 'Wall designs saved successfully',
+            'revision': wall_design['revision']
         })
     except Exception as e:
         logger.info(f"Error saving wall designs: {e}")
         return jsonify({'error': 'Failed to save wall designs'}), 500
 
+@app.route('/api/designs/wall-designs', methods=['PATCH'])
+@require_auth
+def patch_wall_designs():
+    """Apply element-level changes to the current wall design"""
+    try:
+        user_id = request.user_data['user_id']
+        data = request.get_json() or {}
+        
+        base_revision = data.get('baseRevision')
+        if isinstance(base_revision, bool) or not isinstance(base_revision, int):
+            return jsonify({'error': 'baseRevision must be an integer'}), 400
+        
+        try:
+            wall_design = apply_design_patch(
+                db,
+                user_id,
+                base_revision,
+                externalize_data_urls(data.get('operations')),
+                history_limit=app.config['WALL_DESIGN_HISTORY_LIMIT'],
+                snapshot_interval=app.config['WALL_DESIGN_SNAPSHOT_INTERVAL']
+            )
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        except DesignConflict as e:
+            if e.current_revision is None:
+                return jsonify({'error': 'No wall design to patch. Save the full design first.'}), 404
+            return jsonify({
+                'error': 'Wall design has changed since the base revision',
+                'revision': e.current_revision
+            }), 409
+        
+        return jsonify({
+            'success': True,
+            'message': 'Wall designs updated successfully',
+            'revision': wall_design['revision']
+        })
+    except Exception as e:
+        logger.info(f"Error patching wall designs: {e}")
+        return jsonify({'error': 'Failed to update wall designs'}), 500
+
+@app.route('/api/designs/wall-designs/history', methods=['GET'])
+@require_auth
+def get_wall_design_history():
+    """List the retained wall design snapshots for current user"""
+    try:
+        user_id = request.user_data['user_id']
+        history = list_design_history(db, user_id)
+        return jsonify({'history': history}), 200
+    except Exception as e:
+        logger.info(f"Error getting wall design history: {e}")
+        return jsonify({'error': 'Failed to get wall design history'}), 500
+
+@app.route('/api/designs/wall-designs/history/<int:revision>', methods=['GET'])
+@require_auth
+def get_wall_design_snapshot(revision):
+    """Get a single wall design snapshot for current user"""
+    try:
+        user_id = request.user_data['user_id']
+        snapshot = get_design_snapshot(db, user_id, revision)
+        
+        if not snapshot:
+            return jsonify({'error': 'Snapshot not found'}), 404
+        
+        return jsonify({**absolute_asset_urls(design_for_client(snapshot)), 'createdAt': snapshot['created_at']}), 200
+    except Exception as e:
+        logger.info(f"Error getting wall design snapshot: {e}")
+        return jsonify({'error': 'Failed to get wall design snapshot'}), 500
+
+@app.route('/api/designs/wall-designs/export', methods=['GET'])
+@require_auth
+def export_wall_designs():
+    """Download the current wall design as a ZIP of rendered wall PNGs"""
+    try:
+        if not get_design_exporter().enabled:
+            return jsonify({'error': 'Export rendering is not available'}), 503
+        
+        user_id = request.user_data['user_id']
+        wall_design = get_current_design(db, user_id)
+        if not wall_design:
+            return jsonify({'error': 'No wall design found'}), 404
+        
+        revision = wall_design.get('revision', 0)
+        return send_export(
+            f'design-{user_id}-{revision}',
+            wall_design.get('wall_designs'),
+            f'all-wall-designs-r{revision}.zip'
+        )
+    except Exception as e:
+        logger.error(f"Error exporting wall designs: {str(e)}", exc_info=True)
+        return jsonify({'error': 'Failed to export wall designs'}), 500
+
 @app.route('/api/sessions', methods=['GET'])
 @require_auth
 def get_sessions():
-    """Get all sessions for the authenticated user"""
+    """Get the authenticated user's sessions (summaries; `?view=full` includes the designs)
+
+    `?limit=` pages the list by most recent update, with `next_cursor` passed back
+    as `?after=`. `?format=ndjson` streams one session per line as they are read.
+    """
     try:
         user_id = request.user_data['user_id']
-        sessions = list(db.sessions.find({'user_id': user_id}))
+        
+        # Read one extra session to know whether there is a next page
+        try:
+            view, limit, after = session_page_args(request.args)
+            cursor = SessionRepository(db).page_for_user(user_id, view, limit=limit + 1 if limit else 0, after=after)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        if wants_ndjson(request.args, request.accept_mimetypes):
+            return Response(stream_with_context(_stream_sessions(cursor, limit)), mimetype='application/x-ndjson')
+        
+        sessions = list(cursor)
+        next_cursor = None
+        if limit and len(sessions) > limit:
+            sessions = sessions[:limit]
+            next_cursor = SessionRepository.page_cursor(sessions[-1])
         
         # Convert ObjectId to string
         for session in sessions:
             session['_id'] = str(session['_id'])
         
-        return jsonify({'sessions': sessions}), 200
+        return jsonify({'sessions': absolute_asset_urls(sessions), 'next_cursor': next_cursor}), 200
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def session_page_args(args):
+    """(view, limit, after) from the GET /api/sessions query string; ValueError if invalid"""
+    view = args.get('view', 'summary')
+    if view not in SessionRepository.views:
+        raise ValueError(f'Unknown view: {view}')
+    try:
+        limit = int(args.get('limit', 0))
+    except ValueError:
+        raise ValueError('limit must be an integer')
+    if limit < 0:
+        raise ValueError('limit must not be negative')
+    return view, min(limit, app.config['SESSIONS_MAX_PAGE_SIZE']), args.get('after')
+
+def wants_ndjson(args, accept_mimetypes):
+    """Whether the client asked for the session list as NDJSON"""
+    return args.get('format') == 'ndjson' or accept_mimetypes.best == 'application/x-ndjson'
+
+def _stream_sessions(cursor, limit):
+    """NDJSON lines for the sessions in `cursor`, then a `next_cursor` line if the page is full"""
+    try:
+        last = None
+        for count, session in enumerate(cursor, 1):
+            if limit and count > limit:
+                yield current_app.json.dumps({'next_cursor': SessionRepository.page_cursor(last)}) + '\n'
+                break
+            last = {'_id': session['_id'], 'updated_at': session.get('updated_at')}
+            session['_id'] = str(session['_id'])
+            yield current_app.json.dumps(absolute_asset_urls(session)) + '\n'
+    finally:
+        cursor.close()
+
 @app.route('/api/sessions', methods=['POST'])
 @require_auth
 def save_session():
@@ -649,23 +820,16 @@ def save_session():
         user_id = request.user_data['user_id']
         data = request.get_json()
         
-        session_data = {
-            'user_id': user_id,
-            'session_name': data.get('session_name'),
-            'room_type': data.get('room_type'),
-            'room_dimensions': data.get('room_dimensions'),
-            'wall_designs': data.get('wall_designs'),
-            'selected_wall': data.get('selected_wall'),
-            'created_at': datetime.utcnow(),
-            'updated_at': datetime.utcnow()
-        }
+        session_data = {'user_id': user_id, **SessionRepository.fields_from(data)}
+        session_data['wall_designs'] = externalize_data_urls(session_data['wall_designs'])
+        session_data['created_at'] = session_data['updated_at'] = datetime.utcnow()
         
         result = db.sessions.insert_one(session_data)
         session_data['_id'] = str(result.inserted_id)
         
         return jsonify({
             'message': 'Session saved successfully',
-            'session': session_data
+            'session': absolute_asset_urls(session_data)
         }), 201
         
     except Exception as e:
@@ -682,20 +846,50 @@ def get_session(session_id):
         if not ObjectId.is_valid(session_id):
             return jsonify({'error': 'Invalid session ID'}), 400
         
-        session_data = db.sessions.find_one({
-            '_id': ObjectId(session_id),
-            'user_id': user_id
-        })
+        session_data = SessionRepository(db).get_for_user(session_id, user_id)
         
         if not session_data:
             return jsonify({'error': 'Session not found'}), 404
         
         session_data['_id'] = str(session_data['_id'])
-        return jsonify({'session': session_data}), 200
+        return jsonify({'session': absolute_asset_urls(session_data)}), 200
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/sessions/<session_id>/export', methods=['GET'])
+@require_auth
+def export_session(session_id):
+    """Download a saved session as a ZIP of rendered wall PNGs"""
+    try:
+        if not get_design_exporter().enabled:
+            return jsonify({'error': 'Export rendering is not available'}), 503
+        
+        user_id = request.user_data['user_id']
+        
+        # Validate ObjectId
+        if not ObjectId.is_valid(session_id):
+            return jsonify({'error': 'Invalid session ID'}), 400
+        
+        session_data = db.sessions.find_one(
+            {'_id': ObjectId(session_id), 'user_id': user_id},
+            {'wall_designs': 1, 'updated_at': 1}
+        )
+        if not session_data:
+            return jsonify({'error': 'Session not found'}), 404
+        
+        # Sessions have no revision counter, so their last update time versions the cache
+        updated_at = session_data.get('updated_at') or session_data['_id'].generation_time
+        version = int(updated_at.timestamp() * 1000)
+        return send_export(
+            f'session-{session_id}-{version}',
+            session_data.get('wall_designs'),
+            f'session-{session_id}-walls.zip'
+        )
+    except Exception as e:
+        logger.error(f"Error exporting session: {str(e)}", exc_info=True)
+        return jsonify({'error': 'Failed to export session'}), 500
+
 @app.route('/api/sessions/<session_id>', methods=['PUT'])
 @require_auth
 def update_session(session_id):
@@ -708,14 +902,9 @@ def update_session(session_id):
         if not ObjectId.is_valid(session_id):
             return jsonify({'error': 'Invalid session ID'}), 400
         
-        update_data = {
-            'session_name': data.get('session_name'),
-            'room_type': data.get('room_type'),
-            'room_dimensions': data.get('room_dimensions'),
-            'wall_designs': data.get('wall_designs'),
-            'selected_wall': data.get('selected_wall'),
-            'updated_at': datetime.utcnow()
-        }
+        update_data = SessionRepository.fields_from(data)
+        update_data['wall_designs'] = externalize_data_urls(update_data['wall_designs'])
+        update_data['updated_at'] = datetime.utcnow()
         
         result = db.sessions.update_one(
             {'_id': ObjectId(session_id), 'user_id': user_id},
@@ -732,6 +921,7 @@ def update_session(session_id):
 
 
 @app.route('/api/auth/resend-verification', methods=['POST'])
+@rate_limit('resend_verification', account_field='email')
 def resend_verification():
     """Resend verification email with a new 15-minute valid token"""
     try:
@@ -741,8 +931,8 @@ def resend_verification():
         if not email:
             return jsonify({'error': 'Email is required'}), 400
         
-        # Find user by email
-        user = db.users.find_one({'email': email})
+        # Find user by email (ignoring case)
+        user = UserRepository(db).find_by_email(email)
         
         if not user:
             return jsonify({'error': 'No account found with this email'}), 404
@@ -810,38 +1000,62 @@ def delete_session(session_id):
         return jsonify({'error': str(e)}), 500
 
 # Frontend serving routes
+def serve_index():
+    """Serve the React app entry point"""
+    response = get_static_assets().send('index.html')
+    if response is None:
+        return jsonify({'error': 'Frontend build not found'}), 404
+    return response
+
 @app.route('/')
 def serve_home():
     """Serve the React app home page"""
-    return send_from_directory(app.static_folder, 'index.html')
+    return serve_index()
+
+@app.route('/api/static-manifest', methods=['GET'])
+def static_manifest():
+    """Map of static paths to content versions for cache-busting `?v=` URLs"""
+    response = jsonify(get_static_assets().manifest())
+    response.headers['Cache-Control'] = 'public, no-cache'
+    return response
 
 @app.route('/<path:path>')
 def serve_static(path):
     """Serve static files from the React build or fallback to index.html"""
-    file_path = os.path.join(app.static_folder, path)
-    if os.path.exists(file_path) and os.path.isfile(file_path):
-        return send_from_directory(app.static_folder, path)
-    else:
-        return send_from_directory(app.static_folder, 'index.html')
+    response = get_static_assets().send(path)
+    if response is None:
+        return serve_index()
+    return response
 
 @app.errorhandler(404)
 def not_found(e):
     """Handle React Router routes by serving index.html"""
-    return send_from_directory(app.static_folder, 'index.html')
+    return serve_index()
 
 @app.route('/api/feedback', methods=['GET'])
 def get_feedback():
     """
-    Get all feedback entries (both approved and unapproved)
-    No authentication required as this is a public endpoint
+    Get a page of feedback entries (both approved and unapproved) with rating stats
+    No authentication required as this is a public endpoint, so pages are cached
     """
     try:
-        # Changed: Removed the 'approved' filter to show all feedback
-        feedback = list(db.feedback.find({}, {'_id': 0, 'email': 0}).sort('date', -1))
-        return jsonify({
-            'success': True,
-            'data': feedback
-        }), 200
+        try:
+            limit = request.args.get('limit')
+            body, etag = get_feedback_feed().get_page(
+                int(limit) if limit else None, after=request.args.get('after')
+            )
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 400
+        
+        response = Response(body, mimetype='application/json')
+        response.set_etag(etag)
+        # Browsers revalidate every time; unchanged pages cost a 304
+        response.cache_control.public = True
+        response.cache_control.no_cache = True
+        return response.make_conditional(request)
     except Exception as e:
         logger.info(f"Error fetching feedback: {e}")
         return jsonify({
@@ -850,6 +1064,7 @@ def get_feedback():
         }), 500
 
 @app.route('/api/feedback', methods=['POST'])
+@rate_limit('feedback')
 def submit_feedback():
     """
     Submit new feedback
@@ -885,6 +1100,7 @@ def submit_feedback():
         
         # Insert into database
         result = db.feedback.insert_one(feedback)
+        invalidate_feedback_feed()
         feedback['id'] = str(result.inserted_id)
         
         # Don't return email in the response for privacy
@@ -904,9 +1120,5 @@ def submit_feedback():
         }), 500
 
 if __name__ == '__main__':
-    # Create indexes for feedback collection
-    db.feedback.create_index('date')
-    db.feedback.create_index('rating')
-    db.feedback.create_index('approved')
-    
+    start_worker_services()
     app.run(debug=debug, host='0.0.0.0', port=port)
\ No newline at end of file
@@ -0,0 +1,89 @@
+from flask import Blueprint, request, jsonify, send_file
+from utils.auth_utils import require_auth
+from services.asset_store import get_asset_store, asset_url, asset_base_url, ASSET_NAME_PATTERN, EXTENSION_TYPES
+from services.image_derivatives import get_image_derivatives, FORMATS
+from services.static_assets import IMMUTABLE_CACHE_CONTROL, REVALIDATE_CACHE_CONTROL
+import logging
+
+logger = logging.getLogger(__name__)
+
+assets_bp = Blueprint('assets', __name__, url_prefix='/api/assets')
+
+
+@assets_bp.route('', methods=['POST'])
+@require_auth
+def upload_asset():
+    """Store an uploaded image (multipart `file` or JSON `dataUrl`) and return its URL"""
+    try:
+        store = get_asset_store()
+        upload = request.files.get('file')
+        
+        try:
+            if upload:
+                data = upload.read()
+                name = store.store(data, upload.mimetype)
+            else:
+                data = request.get_json(silent=True) or {}
+                data_url = data.get('dataUrl')
+                if not data_url:
+                    return jsonify({'error': 'An image file or dataUrl is required'}), 400
+                name = store.store_data_url(data_url)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        return jsonify({
+            'id': name,
+            'url': asset_url(name, asset_base_url())
+        }), 201
+        
+    except Exception as e:
+        logger.error(f"Error uploading asset: {str(e)}", exc_info=True)
+        return jsonify({'error': 'Failed to store asset'}), 500
+
+@assets_bp.route('/<path:name>', methods=['GET'])
+def get_asset(name):
+    """
+    Serve an uploaded image (`<sha256>.<ext>`) or a catalog image (e.g. `images/candle1.png`).
+    `?w=<width>&fmt=<webp|png|jpeg>` serves a resized / re-encoded derivative.
+    """
+    derivatives = get_image_derivatives()
+    width = request.args.get('w', 0, type=int)
+    fmt = request.args.get('fmt')
+    
+    match = ASSET_NAME_PATTERN.match(name)
+    if match:
+        store = get_asset_store()
+        if not store.exists(name):
+            return jsonify({'error': 'Asset not found'}), 404
+        source_hash, mimetype = match.group(1), EXTENSION_TYPES[match.group(2)]
+        open_source = original = lambda: store.open(name)
+        # Asset names are content hashes, so a response never changes
+        immutable = True
+    else:
+        entry = derivatives.catalog.files.get(name)
+        if entry is None:
+            return jsonify({'error': 'Asset not found'}), 404
+        source_hash, mimetype = entry.etag, entry.mimetype
+        open_source = lambda: open(entry.path, 'rb')
+        original = lambda: entry.path
+        immutable = request.args.get('v') == entry.version
+    
+    if width or fmt:
+        if width and width not in derivatives.widths:
+            return jsonify({'error': f"w must be one of {sorted(derivatives.widths)}"}), 400
+        if fmt and fmt not in FORMATS:
+            return jsonify({'error': f"fmt must be one of {sorted(FORMATS)}"}), 400
+    
+    if (width or fmt) and derivatives.enabled:
+        fmt = fmt or 'webp'
+        try:
+            path = derivatives.get(source_hash, open_source, width, fmt)
+        except Exception as e:
+            logger.error(f"Error rendering derivative of {name}: {str(e)}", exc_info=True)
+            return jsonify({'error': 'Failed to render image'}), 500
+        response = send_file(path, mimetype=FORMATS[fmt][1], etag=f'{source_hash}-{width}.{fmt}', conditional=True)
+    else:
+        response = send_file(original(), mimetype=mimetype, etag=source_hash, conditional=True)
+    
+    response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL if immutable else REVALIDATE_CACHE_CONTROL
+    return response
@@ -0,0 +1,428 @@
+"""
+ASGI build of the API.
+
+The session and wall design endpoints, which the editor calls constantly and
+which are each a Mongo round trip or two, are served by async handlers on
+Motor, so one process keeps thousands of them in flight while it waits on the
+database. Every other request is passed to the Flask app unchanged (in a thread
+pool of ASYNC_FLASK_THREADS), so URLs, cookies, CORS and response bodies are
+the same as the WSGI build:
+
+    uvicorn routes.async_app:app --workers 4
+    GUNICORN_WORKER_CLASS=uvicorn.workers.UvicornWorker gunicorn -c configs/gunicorn_config.py routes.async_app:app
+
+Request parsing, projections, paging cursors, design validation and JSON
+encoding are the Flask app's own (services.repositories, services.design_store,
+app.json), so both builds accept and return the same data.
+
+Needs the `motor`, `starlette`, `uvicorn` and `a2wsgi` packages (requirements-async.txt).
+"""
+import contextlib
+import json
+from datetime import datetime
+from functools import wraps
+from a2wsgi import WSGIMiddleware
+from bson import ObjectId
+from flask.sessions import SecureCookieSession
+from itsdangerous import BadSignature
+from starlette.concurrency import run_in_threadpool
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import Response, StreamingResponse
+from starlette.routing import Match, Route, Router
+from werkzeug.datastructures import MIMEAccept
+from werkzeug.http import parse_accept_header
+from configs.mongo import get_async_database, close_async_client
+from routes.app import app as flask_app, CORS_API_RESOURCE, session_page_args, start_worker_services, wants_ndjson
+from services.asset_store import get_asset_store, rebase_asset_urls
+from services.async_design_store import (
+    get_current_design, save_current_design, apply_design_patch, list_design_history, get_design_snapshot
+)
+from services.design_store import design_from_client, design_for_client, DesignConflict
+from services.repositories import SessionRepository
+import logging
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+
+class RequestTooLarge(Exception):
+    """Raised when a request body exceeds MAX_CONTENT_LENGTH"""
+
+
+def json_response(data, status=200):
+    """JSON response encoded exactly as Flask's `jsonify` would"""
+    return Response(flask_app.json.response(data).get_data(), status_code=status, media_type='application/json')
+
+
+async def read_json(request):
+    """The request body parsed as JSON (None if it is not JSON), capped at MAX_CONTENT_LENGTH"""
+    limit = flask_app.config['MAX_CONTENT_LENGTH']
+    body = bytearray()
+    async for chunk in request.stream():
+        body += chunk
+        if limit and len(body) > limit:
+            raise RequestTooLarge()
+    try:
+        return json.loads(body)
+    except ValueError:
+        return None
+
+
+def _has_data_url(value):
+    if isinstance(value, str):
+        return value.startswith('data:image/')
+    if isinstance(value, dict):
+        return any(_has_data_url(item) for item in value.values())
+    if isinstance(value, list):
+        return any(_has_data_url(item) for item in value)
+    return False
+
+
+async def externalize_data_urls(value):
+    """Swap inline image data URLs for relative asset references; the asset writes run in a worker thread"""
+    if not _has_data_url(value):
+        return rebase_asset_urls(value)
+
+    def store():
+        with flask_app.app_context():
+            return get_asset_store().externalize(value)
+
+    return await run_in_threadpool(store)
+
+
+def absolute_asset_urls(request, value):
+    """Resolve stored asset references against ASSET_BASE_URL or this request's host, as Flask does"""
+    return rebase_asset_urls(value, flask_app.config.get('ASSET_BASE_URL') or str(request.base_url))
+
+
+def load_session(request):
+    """The Flask session from the request's cookie (empty if missing, tampered with or expired)"""
+    interface = flask_app.session_interface
+    serializer = interface.get_signing_serializer(flask_app)
+    value = request.cookies.get(interface.get_cookie_name(flask_app))
+    if not value or serializer is None:
+        return SecureCookieSession()
+    try:
+        max_age = int(flask_app.permanent_session_lifetime.total_seconds())
+        return SecureCookieSession(serializer.loads(value, max_age=max_age))
+    except BadSignature:
+        return SecureCookieSession()
+
+
+def refresh_session(response, session):
+    """Re-issue the session cookie with a new expiry, as Flask does on every request"""
+    response.headers.append('Vary', 'Cookie')
+    if not (session.permanent and flask_app.config['SESSION_REFRESH_EACH_REQUEST']):
+        return
+    interface = flask_app.session_interface
+    response.set_cookie(
+        interface.get_cookie_name(flask_app),
+        interface.get_signing_serializer(flask_app).dumps(dict(session)),
+        expires=interface.get_expiration_time(flask_app, session),
+        path=interface.get_cookie_path(flask_app),
+        domain=interface.get_cookie_domain(flask_app),
+        secure=interface.get_cookie_secure(flask_app),
+        httponly=interface.get_cookie_httponly(flask_app),
+        samesite=interface.get_cookie_samesite(flask_app)
+    )
+
+
+def require_auth(handler):
+    """Async counterpart of `require_auth`: 401 without a logged-in session, else `request.state.user`"""
+    @wraps(handler)
+    async def endpoint(request):
+        session = load_session(request)
+        if not session.get('logged_in'):
+            return json_response({'error': 'Authentication required'}, 401)
+        request.state.user = {
+            'user_id': session.get('user_id'),
+            'username': session.get('username'),
+            'role': session.get('role')
+        }
+        try:
+            response = await handler(request)
+        except RequestTooLarge:
+            response = json_response({'error': 'Request body is too large'}, 413)
+        refresh_session(response, session)
+        return response
+    return endpoint
+
+
+@require_auth
+async def get_sessions(request):
+    """Get the authenticated user's sessions (same paging and NDJSON options as the Flask view)"""
+    try:
+        user_id = request.state.user['user_id']
+        try:
+            view, limit, after = session_page_args(request.query_params)
+            cursor = SessionRepository(get_async_database()).page_for_user(
+                user_id, view, limit=limit + 1 if limit else 0, after=after
+            )
+        except ValueError as e:
+            return json_response({'error': str(e)}, 400)
+
+        if wants_ndjson(request.query_params, parse_accept_header(request.headers.get('accept'), MIMEAccept)):
+            return StreamingResponse(_stream_sessions(request, cursor, limit), media_type='application/x-ndjson')
+
+        sessions = await cursor.to_list(length=None)
+        next_cursor = None
+        if limit and len(sessions) > limit:
+            sessions = sessions[:limit]
+            next_cursor = SessionRepository.page_cursor(sessions[-1])
+        for session in sessions:
+            session['_id'] = str(session['_id'])
+        return json_response({'sessions': absolute_asset_urls(request, sessions), 'next_cursor': next_cursor})
+    except Exception as e:
+        return json_response({'error': str(e)}, 500)
+
+
+async def _stream_sessions(request, cursor, limit):
+    try:
+        last = None
+        count = 0
+        async for session in cursor:
+            count += 1
+            if limit and count > limit:
+                yield flask_app.json.dumps({'next_cursor': SessionRepository.page_cursor(last)}) + '\n'
+                break
+            last = {'_id': session['_id'], 'updated_at': session.get('updated_at')}
+            session['_id'] = str(session['_id'])
+            yield flask_app.json.dumps(absolute_asset_urls(request, session)) + '\n'
+    finally:
+        await cursor.close()
+
+
+@require_auth
+async def save_session(request):
+    """Save a new session"""
+    try:
+        data = await read_json(request)
+        session_data = {'user_id': request.state.user['user_id'], **SessionRepository.fields_from(data)}
+        session_data['wall_designs'] = await externalize_data_urls(session_data['wall_designs'])
+        session_data['created_at'] = session_data['updated_at'] = datetime.utcnow()
+
+        result = await get_async_database().sessions.insert_one(session_data)
+        session_data['_id'] = str(result.inserted_id)
+        return json_response({'message': 'Session saved successfully', 'session': absolute_asset_urls(request, session_data)}, 201)
+    except RequestTooLarge:
+        raise
+    except Exception as e:
+        return json_response({'error': str(e)}, 500)
+
+
+@require_auth
+async def get_session(request):
+    """Get a specific session"""
+    try:
+        session_id = request.path_params['session_id']
+        if not ObjectId.is_valid(session_id):
+            return json_response({'error': 'Invalid session ID'}, 400)
+
+        session_data = await SessionRepository(get_async_database()).get_for_user(session_id, request.state.user['user_id'])
+        if not session_data:
+            return json_response({'error': 'Session not found'}, 404)
+
+        session_data['_id'] = str(session_data['_id'])
+        return json_response({'session': absolute_asset_urls(request, session_data)})
+    except Exception as e:
+        return json_response({'error': str(e)}, 500)
+
+
+@require_auth
+async def update_session(request):
+    """Update a session"""
+    try:
+        data = await read_json(request)
+        session_id = request.path_params['session_id']
+        if not ObjectId.is_valid(session_id):
+            return json_response({'error': 'Invalid session ID'}, 400)
+
+        update_data = SessionRepository.fields_from(data)
+        update_data['wall_designs'] = await externalize_data_urls(update_data['wall_designs'])
+        update_data['updated_at'] = datetime.utcnow()
+
+        result = await get_async_database().sessions.update_one(
+            {'_id': ObjectId(session_id), 'user_id': request.state.user['user_id']},
+            {'$set': update_data}
+        )
+        if result.matched_count == 0:
+            return json_response({'error': 'Session not found'}, 404)
+        return json_response({'message': 'Session updated successfully'})
+    except RequestTooLarge:
+        raise
+    except Exception as e:
+        return json_response({'error': str(e)}, 500)
+
+
+@require_auth
+async def delete_session(request):
+    """Delete a session"""
+    try:
+        result = await get_async_database().sessions.delete_one({
+            '_id': ObjectId(request.path_params['session_id']),
+            'user_id': request.state.user['user_id']
+        })
+        if result.deleted_count == 0:
+            return json_response({'error': 'Session not found'}, 404)
+        return json_response({'message': 'Session deleted successfully'})
+    except Exception as e:
+        return json_response({'error': str(e)}, 500)
+
+
+@require_auth
+async def get_wall_designs(request):
+    """Get wall designs for current user"""
+    try:
+        wall_design = await get_current_design(get_async_database(), request.state.user['user_id'])
+        return json_response(absolute_asset_urls(request, design_for_client(wall_design)))
+    except Exception as e:
+        logger.info(f"Error getting wall designs: {e}")
+        return json_response({'error': 'Failed to get wall designs'}, 500)
+
+
+@require_auth
+async def save_wall_designs(request):
+    """Save wall designs for current user"""
+    try:
+        wall_design_data = design_from_client(await read_json(request))
+        wall_design_data['wall_designs'] = await externalize_data_urls(wall_design_data['wall_designs'])
+
+        wall_design = await save_current_design(
+            get_async_database(),
+            request.state.user['user_id'],
+            wall_design_data,
+            history_limit=flask_app.config['WALL_DESIGN_HISTORY_LIMIT'],
+            snapshot_interval=flask_app.config['WALL_DESIGN_SNAPSHOT_INTERVAL']
+        )
+        return json_response({
+            'success': True,
+            'message': 'Wall designs saved successfully',
+            'revision': wall_design['revision']
+        })
+    except RequestTooLarge:
+        raise
+    except Exception as e:
+        logger.info(f"Error saving wall designs: {e}")
+        return json_response({'error': 'Failed to save wall designs'}, 500)
+
+
+@require_auth
+async def patch_wall_designs(request):
+    """Apply element-level changes to the current wall design"""
+    try:
+        data = await read_json(request) or {}
+
+        base_revision = data.get('baseRevision')
+        if isinstance(base_revision, bool) or not isinstance(base_revision, int):
+            return json_response({'error': 'baseRevision must be an integer'}, 400)
+
+        try:
+            wall_design = await apply_design_patch(
+                get_async_database(),
+                request.state.user['user_id'],
+                base_revision,
+                await externalize_data_urls(data.get('operations')),
+                history_limit=flask_app.config['WALL_DESIGN_HISTORY_LIMIT'],
+                snapshot_interval=flask_app.config['WALL_DESIGN_SNAPSHOT_INTERVAL']
+            )
+        except ValueError as e:
+            return json_response({'error': str(e)}, 400)
+        except DesignConflict as e:
+            if e.current_revision is None:
+                return json_response({'error': 'No wall design to patch. Save the full design first.'}, 404)
+            return json_response({
+                'error': 'Wall design has changed since the base revision',
+                'revision': e.current_revision
+            }, 409)
+
+        return json_response({
+            'success': True,
+            'message': 'Wall designs updated successfully',
+            'revision': wall_design['revision']
+        })
+    except RequestTooLarge:
+        raise
+    except Exception as e:
+        logger.info(f"Error patching wall designs: {e}")
+        return json_response({'error': 'Failed to update wall designs'}, 500)
+
+
+@require_auth
+async def get_wall_design_history(request):
+    """List the retained wall design snapshots for current user"""
+    try:
+        history = await list_design_history(get_async_database(), request.state.user['user_id'])
+        return json_response({'history': history})
+    except Exception as e:
+        logger.info(f"Error getting wall design history: {e}")
+        return json_response({'error': 'Failed to get wall design history'}, 500)
+
+
+@require_auth
+async def get_wall_design_snapshot(request):
+    """Get a single wall design snapshot for current user"""
+    try:
+        snapshot = await get_design_snapshot(
+            get_async_database(), request.state.user['user_id'], request.path_params['revision']
+        )
+        if not snapshot:
+            return json_response({'error': 'Snapshot not found'}, 404)
+        return json_response({**absolute_asset_urls(request, design_for_client(snapshot)), 'createdAt': snapshot['created_at']})
+    except Exception as e:
+        logger.info(f"Error getting wall design snapshot: {e}")
+        return json_response({'error': 'Failed to get wall design snapshot'}, 500)
+
+
+routes = [
+    Route('/api/sessions', get_sessions, methods=['GET']),
+    Route('/api/sessions', save_session, methods=['POST']),
+    Route('/api/sessions/{session_id}', get_session, methods=['GET']),
+    Route('/api/sessions/{session_id}', update_session, methods=['PUT']),
+    Route('/api/sessions/{session_id}', delete_session, methods=['DELETE']),
+    Route('/api/designs/wall-designs', get_wall_designs, methods=['GET']),
+    Route('/api/designs/wall-designs', save_wall_designs, methods=['POST']),
+    Route('/api/designs/wall-designs', patch_wall_designs, methods=['PATCH']),
+    Route('/api/designs/wall-designs/history', get_wall_design_history, methods=['GET']),
+    Route('/api/designs/wall-designs/history/{revision:int}', get_wall_design_snapshot, methods=['GET'])
+]
+
+
+@contextlib.asynccontextmanager
+async def lifespan(_):
+    # Already done in post_fork under gunicorn; this covers running uvicorn directly
+    start_worker_services()
+    yield
+    close_async_client()
+
+
+class AsyncAPI:
+    """Serves `routes` asynchronously and hands every other request to the Flask app"""
+
+    def __init__(self, routes, fallback):
+        self.routes = routes
+        self.router = Router(routes=routes, lifespan=lifespan)
+        self.api = CORSMiddleware(
+            self.router,
+            allow_origins=CORS_API_RESOURCE['origins'],
+            allow_methods=CORS_API_RESOURCE['methods'],
+            allow_headers=CORS_API_RESOURCE['allow_headers'],
+            allow_credentials=CORS_API_RESOURCE['supports_credentials'],
+            expose_headers=CORS_API_RESOURCE['expose_headers'],
+            max_age=CORS_API_RESOURCE['max_age']
+        )
+        self.fallback = fallback
+
+    def handles(self, scope):
+        # Other methods on these paths (and CORS preflights) are answered here too
+        return any(route.matches(scope)[0] != Match.NONE for route in self.routes)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.router(scope, receive, send)
+        elif scope['type'] == 'http' and self.handles(scope):
+            await self.api(scope, receive, send)
+        else:
+            await self.fallback(scope, receive, send)
+
+
+app = AsyncAPI(routes, WSGIMiddleware(flask_app, workers=flask_app.config['ASYNC_FLASK_THREADS']))
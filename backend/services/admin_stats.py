@@ -0,0 +1,176 @@
+"""
+Materialized admin dashboard statistics.
+
+Totals, recent sessions and per-day signups / sessions are computed with one
+aggregation and stored as a single document in the
+`stats` collection. A background thread in each worker refreshes it every
+ADMIN_STATS_REFRESH_INTERVAL seconds; a lease on the document makes sure only
+one worker recomputes per interval. The dashboard only reads that document.
+"""
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from flask import current_app
+from pymongo.errors import DuplicateKeyError
+from configs.schema import USER_STATS_INDEX
+from services.repositories import SessionRepository
+import logging
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+STATS_ID = 'admin_dashboard'
+
+
+def _per_day(since):
+    """Facet stages counting documents per UTC day of `created_at` since `since`"""
+    return [
+        {'$match': {'created_at': {'$gte': since}}},
+        {'$group': {'_id': {'$dateToString': {'format': '%Y-%m-%d', 'date': '$created_at'}}, 'count': {'$sum': 1}}},
+        {'$sort': {'_id': 1}}
+    ]
+
+
+def _fill_days(rows, since, days):
+    """Per-day series with zero counts for days without documents"""
+    counts = {row['_id']: row['count'] for row in rows}
+    dates = [(since + timedelta(days=offset)).strftime('%Y-%m-%d') for offset in range(days)]
+    return [{'date': date, 'count': counts.get(date, 0)} for date in dates]
+
+
+def compute_stats(db, days=30):
+    """Dashboard statistics, read with one aggregation over users and sessions"""
+    today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    since = today - timedelta(days=days - 1)
+
+    # $facet cannot use indexes, so it only sees the few indexed fields each counter needs:
+    # sorting on an index and projecting to its keys reads the index, never the documents
+    # (and never the sessions' wall_designs)
+    stats = next(db.users.aggregate([
+        {'$sort': dict(USER_STATS_INDEX)},
+        {'$project': {'_id': 0, **{field: 1 for field, _ in USER_STATS_INDEX}}},
+        {'$set': {'kind': 'user'}},
+        {'$unionWith': {'coll': 'sessions', 'pipeline': [
+            {'$sort': {'created_at': 1}},
+            {'$project': {'_id': 0, 'created_at': 1}},
+            {'$set': {'kind': 'session'}}
+        ]}},
+        {'$unionWith': {'coll': 'sessions', 'pipeline': [
+            {'$sort': {'created_at': -1}},
+            {'$limit': 10},
+            {'$project': SessionRepository.views['summary']},
+            {'$set': {'kind': 'recent'}}
+        ]}},
+        {'$facet': {
+            'roles': [{'$match': {'kind': 'user'}}, {'$group': {'_id': '$role', 'count': {'$sum': 1}}}],
+            'verified': [{'$match': {'kind': 'user', 'email_verified': True}}, {'$count': 'count'}],
+            'inactive': [{'$match': {'kind': 'user', 'is_active': False}}, {'$count': 'count'}],
+            'signups_per_day': [{'$match': {'kind': 'user'}}] + _per_day(since),
+            'sessions': [{'$match': {'kind': 'session'}}, {'$count': 'count'}],
+            'sessions_per_day': [{'$match': {'kind': 'session'}}] + _per_day(since),
+            'recent': [{'$match': {'kind': 'recent'}}, {'$sort': {'created_at': -1}}, {'$project': {'kind': 0}}]
+        }}
+    ]))
+
+    roles = {row['_id']: row['count'] for row in stats['roles']}
+    for session in stats['recent']:
+        session['_id'] = str(session['_id'])
+
+    return {
+        'total_users': sum(roles.values()),
+        'admin_users': roles.get('admin', 0),
+        'regular_users': roles.get('user', 0),
+        'verified_users': stats['verified'][0]['count'] if stats['verified'] else 0,
+        'inactive_users': stats['inactive'][0]['count'] if stats['inactive'] else 0,
+        'total_sessions': stats['sessions'][0]['count'] if stats['sessions'] else 0,
+        'recent_sessions': stats['recent'],
+        'signups_per_day': _fill_days(stats['signups_per_day'], since, days),
+        'sessions_per_day': _fill_days(stats['sessions_per_day'], since, days)
+    }
+
+
+class AdminStats:
+    """Keeps the materialized dashboard document fresh"""
+
+    def __init__(self, app, db):
+        self.db = db
+        self.interval = app.config['ADMIN_STATS_REFRESH_INTERVAL']
+        self.days = app.config['ADMIN_STATS_DAYS']
+        self._lock = threading.Lock()
+        self._thread = None
+        self._thread_pid = None
+        self._stopping = threading.Event()
+
+    @property
+    def collection(self):
+        return self.db.stats
+
+    def start(self):
+        """Start the refresh thread for this process (again after a fork)"""
+        with self._lock:
+            if self._thread is not None and self._thread_pid == os.getpid() and self._thread.is_alive():
+                return
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self.run, name='admin-stats', daemon=True)
+            self._thread_pid = os.getpid()
+            self._thread.start()
+
+    def stop(self):
+        self._stopping.set()
+
+    def run(self):
+        while not self._stopping.is_set():
+            try:
+                self.refresh_if_stale()
+            except Exception as e:
+                logger.error(f"Admin stats refresh failed: {e}")
+            self._stopping.wait(self.interval)
+
+    def refresh_if_stale(self):
+        """Recompute the stats unless another worker did (or is doing) so this interval"""
+        now = datetime.utcnow()
+        try:
+            # Claim the refresh; fails with a duplicate key while another worker's lease is valid
+            self.collection.update_one(
+                {'_id': STATS_ID, 'lease_until': {'$not': {'$gt': now}}},
+                {'$set': {'lease_until': now + timedelta(seconds=self.interval)}},
+                upsert=True
+            )
+        except DuplicateKeyError:
+            return False
+        self.refresh()
+        return True
+
+    def refresh(self):
+        """Recompute and store the stats document"""
+        started = time.perf_counter()
+        stats = compute_stats(self.db, self.days)
+        stats['generated_at'] = datetime.utcnow()
+        self.collection.update_one({'_id': STATS_ID}, {'$set': stats}, upsert=True)
+        logger.debug(f"Admin stats refreshed in {time.perf_counter() - started:.2f}s")
+        return stats
+
+    def get(self, refresh=False):
+        """The stored stats document, computed now if there is none yet"""
+        stats = None if refresh else self.collection.find_one({'_id': STATS_ID, 'generated_at': {'$exists': True}})
+        if stats is None:
+            stats = self.refresh()
+        stats.pop('_id', None)
+        stats.pop('lease_until', None)
+        return stats
+
+
+def init_admin_stats(app, db):
+    """Create the admin stats refresher for the app (refreshing starts with get_admin_stats)"""
+    admin_stats = AdminStats(app, db)
+    app.extensions['admin_stats'] = admin_stats
+    return admin_stats
+
+
+def get_admin_stats():
+    """Get the admin stats refresher for the current app, (re)starting it in this process if needed"""
+    admin_stats = current_app.extensions['admin_stats']
+    if current_app.config['ADMIN_STATS_REFRESH_INTERVAL'] > 0:
+        admin_stats.start()
+    return admin_stats
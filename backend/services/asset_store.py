@@ -0,0 +1,219 @@
+"""
+Content-addressed storage for uploaded images.
+
+Images are identified by the SHA-256 of their bytes, so the same image
+uploaded by many users (or saved on every autosave) is only stored once.
+Design documents keep a short relative `/api/assets/<name>` reference instead
+of an inline `data:` URL; responses turn it into an absolute URL on the way
+out, so no client-supplied host is ever stored.
+"""
+import base64
+import binascii
+import hashlib
+import os
+import re
+import tempfile
+import gridfs
+from flask import current_app, request
+from configs.mongo import resolve_database
+import logging
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Accepted image types and the extension used in asset names
+CONTENT_TYPES = {
+    'image/png': 'png',
+    'image/jpeg': 'jpg',
+    'image/gif': 'gif',
+    'image/webp': 'webp'
+}
+EXTENSION_TYPES = {ext: content_type for content_type, ext in CONTENT_TYPES.items()}
+
+DATA_URL_PATTERN = re.compile(r'^data:(image/[\w.+-]+);base64,(.*)$', re.DOTALL)
+ASSET_NAME_PATTERN = re.compile(r'^([0-9a-f]{64})\.(png|jpg|gif|webp)$')
+
+ASSET_URL_PATH = '/api/assets/'
+
+# An asset link as stored (`/api/assets/<name>`) or as sent to clients, with an origin in front
+ASSET_LINK_PATTERN = re.compile(
+    r'^(?:https?://[^/?#]*)?' + re.escape(ASSET_URL_PATH) + r'([0-9a-f]{64}\.(?:png|jpg|gif|webp))$'
+)
+
+
+class LocalAssetBackend:
+    """Stores assets as files under a local directory, sharded by hash prefix"""
+
+    def __init__(self, root):
+        self.root = root
+
+    def path(self, name):
+        return os.path.join(self.root, name[:2], name)
+
+    def exists(self, name):
+        return os.path.isfile(self.path(name))
+
+    def put(self, name, data, content_type):
+        path = self.path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write to a temp file first so readers never see a partial asset
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def open(self, name):
+        return open(self.path(name), 'rb')
+
+
+class GridFSAssetBackend:
+    """Stores assets in MongoDB GridFS (`assets.files` / `assets.chunks`)"""
+
+    def __init__(self, db):
+        self.db = db
+        self._fs = None
+        self._fs_pid = None
+
+    @property
+    def fs(self):
+        # Bound to the shared client, which is recreated in each forked worker
+        if self._fs is None or self._fs_pid != os.getpid():
+            self._fs = gridfs.GridFS(resolve_database(self.db), collection='assets')
+            self._fs_pid = os.getpid()
+        return self._fs
+
+    def exists(self, name):
+        return self.fs.exists(name)
+
+    def put(self, name, data, content_type):
+        try:
+            self.fs.put(data, _id=name, filename=name, contentType=content_type)
+        except gridfs.errors.FileExists:
+            # Another request stored the same content first
+            pass
+
+    def open(self, name):
+        return self.fs.get(name)
+
+
+class AssetStore:
+    """Deduplicating image store keyed by SHA-256"""
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    def store(self, data, content_type):
+        """Store image bytes and return the asset name (`<sha256>.<ext>`)"""
+        extension = CONTENT_TYPES.get(content_type)
+        if not extension:
+            raise ValueError(f'Unsupported image type: {content_type}')
+        if not data:
+            raise ValueError('Image is empty')
+
+        name = f'{hashlib.sha256(data).hexdigest()}.{extension}'
+        if not self.backend.exists(name):
+            self.backend.put(name, data, content_type)
+            logger.info(f"Stored new asset {name} ({len(data)} bytes)")
+        return name
+
+    def store_data_url(self, data_url):
+        """Decode a base64 `data:` URL and store it"""
+        data, content_type = decode_data_url(data_url)
+        return self.store(data, content_type)
+
+    def exists(self, name):
+        return bool(ASSET_NAME_PATTERN.match(name)) and self.backend.exists(name)
+
+    def open(self, name):
+        return self.backend.open(name)
+
+    def local_path(self, name):
+        """Filesystem path of an asset, or None when it is not stored on local disk"""
+        if isinstance(self.backend, LocalAssetBackend):
+            return self.backend.path(name)
+        return None
+
+    def read(self, name):
+        with self.backend.open(name) as f:
+            return f.read()
+
+    def externalize(self, value):
+        """Replace inline image data URLs anywhere in `value` with relative asset references"""
+        if isinstance(value, str):
+            if value.startswith('data:image/'):
+                try:
+                    return asset_url(self.store_data_url(value))
+                except ValueError as e:
+                    # Leave anything we cannot parse untouched
+                    logger.info(f"Keeping inline data URL: {e}")
+                return value
+            # Links the client got back from a response are stored without their origin again
+            return rebase_asset_urls(value)
+        if isinstance(value, dict):
+            return {key: self.externalize(item) for key, item in value.items()}
+        if isinstance(value, list):
+            return [self.externalize(item) for item in value]
+        return value
+
+
+def decode_data_url(data_url):
+    """Decode a base64 image `data:` URL into (bytes, content type)"""
+    match = DATA_URL_PATTERN.match(data_url)
+    if not match:
+        raise ValueError('Invalid data URL')
+    try:
+        return base64.b64decode(match.group(2), validate=True), match.group(1)
+    except (binascii.Error, ValueError):
+        raise ValueError('Invalid base64 image data')
+
+
+def asset_url(name, base_url=''):
+    """Build the public URL for an asset name (relative reference without `base_url`)"""
+    return f"{base_url.rstrip('/')}{ASSET_URL_PATH}{name}"
+
+
+def rebase_asset_urls(value, base_url=''):
+    """Point every asset link anywhere in `value` at `base_url` (relative references without one)"""
+    if isinstance(value, str):
+        match = ASSET_LINK_PATTERN.match(value)
+        return asset_url(match.group(1), base_url) if match else value
+    if isinstance(value, dict):
+        return {key: rebase_asset_urls(item, base_url) for key, item in value.items()}
+    if isinstance(value, list):
+        return [rebase_asset_urls(item, base_url) for item in value]
+    return value
+
+
+def init_asset_store(app, db):
+    """Create the asset store configured for the app"""
+    if app.config.get('ASSET_STORAGE') == 'gridfs':
+        backend = GridFSAssetBackend(db)
+    else:
+        backend = LocalAssetBackend(app.config['ASSET_STORAGE_DIR'])
+    app.extensions['asset_store'] = AssetStore(backend)
+    app.logger.info(f"Asset storage: {type(backend).__name__}")
+
+
+def get_asset_store():
+    """Get the asset store for the current app"""
+    return current_app.extensions['asset_store']
+
+
+def asset_base_url():
+    """Base URL asset links are built on (configured, or the API host of this request)"""
+    return current_app.config.get('ASSET_BASE_URL') or request.host_url
+
+
+def externalize_data_urls(value):
+    """Swap inline image data URLs in a request payload for relative asset references"""
+    return get_asset_store().externalize(value)
+
+
+def absolute_asset_urls(value):
+    """Resolve the stored asset references in a response payload against asset_base_url()"""
+    return rebase_asset_urls(value, asset_base_url())
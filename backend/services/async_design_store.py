@@ -0,0 +1,130 @@
+"""
+Wall design persistence for the ASGI app, on a Motor database.
+
+The same writes as services.design_store, awaited instead of blocking: the
+update documents, patch validation, the read-modify-write fallback and the
+snapshot rules all come from that module, so both APIs store identical data.
+"""
+from datetime import datetime
+from pymongo import ReturnDocument, DESCENDING
+from pymongo.errors import DuplicateKeyError, OperationFailure
+from services.design_store import (
+    DEFAULT_HISTORY_LIMIT, DEFAULT_SNAPSHOT_INTERVAL, DesignConflict,
+    save_update, patch_update, apply_operations, needs_snapshot, snapshot_document, validate_patch_operations
+)
+import logging
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+
+async def get_current_design(db, user_id):
+    """Get the current wall design document for a user"""
+    return await db.wall_designs.find_one(
+        {'user_id': user_id},
+        sort=[('updated_at', DESCENDING)]
+    )
+
+
+async def save_current_design(db, user_id, design, history_limit=DEFAULT_HISTORY_LIMIT,
+                              snapshot_interval=DEFAULT_SNAPSHOT_INTERVAL):
+    """Upsert the current design for a user and return the stored document"""
+    now = datetime.utcnow()
+    # Retry once when a concurrent first save won the upsert (unique user_id index)
+    for attempt in range(2):
+        try:
+            current = await db.wall_designs.find_one_and_update(
+                {'user_id': user_id},
+                save_update(user_id, design, now),
+                sort=[('updated_at', DESCENDING)],
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+            break
+        except DuplicateKeyError:
+            if attempt:
+                raise
+
+    await _maybe_snapshot(db, current, now, history_limit, snapshot_interval)
+    return current
+
+
+async def apply_design_patch(db, user_id, base_revision, operations, history_limit=DEFAULT_HISTORY_LIMIT,
+                             snapshot_interval=DEFAULT_SNAPSHOT_INTERVAL):
+    """Apply element-level operations to the current design at `base_revision`"""
+    validate_patch_operations(operations)
+    now = datetime.utcnow()
+    query = {'user_id': user_id, 'revision': base_revision}
+    current = None
+
+    update, array_filters = patch_update(operations, now)
+    if update is not None:
+        try:
+            current = await db.wall_designs.find_one_and_update(
+                query,
+                update,
+                array_filters=array_filters or None,
+                return_document=ReturnDocument.AFTER
+            )
+        except OperationFailure as e:
+            logger.info(f"Falling back to read-modify-write patch: {e}")
+            update = None
+
+    if update is None:
+        stored = await db.wall_designs.find_one(query, {'wall_designs': 1})
+        if stored:
+            current = await db.wall_designs.find_one_and_update(
+                query,
+                {
+                    '$set': {'wall_designs': apply_operations(stored.get('wall_designs'), operations), 'updated_at': now},
+                    '$inc': {'revision': 1}
+                },
+                return_document=ReturnDocument.AFTER
+            )
+
+    if current is None:
+        stored = await db.wall_designs.find_one({'user_id': user_id}, {'revision': 1}, sort=[('updated_at', DESCENDING)])
+        raise DesignConflict(stored.get('revision', 0) if stored else None)
+
+    await _maybe_snapshot(db, current, now, history_limit, snapshot_interval)
+    return current
+
+
+async def list_design_history(db, user_id):
+    """List the retained snapshots for a user (metadata only, newest first)"""
+    cursor = db.wall_design_history.find(
+        {'user_id': user_id},
+        {'_id': 0, 'revision': 1, 'created_at': 1}
+    ).sort('revision', DESCENDING)
+    return await cursor.to_list(length=None)
+
+
+async def get_design_snapshot(db, user_id, revision):
+    """Get a single snapshot by revision"""
+    return await db.wall_design_history.find_one(
+        {'user_id': user_id, 'revision': revision},
+        {'_id': 0}
+    )
+
+
+async def _maybe_snapshot(db, current, now, history_limit, snapshot_interval):
+    if history_limit < 1 or not needs_snapshot(current, now, snapshot_interval):
+        return
+    user_id = current['user_id']
+    try:
+        await db.wall_design_history.insert_one(snapshot_document(current, now))
+    except DuplicateKeyError:
+        # Another request already recorded this revision
+        return
+    await db.wall_designs.update_one({'_id': current['_id']}, {'$set': {'last_snapshot_at': now}})
+
+    # Keep only the newest `history_limit` snapshots
+    oldest_kept = await db.wall_design_history.find(
+        {'user_id': user_id},
+        {'revision': 1}
+    ).sort('revision', DESCENDING).skip(history_limit - 1).limit(1).to_list(length=1)
+    if oldest_kept:
+        await db.wall_design_history.delete_many({
+            'user_id': user_id,
+            'revision': {'$lt': oldest_kept[0]['revision']}
+        })
@@ -10,9 +10,11 @@ import os
 import sys
 from datetime import datetime
 from dotenv import load_dotenv
-from werkzeug.security import generate_password_hash
 from bson import ObjectId
 from configs.database import init_database, get_db
+from configs.config import Config
+from services.password_hasher import PasswordHasher
+from services.repositories import UserRepository
 import logging
 
 # Configure logging
@@ -58,7 +60,7 @@ def create_initial_admin():
             return False
         
         # Check if user already exists
-        existing_user = db.users.find_one({'$or': [{'email': email}, {'username': username}]})
+        existing_user = UserRepository(db).find_existing(username, email)
         if existing_user:
             logger.info("❌ User with this email or username already exists")
             return False
@@ -67,7 +69,8 @@ def create_initial_admin():
         admin_data = {
             'username': username,
             'email': email,
-            'password': generate_password_hash(password),
+            'password': PasswordHasher(Config.PASSWORD_HASH_SCHEME, Config.PASSWORD_HASH_COST).hash(password),
+            **UserRepository.lookup_fields(username, email),
             'role': 'admin',
             'created_at': datetime.utcnow(),
             'last_login': None,
@@ -0,0 +1,312 @@
+"""
+Server-side rendering of the "download all walls" ZIP.
+
+Each wall (wallpaper plus frames and stickers at their position, size and
+rotation) is rendered to a 900x600 PNG in a process pool. The ZIP is streamed
+to the client as walls finish and written to a cache file at the same time,
+so the next download of the same revision is a plain file send.
+"""
+import io
+import math
+import multiprocessing
+import os
+import threading
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import urlparse
+from flask import current_app, Response, send_file, stream_with_context
+from services.asset_store import get_asset_store, decode_data_url, ASSET_NAME_PATTERN, ASSET_URL_PATH
+import logging
+
+try:
+    from PIL import Image, ImageColor, ImageDraw
+except ImportError:  # Exports need Pillow
+    Image = None
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Same canvas the editor and the browser export use
+CANVAS_SIZE = (900, 600)
+WALL_ORDER = ('front', 'back', 'left', 'right')
+FRAME_BORDER_WIDTH = 4
+FRAME_CORNER_RADIUS = 16
+DEFAULT_BORDER_COLOR = '#888'
+# Stored element geometry is clamped to these so one saved session cannot make the
+# render pool allocate an arbitrarily large layer. An element may overhang the canvas;
+# anything further off it than this would not be visible anyway, even rotated.
+MAX_ELEMENT_SIZE = 2 * max(CANVAS_SIZE)
+MIN_OFFSET = -2 * MAX_ELEMENT_SIZE
+
+
+class DesignExporter:
+    """Renders walls in a process pool and caches finished ZIPs on disk"""
+
+    def __init__(self, cache_dir, max_workers=2):
+        self.cache_dir = cache_dir
+        self.max_workers = max_workers
+        self._pool = None
+        self._pool_pid = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return Image is not None
+
+    def pool(self):
+        """Process pool, created lazily so each forked server worker gets its own"""
+        with self._lock:
+            if self._pool is None or self._pool_pid != os.getpid():
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context('spawn')
+                )
+                self._pool_pid = os.getpid()
+            return self._pool
+
+    def cache_path(self, key):
+        return os.path.join(self.cache_dir, f'{key}.zip')
+
+    def stream(self, key, specs):
+        """Yield ZIP bytes as walls are rendered, saving the result under `key`"""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        futures = [(name, self.pool().submit(render_wall, spec)) for name, spec in specs]
+
+        cache_path = self.cache_path(key)
+        tmp_path = f'{cache_path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        sink = _ChunkSink()
+        completed = False
+        cache_file = open(tmp_path, 'wb')
+        try:
+            # PNGs are already compressed, so entries are stored as-is
+            with zipfile.ZipFile(sink, 'w', zipfile.ZIP_STORED) as archive:
+                for name, future in futures:
+                    archive.writestr(name, future.result())
+                    yield from sink.drain(cache_file)
+            yield from sink.drain(cache_file)
+            completed = True
+        finally:
+            cache_file.close()
+            if completed:
+                os.replace(tmp_path, cache_path)
+                self._prune(key)
+            else:
+                # Client went away or rendering failed; don't cache a partial file
+                for _, future in futures:
+                    future.cancel()
+                os.remove(tmp_path)
+
+    def _prune(self, key):
+        """Remove cached ZIPs for older revisions of the same design"""
+        prefix = key.rsplit('-', 1)[0] + '-'
+        for filename in os.listdir(self.cache_dir):
+            if filename.startswith(prefix) and filename.endswith('.zip') and filename != f'{key}.zip':
+                try:
+                    os.remove(os.path.join(self.cache_dir, filename))
+                except OSError:
+                    pass
+
+
+class _ChunkSink:
+    """Write-only, unseekable file object that collects ZIP output"""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self, cache_file):
+        chunks, self.chunks = self.chunks, []
+        for chunk in chunks:
+            cache_file.write(chunk)
+            yield chunk
+
+
+def build_render_specs(wall_designs):
+    """Resolve image references for every wall with content (runs in the request process)"""
+    specs = []
+    for wall in WALL_ORDER:
+        design = (wall_designs or {}).get(wall) or {}
+        elements = [element for element in design.get('elements') or [] if isinstance(element, dict)]
+        if not elements and not design.get('wallpaper'):
+            continue
+
+        spec = {
+            'wallpaper': resolve_image(design.get('wallpaper')),
+            'elements': [
+                {
+                    'type': element.get('type'),
+                    'frame_type': element.get('frameType'),
+                    'border_color': element.get('borderColor') or DEFAULT_BORDER_COLOR,
+                    'x': _number(element.get('x'), low=MIN_OFFSET, high=CANVAS_SIZE[0]),
+                    'y': _number(element.get('y'), low=MIN_OFFSET, high=CANVAS_SIZE[1]),
+                    'width': _number(element.get('width'), 100, low=1, high=MAX_ELEMENT_SIZE),
+                    'height': _number(element.get('height'), 100, low=1, high=MAX_ELEMENT_SIZE),
+                    'rotation': _number(element.get('rotation')) % 360,
+                    'image': resolve_image(element.get('content'))
+                }
+                for element in elements
+            ]
+        }
+        specs.append((f'{wall.capitalize()}-Wall-Design.png', spec))
+    return specs
+
+
+def resolve_image(src):
+    """Turn a stored image reference into ('path', path) or ('bytes', data); None if unavailable"""
+    if not src or not isinstance(src, str):
+        return None
+
+    if src.startswith('data:image/'):
+        try:
+            return ('bytes', decode_data_url(src)[0])
+        except ValueError:
+            return None
+
+    # Only images we serve ourselves are rendered; remote URLs are never fetched
+    path = urlparse(src).path
+    if path.startswith(ASSET_URL_PATH):
+        name = path[len(ASSET_URL_PATH):]
+        store = get_asset_store()
+        if not ASSET_NAME_PATTERN.match(name) or not store.exists(name):
+            return None
+        local_path = store.local_path(name)
+        return ('path', local_path) if local_path else ('bytes', store.read(name))
+
+    entry = current_app.extensions['image_derivatives'].catalog.files.get(path.lstrip('/'))
+    return ('path', entry.path) if entry else None
+
+
+def render_wall(spec):
+    """Render one wall to PNG bytes (runs in a worker process)"""
+    canvas = Image.new('RGBA', CANVAS_SIZE, 'white')
+
+    wallpaper = _open_image(spec['wallpaper'])
+    if wallpaper is not None:
+        canvas.alpha_composite(wallpaper.resize(CANVAS_SIZE, Image.LANCZOS))
+
+    for element in spec['elements']:
+        width, height = max(1, round(element['width'])), max(1, round(element['height']))
+        layer = Image.new('RGBA', (width, height), (0, 0, 0, 0))
+        image = _open_image(element['image'])
+
+        if element['type'] == 'frame':
+            mask = _frame_mask(element['frame_type'], (width, height))
+            if image is not None:
+                layer.paste(image.resize((width, height), Image.LANCZOS), (0, 0), _combine_masks(image, mask, (width, height)))
+            _draw_frame_border(layer, element['frame_type'], element['border_color'])
+        elif image is not None:
+            layer = image.resize((width, height), Image.LANCZOS)
+        else:
+            continue
+
+        x, y = element['x'], element['y']
+        if element['rotation']:
+            # Rotate around the element's centre, like a CSS transform
+            rotated = layer.rotate(-element['rotation'], resample=Image.BICUBIC, expand=True)
+            x += (width - rotated.width) / 2
+            y += (height - rotated.height) / 2
+            layer = rotated
+        canvas.paste(layer, (round(x), round(y)), layer)
+
+    output = io.BytesIO()
+    canvas.convert('RGB').save(output, 'PNG', optimize=False)
+    return output.getvalue()
+
+
+def _open_image(source):
+    if source is None:
+        return None
+    kind, value = source
+    try:
+        image = Image.open(value if kind == 'path' else io.BytesIO(value))
+        return image.convert('RGBA')
+    except Exception as e:
+        logger.info(f"Skipping unreadable image in export: {e}")
+        return None
+
+
+def _frame_mask(frame_type, size):
+    mask = Image.new('L', size, 0)
+    draw = ImageDraw.Draw(mask)
+    box = (0, 0, size[0] - 1, size[1] - 1)
+    if frame_type == 'circle':
+        diameter = min(size)
+        left, top = (size[0] - diameter) // 2, (size[1] - diameter) // 2
+        draw.ellipse((left, top, left + diameter - 1, top + diameter - 1), fill=255)
+    elif frame_type == 'rounded':
+        draw.rounded_rectangle(box, radius=FRAME_CORNER_RADIUS, fill=255)
+    else:
+        draw.rectangle(box, fill=255)
+    return mask
+
+
+def _combine_masks(image, mask, size):
+    alpha = image.getchannel('A').resize(size)
+    return Image.composite(alpha, Image.new('L', size, 0), mask)
+
+
+def _draw_frame_border(layer, frame_type, color):
+    try:
+        color = ImageColor.getrgb(color)
+    except ValueError:
+        color = ImageColor.getrgb(DEFAULT_BORDER_COLOR)
+    draw = ImageDraw.Draw(layer)
+    width, height = layer.size
+    box = (0, 0, width - 1, height - 1)
+    if frame_type == 'circle':
+        diameter = min(width, height)
+        left, top = (width - diameter) // 2, (height - diameter) // 2
+        draw.ellipse((left, top, left + diameter - 1, top + diameter - 1), outline=color, width=FRAME_BORDER_WIDTH)
+    elif frame_type == 'rounded':
+        draw.rounded_rectangle(box, radius=FRAME_CORNER_RADIUS, outline=color, width=FRAME_BORDER_WIDTH)
+    else:
+        draw.rectangle(box, outline=color, width=FRAME_BORDER_WIDTH)
+
+
+def _number(value, default=0, low=None, high=None):
+    """A finite number from stored JSON clamped to [low, high], or `default` if there is none"""
+    try:
+        value = float(value)
+    except (TypeError, ValueError, OverflowError):
+        return default
+    if not math.isfinite(value):
+        return default
+    if low is not None:
+        value = max(low, value)
+    if high is not None:
+        value = min(high, value)
+    return value
+
+
+def send_export(key, wall_designs, download_name):
+    """Response for a ZIP export: the cached file if present, otherwise a streamed render"""
+    exporter = get_design_exporter()
+    cache_path = exporter.cache_path(key)
+    if os.path.isfile(cache_path):
+        return send_file(cache_path, mimetype='application/zip', as_attachment=True,
+                         download_name=download_name, etag=key, conditional=True)
+
+    specs = build_render_specs(wall_designs)
+    response = Response(stream_with_context(exporter.stream(key, specs)), mimetype='application/zip')
+    response.headers['Content-Disposition'] = f'attachment; filename="{download_name}"'
+    response.headers['ETag'] = f'"{key}"'
+    return response
+
+
+def init_design_exporter(app):
+    """Create the export renderer for the app (worker processes start on first use)"""
+    app.extensions['design_exporter'] = DesignExporter(
+        app.config['EXPORT_CACHE_DIR'],
+        max_workers=app.config['EXPORT_WORKERS']
+    )
+
+
+def get_design_exporter():
+    """Get the export renderer for the current app"""
+    return current_app.extensions['design_exporter']
@@ -0,0 +1,363 @@
+"""
+Wall design persistence.
+
+Each user has a single "current design" document in `wall_designs` that is
+updated in place on every autosave. A bounded version history is kept in
+`wall_design_history`: at most one snapshot per snapshot interval, and only
+the newest N snapshots per user are retained.
+
+Autosaves can also be sent as element-level patches against a base revision,
+which are applied with a single conditional update.
+"""
+import copy
+from datetime import datetime, timedelta
+from pymongo import ReturnDocument, DESCENDING
+from pymongo.errors import DuplicateKeyError, OperationFailure
+import logging
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Defaults used when the Flask config does not override them
+DEFAULT_HISTORY_LIMIT = 20
+DEFAULT_SNAPSHOT_INTERVAL = 5 * 60  # 5 minutes
+
+DESIGN_FIELDS = ('wall_designs', 'room_type', 'room_dimensions', 'selected_wall')
+
+WALLS = ('front', 'back', 'left', 'right')
+
+# Patch operations and the element fields each one may change
+PATCH_OPERATIONS = {
+    'add': (),
+    'move': ('x', 'y'),
+    'resize': ('width', 'height', 'x', 'y'),
+    'delete': (),
+    'set_wallpaper': ()
+}
+MAX_PATCH_OPERATIONS = 500
+
+
+class DesignConflict(Exception):
+    """Raised when a patch's base revision does not match the stored design"""
+
+    def __init__(self, current_revision):
+        super().__init__(f"Design is at revision {current_revision}")
+        self.current_revision = current_revision
+
+
+# What GET /api/designs/wall-designs returns before anything is saved
+EMPTY_DESIGN = {
+    'wallDesigns': {wall: {'elements': [], 'wallpaper': None} for wall in WALLS},
+    'roomType': '',
+    'roomDimensions': {'length': 8, 'width': 8, 'height': 4},
+    'selectedWall': '',
+    'revision': 0
+}
+
+
+def design_from_client(data):
+    """The stored design fields from a full-save request body, keeping only walls with content"""
+    wall_designs = {}
+    for wall_name, wall_data in (data.get('wallDesigns') or {}).items():
+        if wall_data and (wall_data.get('elements') or wall_data.get('wallpaper')):
+            wall_designs[wall_name] = {
+                'elements': wall_data.get('elements', []),
+                'wallpaper': wall_data.get('wallpaper')
+            }
+    return {
+        'wall_designs': wall_designs,
+        'room_type': data.get('roomType', ''),
+        'room_dimensions': data.get('roomDimensions', {}),
+        'selected_wall': data.get('selectedWall', '')
+    }
+
+
+def design_for_client(design):
+    """The API representation of a current design or snapshot document"""
+    if not design:
+        return copy.deepcopy(EMPTY_DESIGN)
+    return {
+        'wallDesigns': design.get('wall_designs', {}),
+        'roomType': design.get('room_type', ''),
+        'roomDimensions': design.get('room_dimensions', {}),
+        'selectedWall': design.get('selected_wall', ''),
+        'revision': design.get('revision', 0)
+    }
+
+
+def get_current_design(db, user_id):
+    """Get the current wall design document for a user"""
+    return db.wall_designs.find_one(
+        {'user_id': user_id},
+        sort=[('updated_at', DESCENDING)]
+    )
+
+
+def save_current_design(db, user_id, design, history_limit=DEFAULT_HISTORY_LIMIT,
+                        snapshot_interval=DEFAULT_SNAPSHOT_INTERVAL):
+    """Upsert the current design for a user and return the stored document"""
+    now = datetime.utcnow()
+    # A concurrent first save may insert the document between our match and upsert;
+    # the unique user_id index rejects ours, and retrying updates theirs instead
+    for attempt in range(2):
+        try:
+            current = db.wall_designs.find_one_and_update(
+                {'user_id': user_id},
+                save_update(user_id, design, now),
+                sort=[('updated_at', DESCENDING)],
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+            break
+        except DuplicateKeyError:
+            if attempt:
+                raise
+
+    _maybe_snapshot(db, current, now, history_limit, snapshot_interval)
+    return current
+
+
+def apply_design_patch(db, user_id, base_revision, operations, history_limit=DEFAULT_HISTORY_LIMIT,
+                       snapshot_interval=DEFAULT_SNAPSHOT_INTERVAL):
+    """Apply element-level operations to the current design at `base_revision`"""
+    validate_patch_operations(operations)
+    now = datetime.utcnow()
+    query = {'user_id': user_id, 'revision': base_revision}
+    current = None
+
+    update, array_filters = patch_update(operations, now)
+    if update is not None:
+        try:
+            current = db.wall_designs.find_one_and_update(
+                query,
+                update,
+                array_filters=array_filters or None,
+                return_document=ReturnDocument.AFTER
+            )
+        except OperationFailure as e:
+            # e.g. an array filter on a wall that has no elements yet
+            logger.info(f"Falling back to read-modify-write patch: {e}")
+            update = None
+
+    if update is None:
+        current = _apply_patch_in_memory(db, query, operations, now)
+
+    if current is None:
+        stored = db.wall_designs.find_one({'user_id': user_id}, {'revision': 1}, sort=[('updated_at', DESCENDING)])
+        raise DesignConflict(stored.get('revision', 0) if stored else None)
+
+    _maybe_snapshot(db, current, now, history_limit, snapshot_interval)
+    return current
+
+
+def validate_patch_operations(operations):
+    """Validate a list of patch operations, raising ValueError on bad input"""
+    if not isinstance(operations, list) or not operations:
+        raise ValueError('operations must be a non-empty list')
+    if len(operations) > MAX_PATCH_OPERATIONS:
+        raise ValueError(f'At most {MAX_PATCH_OPERATIONS} operations are allowed per patch')
+
+    for operation in operations:
+        if not isinstance(operation, dict):
+            raise ValueError('Each operation must be an object')
+
+        op = operation.get('op')
+        if op not in PATCH_OPERATIONS:
+            raise ValueError(f'Unsupported operation: {op}')
+        if operation.get('wall') not in WALLS:
+            raise ValueError(f"Invalid wall: {operation.get('wall')}")
+
+        if op == 'add':
+            element = operation.get('element')
+            if not isinstance(element, dict) or element.get('id') is None:
+                raise ValueError('add requires an element with an id')
+        elif op in ('move', 'resize', 'delete') and operation.get('id') is None:
+            raise ValueError(f'{op} requires an element id')
+
+        fields = PATCH_OPERATIONS[op]
+        if fields and not any(field in operation for field in fields):
+            raise ValueError(f"{op} requires at least one of: {', '.join(fields)}")
+        for field in fields:
+            value = operation.get(field)
+            if field in operation and (isinstance(value, bool) or not isinstance(value, (int, float))):
+                raise ValueError(f'{field} must be a number')
+
+
+def list_design_history(db, user_id):
+    """List the retained snapshots for a user (metadata only, newest first)"""
+    return list(db.wall_design_history.find(
+        {'user_id': user_id},
+        {'_id': 0, 'revision': 1, 'created_at': 1}
+    ).sort('revision', DESCENDING))
+
+
+def get_design_snapshot(db, user_id, revision):
+    """Get a single snapshot by revision"""
+    return db.wall_design_history.find_one(
+        {'user_id': user_id, 'revision': revision},
+        {'_id': 0}
+    )
+
+
+def compact_legacy_designs(db):
+    """Collapse legacy insert-per-autosave documents into one current design per user"""
+    removed = 0
+    pipeline = [
+        {'$sort': {'user_id': 1, 'updated_at': -1, 'created_at': -1}},
+        {'$group': {'_id': '$user_id', 'keep': {'$first': '$_id'}, 'ids': {'$push': '$_id'}, 'count': {'$sum': 1}}},
+        {'$match': {'count': {'$gt': 1}}}
+    ]
+    for group in db.wall_designs.aggregate(pipeline, allowDiskUse=True):
+        stale_ids = [doc_id for doc_id in group['ids'] if doc_id != group['keep']]
+        removed += db.wall_designs.delete_many({'_id': {'$in': stale_ids}}).deleted_count
+
+    if removed:
+        logger.info(f"Compacted {removed} legacy wall design documents")
+    return removed
+
+
+def save_update(user_id, design, now):
+    """Upsert that stores `design` as the user's current design and bumps its revision"""
+    update = {key: design.get(key) for key in DESIGN_FIELDS}
+    update['updated_at'] = now
+    return {
+        '$set': update,
+        '$inc': {'revision': 1},
+        '$setOnInsert': {'user_id': user_id, 'created_at': now}
+    }
+
+
+def patch_update(operations, now):
+    """(update, array_filters) applying validated operations in one write, or (None, None) if they overlap"""
+    update, array_filters = _build_patch_update(operations)
+    if update is not None:
+        update.setdefault('$set', {})['updated_at'] = now
+        update['$inc'] = {'revision': 1}
+    return update, array_filters
+
+
+def apply_operations(wall_designs, operations):
+    """`wall_designs` with validated operations applied in order (for the read-modify-write fallback)"""
+    wall_designs = wall_designs or {}
+    for operation in operations:
+        wall = wall_designs.get(operation['wall']) or {'elements': [], 'wallpaper': None}
+        wall_designs[operation['wall']] = wall
+        elements = wall.get('elements') or []
+        op = operation['op']
+
+        if op == 'set_wallpaper':
+            wall['wallpaper'] = operation.get('wallpaper')
+        elif op == 'add':
+            elements.append(operation['element'])
+        elif op == 'delete':
+            elements = [element for element in elements if element.get('id') != operation['id']]
+        else:
+            for element in elements:
+                if element.get('id') == operation['id']:
+                    element.update({field: operation[field] for field in PATCH_OPERATIONS[op] if field in operation})
+        wall['elements'] = elements
+    return wall_designs
+
+
+def needs_snapshot(current, now, snapshot_interval):
+    """Whether the last snapshot of `current` is older than the snapshot interval"""
+    last_snapshot_at = current.get('last_snapshot_at')
+    return not last_snapshot_at or now - last_snapshot_at >= timedelta(seconds=snapshot_interval)
+
+
+def snapshot_document(current, now):
+    """History entry for the current design document"""
+    snapshot = {key: current.get(key) for key in DESIGN_FIELDS}
+    snapshot.update({
+        'user_id': current['user_id'],
+        'revision': current['revision'],
+        'created_at': now
+    })
+    return snapshot
+
+
+def _build_patch_update(operations):
+    """Translate operations into one $set/$push/$pull update, or None if they overlap"""
+    sets, pushes, pulls, array_filters = {}, {}, {}, []
+    filter_names = {}
+    kinds = {}
+
+    for operation in operations:
+        op = operation['op']
+        wall = operation['wall']
+        if op == 'set_wallpaper':
+            sets[f'wall_designs.{wall}.wallpaper'] = operation.get('wallpaper')
+            continue
+
+        elements_path = f'wall_designs.{wall}.elements'
+        kinds.setdefault(elements_path, set()).add(op if op in ('add', 'delete') else 'set')
+
+        if op == 'add':
+            pushes.setdefault(elements_path, []).append(operation['element'])
+        elif op == 'delete':
+            pulls.setdefault(elements_path, []).append(operation['id'])
+        else:
+            key = (wall, operation['id'])
+            if key not in filter_names:
+                filter_names[key] = f'e{len(filter_names)}'
+                array_filters.append({f'{filter_names[key]}.id': operation['id']})
+            for field in PATCH_OPERATIONS[op]:
+                if field in operation:
+                    sets[f'{elements_path}.$[{filter_names[key]}].{field}'] = operation[field]
+
+    # Mongo cannot push, pull and set inside the same array in one update
+    if any(len(path_kinds) > 1 for path_kinds in kinds.values()):
+        return None, None
+
+    update = {}
+    if sets:
+        update['$set'] = sets
+    if pushes:
+        update['$push'] = {path: {'$each': elements} for path, elements in pushes.items()}
+    if pulls:
+        update['$pull'] = {path: {'id': {'$in': ids}} for path, ids in pulls.items()}
+    return update, array_filters
+
+
+def _apply_patch_in_memory(db, query, operations, now):
+    """Apply operations to a loaded copy and write it back if the revision is unchanged"""
+    current = db.wall_designs.find_one(query, {'wall_designs': 1})
+    if not current:
+        return None
+
+    return db.wall_designs.find_one_and_update(
+        query,
+        {
+            '$set': {'wall_designs': apply_operations(current.get('wall_designs'), operations), 'updated_at': now},
+            '$inc': {'revision': 1}
+        },
+        return_document=ReturnDocument.AFTER
+    )
+
+
+def _maybe_snapshot(db, current, now, history_limit, snapshot_interval):
+    """Take a snapshot if the last one is older than the snapshot interval"""
+    if history_limit >= 1 and needs_snapshot(current, now, snapshot_interval):
+        _take_snapshot(db, current, now, history_limit)
+
+
+def _take_snapshot(db, current, now, history_limit):
+    """Record a snapshot of the current design and trim old ones"""
+    user_id = current['user_id']
+    try:
+        db.wall_design_history.insert_one(snapshot_document(current, now))
+    except DuplicateKeyError:
+        # Another request already recorded this revision
+        return
+    db.wall_designs.update_one({'_id': current['_id']}, {'$set': {'last_snapshot_at': now}})
+
+    # Keep only the newest `history_limit` snapshots
+    oldest_kept = list(db.wall_design_history.find(
+        {'user_id': user_id},
+        {'revision': 1}
+    ).sort('revision', DESCENDING).skip(history_limit - 1).limit(1))
+    if oldest_kept:
+        db.wall_design_history.delete_many({
+            'user_id': user_id,
+            'revision': {'$lt': oldest_kept[0]['revision']}
+        })
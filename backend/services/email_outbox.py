@@ -0,0 +1,282 @@
+"""
+Queued email delivery.
+
+Requests only insert the rendered message into the `email_outbox` collection
+and return. A background worker claims due messages in batches, sends them
+over one reused SMTP connection, and retries failures with exponential
+backoff. Claims are atomic, so any number of app processes (or a dedicated
+worker run with `python -m services.email_outbox`) can share the outbox.
+"""
+import os
+import smtplib
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from flask import current_app
+from flask_mail import Connection, Message
+from pymongo import ReturnDocument
+from services.metrics import observe_email_queued, observe_smtp_send
+import logging
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Outbox document statuses
+PENDING = 'pending'
+SENDING = 'sending'
+SENT = 'sent'
+FAILED = 'failed'
+
+# SMTP replies that will not succeed on retry (bad auth, rejected recipient, ...)
+PERMANENT_SMTP_CODES = range(500, 600)
+
+
+class _PooledConnection(Connection):
+    """Flask-Mail connection that honours a socket timeout and can be kept open"""
+
+    def __init__(self, mail, timeout):
+        super().__init__(mail)
+        self.timeout = timeout
+        self.host = None
+        self.num_emails = 0
+        self.last_used = 0
+
+    def configure_host(self):
+        if self.mail.use_ssl:
+            host = smtplib.SMTP_SSL(self.mail.server, self.mail.port, timeout=self.timeout)
+        else:
+            host = smtplib.SMTP(self.mail.server, self.mail.port, timeout=self.timeout)
+
+        if self.mail.use_tls:
+            host.starttls()
+        if self.mail.username and self.mail.password:
+            host.login(self.mail.username, self.mail.password)
+        return host
+
+    def open(self):
+        if self.host is None and not self.mail.suppress:
+            self.host = self.configure_host()
+        self.last_used = time.monotonic()
+
+    def close(self):
+        if self.host is not None:
+            try:
+                self.host.quit()
+            except (smtplib.SMTPException, OSError):
+                pass
+        self.host = None
+
+
+class EmailOutbox:
+    """Persistent outbox plus the worker thread that drains it"""
+
+    def __init__(self, app, db):
+        self.app = app
+        self.db = db
+        self.batch_size = app.config['EMAIL_OUTBOX_BATCH_SIZE']
+        self.max_attempts = app.config['EMAIL_OUTBOX_MAX_ATTEMPTS']
+        self.retry_delay = app.config['EMAIL_OUTBOX_RETRY_DELAY']
+        self.poll_interval = app.config['EMAIL_OUTBOX_POLL_INTERVAL']
+        self.lease = app.config['EMAIL_OUTBOX_LEASE']
+        self.idle_timeout = app.config['EMAIL_SMTP_IDLE_TIMEOUT']
+        self.smtp_timeout = app.config['EMAIL_SMTP_TIMEOUT']
+        self.worker_id = None
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._thread_pid = None
+        self._connection = None
+
+    @property
+    def collection(self):
+        return self.db.email_outbox
+
+    def enqueue(self, subject, recipients, html, sender=None, body=None):
+        """Store a message for delivery and return its outbox id"""
+        now = datetime.utcnow()
+        result = self.collection.insert_one({
+            'subject': subject,
+            'sender': sender,
+            'recipients': list(recipients),
+            'html': html,
+            'body': body,
+            'status': PENDING,
+            'attempts': 0,
+            'next_attempt_at': now,
+            'created_at': now
+        })
+        self._wakeup.set()
+        return result.inserted_id
+
+    def start(self):
+        """Start the delivery thread for this process (again after a fork)"""
+        with self._lock:
+            if self._thread is not None and self._thread_pid == os.getpid() and self._thread.is_alive():
+                return
+            self.worker_id = f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+            self._stopping.clear()
+            self._connection = None
+            self._thread = threading.Thread(target=self.run, name='email-outbox', daemon=True)
+            self._thread_pid = os.getpid()
+            self._thread.start()
+
+    def stop(self):
+        self._stopping.set()
+        self._wakeup.set()
+
+    def run(self):
+        """Deliver due messages until stopped"""
+        with self.app.app_context():
+            logger.info(f"Email outbox worker {self.worker_id} started")
+            while not self._stopping.is_set():
+                try:
+                    delivered = self.deliver_batch()
+                except Exception as e:
+                    logger.error(f"Email outbox worker error: {e}", exc_info=True)
+                    delivered = 0
+                if delivered < self.batch_size:
+                    self._close_idle_connection()
+                    self._wakeup.wait(self.poll_interval)
+                    self._wakeup.clear()
+            self._close_connection()
+
+    def deliver_batch(self):
+        """Claim and send up to one batch of due messages; returns how many were claimed"""
+        batch = self._claim_batch()
+        for message in batch:
+            self._deliver(message)
+        return len(batch)
+
+    def _claim_batch(self):
+        now = datetime.utcnow()
+        batch = []
+        for _ in range(self.batch_size):
+            message = self.collection.find_one_and_update(
+                {'$or': [
+                    {'status': PENDING, 'next_attempt_at': {'$lte': now}},
+                    # Claims left behind by a worker that died mid-send
+                    {'status': SENDING, 'locked_until': {'$lte': now}}
+                ]},
+                {'$set': {
+                    'status': SENDING,
+                    'locked_by': self.worker_id,
+                    'locked_until': now + timedelta(seconds=self.lease)
+                }},
+                sort=[('next_attempt_at', 1)],
+                return_document=ReturnDocument.AFTER
+            )
+            if message is None:
+                break
+            batch.append(message)
+        return batch
+
+    def _deliver(self, message):
+        started = time.perf_counter()
+        try:
+            connection = self._get_connection()
+            connection.send(Message(
+                message['subject'],
+                sender=message.get('sender'),
+                recipients=message['recipients'],
+                html=message.get('html'),
+                body=message.get('body')
+            ))
+            connection.last_used = time.monotonic()
+        except Exception as e:
+            observe_smtp_send('failed', time.perf_counter() - started)
+            # The connection may be in an unknown state, start fresh next time
+            self._close_connection()
+            self._record_failure(message, e)
+            return
+        observe_smtp_send('sent', time.perf_counter() - started)
+
+        self.collection.update_one(
+            {'_id': message['_id'], 'locked_by': self.worker_id},
+            {'$set': {'status': SENT, 'sent_at': datetime.utcnow()},
+             '$inc': {'attempts': 1},
+             '$unset': {'locked_by': '', 'locked_until': '', 'last_error': ''}}
+        )
+        logger.debug(f"Sent email {message['_id']} to {', '.join(message['recipients'])}")
+
+    def _record_failure(self, message, error):
+        attempts = message.get('attempts', 0) + 1
+        smtp_code = getattr(error, 'smtp_code', None)
+        permanent = smtp_code in PERMANENT_SMTP_CODES or attempts >= self.max_attempts
+        update = {
+            'status': FAILED if permanent else PENDING,
+            'attempts': attempts,
+            'last_error': f'{type(error).__name__}: {error}'[:500]
+        }
+        if not permanent:
+            update['next_attempt_at'] = datetime.utcnow() + timedelta(seconds=self.retry_delay * 2 ** (attempts - 1))
+
+        self.collection.update_one(
+            {'_id': message['_id'], 'locked_by': self.worker_id},
+            {'$set': update, '$unset': {'locked_by': '', 'locked_until': ''}}
+        )
+        if permanent:
+            logger.error(f"Giving up on email {message['_id']} after {attempts} attempt(s): {update['last_error']}")
+        else:
+            logger.warning(f"Email {message['_id']} failed (attempt {attempts}), retrying: {update['last_error']}")
+
+    def _get_connection(self):
+        if self._connection is None:
+            self._connection = _PooledConnection(current_app.extensions['mail'], self.smtp_timeout)
+        self._connection.open()
+        return self._connection
+
+    def _close_idle_connection(self):
+        if self._connection is not None and time.monotonic() - self._connection.last_used > self.idle_timeout:
+            self._close_connection()
+
+    def _close_connection(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+
+def init_email_outbox(app, db):
+    """Create the outbox for the app (its delivery thread is started per worker process)"""
+    outbox = EmailOutbox(app, db)
+    app.extensions['email_outbox'] = outbox
+    return outbox
+
+
+def get_email_outbox():
+    """Get the outbox for the current app"""
+    return current_app.extensions['email_outbox']
+
+
+def queue_email(subject, recipients, html, sender=None, body=None):
+    """Queue a message on the current app's outbox"""
+    started = time.perf_counter()
+    outbox = get_email_outbox()
+    if current_app.config['EMAIL_OUTBOX_WORKER'] == 'thread':
+        # Worker threads do not survive a fork, so make sure this process has one
+        outbox.start()
+    message_id = outbox.enqueue(subject, recipients, html, sender=sender, body=body)
+    observe_email_queued(time.perf_counter() - started)
+    return message_id
+
+
+def main():
+    """Run a dedicated delivery worker in the foreground"""
+    from routes.app import app, db
+
+    logging.basicConfig(level=logging.INFO)
+    outbox = app.extensions.get('email_outbox') or init_email_outbox(app, db)
+    outbox.start()
+    logger.info("Delivering queued email, press Ctrl+C to stop")
+    try:
+        while outbox._thread.is_alive():
+            outbox._thread.join(1)
+    except KeyboardInterrupt:
+        outbox.stop()
+        outbox._thread.join(outbox.smtp_timeout)
+
+
+if __name__ == '__main__':
+    main()
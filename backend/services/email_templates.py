@@ -0,0 +1,101 @@
+"""
+Email templates.
+
+Templates live in `backend/templates/email/` as `<name>.html` plus a plain-text
+`<name>.txt` alternative. Each one is compiled and rendered once at startup
+with the app-wide values (APP_URL, ...) filled in and placeholders for the
+per-message slots; sending a message then only joins the cached static parts
+with the escaped slot values.
+"""
+import os
+import re
+from jinja2 import Environment, FileSystemLoader, select_autoescape
+from markupsafe import escape
+from flask import current_app
+import logging
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'templates', 'email')
+
+# Template name -> (subject, per-message slots)
+TEMPLATES = {
+    'verification': ('Verify Your Email - AltarMaker', ('token',)),
+    'welcome': ('🎉 Welcome to AltarMaker!', ('username',))
+}
+
+# Rendered in place of slot values, then split back out
+SLOT_MARKER = '\x00slot:{}\x00'
+SLOT_PATTERN = re.compile('\x00slot:(\\w+)\x00')
+
+
+class CompiledTemplate:
+    """Static parts of one rendered template, interleaved with slot names"""
+
+    __slots__ = ('parts', 'escape')
+
+    def __init__(self, rendered, escape_slots):
+        # re.split with a capture group alternates literal text and slot names
+        self.parts = SLOT_PATTERN.split(rendered)
+        self.escape = escape_slots
+
+    def render(self, slots):
+        output = []
+        for index, part in enumerate(self.parts):
+            if index % 2:
+                value = str(slots[part])
+                output.append(str(escape(value)) if self.escape else value)
+            else:
+                output.append(part)
+        return ''.join(output)
+
+
+class EmailTemplates:
+    """Precompiled email templates for one app configuration"""
+
+    def __init__(self, template_dir, context, senders, missing_config=()):
+        self.senders = senders
+        self.missing_config = list(missing_config)
+        self.environment = Environment(
+            loader=FileSystemLoader(template_dir),
+            autoescape=select_autoescape(['html'])
+        )
+        self.templates = {}
+        for name, (subject, slots) in TEMPLATES.items():
+            values = dict(context, **{slot: SLOT_MARKER.format(slot) for slot in slots})
+            self.templates[name] = (
+                subject,
+                CompiledTemplate(self.environment.get_template(f'{name}.html').render(values), True),
+                CompiledTemplate(self.environment.get_template(f'{name}.txt').render(values), False)
+            )
+        logger.info(f"Loaded {len(self.templates)} email templates from {template_dir}")
+
+    def render(self, name, **slots):
+        """Return (subject, sender, html, text) for a template"""
+        subject, html, text = self.templates[name]
+        return subject, self.senders[name], html.render(slots), text.render(slots)
+
+
+def init_email_templates(app):
+    """Compile the email templates and resolve the sender settings once"""
+    config = app.config
+    sender_name = config.get('EMAIL_SENDER_NAME', 'AltarMaker')
+    senders = {
+        'verification': f"{sender_name} <{config.get('MAIL_DEFAULT_SENDER')}>",
+        'welcome': config.get('MAIL_DEFAULT_SENDER', config.get('MAIL_USERNAME'))
+    }
+
+    # Credentials are optional, e.g. for a local relay
+    missing_config = [key for key in ('MAIL_SERVER', 'MAIL_PORT', 'APP_URL') if not config.get(key)]
+    if missing_config:
+        app.logger.error(f"Missing email configuration: {', '.join(missing_config)}")
+
+    app.extensions['email_templates'] = EmailTemplates(
+        TEMPLATE_DIR, {'app_url': config.get('APP_URL') or '#'}, senders, missing_config
+    )
+
+
+def get_email_templates():
+    """Get the compiled email templates for the current app"""
+    return current_app.extensions['email_templates']
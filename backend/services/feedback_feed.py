@@ -0,0 +1,113 @@
+"""
+Cached public feedback feed.
+
+`GET /api/feedback` is public, so pages are served from a small in-process
+cache of ready-to-send JSON bodies with their ETags. Each page also carries the
+rating stats (count, average, histogram), computed once per cache generation.
+Submitting feedback clears this worker's cache; other workers pick the change
+up within FEEDBACK_CACHE_TTL seconds.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from flask import current_app
+from services.repositories import FeedbackRepository
+import logging
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+
+class FeedbackFeed:
+    """TTL + LRU cache of serialized feedback pages"""
+
+    def __init__(self, db, ttl=60, page_size=20, max_page_size=50, max_entries=256):
+        self.db = db
+        self.ttl = ttl
+        self.page_size = page_size
+        self.max_page_size = max_page_size
+        self.max_entries = max_entries
+        self._pages = OrderedDict()
+        self._stats = None
+        self._lock = threading.Lock()
+
+    def page_limit(self, limit=None):
+        """Page size for a requested limit, capped at the maximum"""
+        if limit is None:
+            return self.page_size
+        if limit < 1:
+            raise ValueError('limit must be positive')
+        return min(limit, self.max_page_size)
+
+    def get_page(self, limit=None, after=None):
+        """(JSON body, ETag) of one page of the feed"""
+        key = (self.page_limit(limit), after or '')
+        now = time.monotonic()
+        with self._lock:
+            entry = self._pages.get(key)
+            if entry is not None and entry[2] > now:
+                self._pages.move_to_end(key)
+                return entry[0], entry[1]
+
+        body = self._render(*key)
+        etag = hashlib.sha1(body.encode()).hexdigest()
+        with self._lock:
+            self._pages[key] = (body, etag, now + self.ttl)
+            self._pages.move_to_end(key)
+            while len(self._pages) > self.max_entries:
+                self._pages.popitem(last=False)
+        return body, etag
+
+    def invalidate(self):
+        """Drop every cached page and the rating stats"""
+        with self._lock:
+            self._pages.clear()
+            self._stats = None
+
+    def _rating_stats(self):
+        now = time.monotonic()
+        with self._lock:
+            if self._stats is not None and self._stats[1] > now:
+                return self._stats[0]
+        stats = FeedbackRepository(self.db).rating_stats()
+        with self._lock:
+            self._stats = (stats, now + self.ttl)
+        return stats
+
+    def _render(self, limit, after):
+        # Read one extra entry to know whether there is a next page
+        entries = list(FeedbackRepository(self.db).page(limit=limit + 1, after=after or None))
+        next_cursor = None
+        if len(entries) > limit:
+            entries = entries[:limit]
+            next_cursor = FeedbackRepository.page_cursor(entries[-1])
+        for entry in entries:
+            del entry['_id']
+
+        return current_app.json.dumps({
+            'success': True,
+            'data': entries,
+            'next_cursor': next_cursor,
+            'stats': self._rating_stats()
+        })
+
+
+def init_feedback_feed(app, db):
+    """Create the feedback feed cache for the app"""
+    app.extensions['feedback_feed'] = FeedbackFeed(
+        db,
+        ttl=app.config['FEEDBACK_CACHE_TTL'],
+        page_size=app.config['FEEDBACK_PAGE_SIZE'],
+        max_page_size=app.config['FEEDBACK_MAX_PAGE_SIZE']
+    )
+
+
+def get_feedback_feed():
+    """Get the feedback feed cache for the current app"""
+    return current_app.extensions['feedback_feed']
+
+
+def invalidate_feedback_feed():
+    """Clear the cached feed after feedback is added or changed"""
+    get_feedback_feed().invalidate()
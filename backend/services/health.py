@@ -0,0 +1,188 @@
+"""
+Cached dependency health.
+
+A background thread in each worker pings MongoDB (and checks the SMTP relay
+less often) on a fixed interval, and pymongo's server heartbeats mark
+MongoDB down as soon as every known server fails. Health endpoints only read
+this cached state, so load balancer probes never cost a round trip. With
+HEALTH_CHECK_INTERVAL=0 there is no thread; a probe then runs the checks
+itself, at most once per ON_DEMAND_INTERVAL, and the others reuse the result.
+"""
+import os
+import smtplib
+import threading
+import time
+from datetime import datetime
+from flask import current_app
+from pymongo.monitoring import ServerHeartbeatListener
+from configs.mongo import get_client, register_listener
+import logging
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+UP = 'up'
+DOWN = 'down'
+UNKNOWN = 'unknown'
+DISABLED = 'disabled'
+
+# Minimum seconds between checks run by the probes themselves (HEALTH_CHECK_INTERVAL=0)
+ON_DEMAND_INTERVAL = 5
+
+
+class _HeartbeatListener(ServerHeartbeatListener):
+    """Feeds pymongo's own server monitoring into the health monitor"""
+
+    def __init__(self, monitor):
+        self.monitor = monitor
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        self.monitor.record_heartbeat(event.connection_id, True, event.duration)
+
+    def failed(self, event):
+        self.monitor.record_heartbeat(event.connection_id, False, event.duration, event.reply)
+
+
+class HealthMonitor:
+    """Periodically checks MongoDB and SMTP and keeps the latest result"""
+
+    def __init__(self, app):
+        self.app = app
+        self.interval = app.config['HEALTH_CHECK_INTERVAL']
+        self.smtp_interval = app.config['HEALTH_SMTP_CHECK_INTERVAL']
+        self.stale_after = app.config['HEALTH_STALE_AFTER']
+        self.started_at = time.time()
+        self._lock = threading.Lock()
+        self._state = {
+            'mongodb': {'status': UNKNOWN},
+            'smtp': {'status': UNKNOWN}
+        }
+        self._servers = {}
+        self._checked_at = {}
+        self._on_demand_lock = threading.Lock()
+        self._on_demand_at = None
+        self._next_smtp_check = 0
+        self._thread = None
+        self._thread_pid = None
+        self._stopping = threading.Event()
+        register_listener(_HeartbeatListener(self))
+
+    def start(self):
+        """Start the check thread for this process (again after a fork)"""
+        with self._lock:
+            if self._thread is not None and self._thread_pid == os.getpid() and self._thread.is_alive():
+                return
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self.run, name='health-monitor', daemon=True)
+            self._thread_pid = os.getpid()
+            self._thread.start()
+
+    def stop(self):
+        self._stopping.set()
+
+    def run(self):
+        next_smtp_check = 0
+        while not self._stopping.is_set():
+            self.check_mongodb()
+            if time.monotonic() >= next_smtp_check:
+                self.check_smtp()
+                next_smtp_check = time.monotonic() + self.smtp_interval
+            self._stopping.wait(self.interval)
+
+    def check_mongodb(self):
+        started = time.perf_counter()
+        try:
+            get_client().admin.command('ping')
+            self._record('mongodb', UP, latency=time.perf_counter() - started)
+        except Exception as e:
+            self._record('mongodb', DOWN, latency=time.perf_counter() - started, error=e)
+
+    def check_smtp(self):
+        config = self.app.config
+        if config.get('MAIL_SUPPRESS_SEND') or not config.get('MAIL_SERVER'):
+            self._record('smtp', DISABLED)
+            return
+
+        started = time.perf_counter()
+        smtp_class = smtplib.SMTP_SSL if config.get('MAIL_USE_SSL') else smtplib.SMTP
+        try:
+            with smtp_class(config['MAIL_SERVER'], config.get('MAIL_PORT'), timeout=config['EMAIL_SMTP_TIMEOUT']) as smtp:
+                smtp.noop()
+            self._record('smtp', UP, latency=time.perf_counter() - started)
+        except Exception as e:
+            self._record('smtp', DOWN, latency=time.perf_counter() - started, error=e)
+
+    def record_heartbeat(self, address, ok, duration, error=None):
+        """Track per-server heartbeats; MongoDB is down once no known server answers"""
+        with self._lock:
+            self._servers[address] = ok
+            all_failed = not any(self._servers.values())
+        if all_failed:
+            self._record('mongodb', DOWN, latency=duration, error=error)
+
+    def _record(self, component, status, latency=None, error=None):
+        previous = self._state[component]['status']
+        entry = {'status': status, 'checked_at': datetime.utcnow().isoformat() + 'Z'}
+        if latency is not None:
+            entry['latency_ms'] = round(latency * 1000, 1)
+        if error is not None:
+            entry['error'] = str(error)[:200]
+        with self._lock:
+            self._state[component] = entry
+            self._checked_at[component] = time.monotonic()
+
+        if status != previous and previous != UNKNOWN:
+            log = logger.warning if status == DOWN else logger.info
+            log(f"{component} is {status}" + (f": {entry['error']}" if error is not None else ''))
+
+    def check_on_demand(self):
+        """Run the checks on this thread unless they ran in the last ON_DEMAND_INTERVAL seconds"""
+        if self._is_fresh():
+            return
+        # Concurrent probes wait for the one check in flight instead of starting their own
+        with self._on_demand_lock:
+            if self._is_fresh():
+                return
+            self.check_mongodb()
+            if time.monotonic() >= self._next_smtp_check:
+                self.check_smtp()
+                self._next_smtp_check = time.monotonic() + self.smtp_interval
+            self._on_demand_at = time.monotonic()
+
+    def _is_fresh(self):
+        return self._on_demand_at is not None and time.monotonic() - self._on_demand_at < ON_DEMAND_INTERVAL
+
+    def snapshot(self):
+        """Latest status of every component; results missing a few check intervals count as unknown"""
+        if self.interval <= 0:
+            self.check_on_demand()
+        now = time.monotonic()
+        with self._lock:
+            state = {component: dict(entry) for component, entry in self._state.items()}
+            for component, checked_at in self._checked_at.items():
+                max_age = self.stale_after + (self.smtp_interval if component == 'smtp' else 0)
+                if now - checked_at > max_age:
+                    state[component]['status'] = UNKNOWN
+            return state
+
+    def ready(self):
+        """Whether this worker can serve traffic (MongoDB reachable; SMTP is queued so optional)"""
+        return self.snapshot()['mongodb']['status'] == UP
+
+
+def init_health_monitor(app):
+    """Create the health monitor for the app (checks start with get_health_monitor)"""
+    monitor = HealthMonitor(app)
+    app.extensions['health_monitor'] = monitor
+    return monitor
+
+
+def get_health_monitor():
+    """Get the health monitor for the current app, (re)starting it in this process if needed"""
+    monitor = current_app.extensions['health_monitor']
+    if current_app.config['HEALTH_CHECK_INTERVAL'] > 0:
+        monitor.start()
+    return monitor
@@ -0,0 +1,196 @@
+"""
+Resized / re-encoded variants of catalog and uploaded images.
+
+Derivatives are rendered by a small worker pool and cached on disk keyed by
+(source hash, width, format), so each one is only ever rendered once.
+Concurrent first requests for the same derivative share a single render.
+
+Run this module directly to prebuild catalog thumbnails at build time:
+
+    python -m services.image_derivatives
+"""
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+from services.static_assets import StaticAssets
+import logging
+
+try:
+    from PIL import Image
+except ImportError:  # Without Pillow the original images are served
+    Image = None
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Output formats: Pillow format name and response mimetype
+FORMATS = {
+    'webp': ('WEBP', 'image/webp'),
+    'png': ('PNG', 'image/png'),
+    'jpeg': ('JPEG', 'image/jpeg')
+}
+
+RENDER_TIMEOUT = 30  # seconds
+
+
+class ImageDerivatives:
+    """Catalog of source images plus the on-disk derivative cache"""
+
+    def __init__(self, catalog_root, cache_dir, widths, max_workers=2, quality=80):
+        self.catalog = StaticAssets(catalog_root, cache_dir, precompress=False)
+        self.cache_dir = cache_dir
+        self.widths = set(widths)
+        self.quality = quality
+        self.max_workers = max_workers
+        self._executor = None
+        self._executor_pid = None
+        self._lock = threading.Lock()
+        self._pending = {}
+
+    @property
+    def enabled(self):
+        return Image is not None
+
+    def executor(self):
+        """Render threads, created lazily so each forked server worker gets its own"""
+        if self._executor is None or self._executor_pid != os.getpid():
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='image-derivatives')
+            self._executor_pid = os.getpid()
+            self._pending = {}
+        return self._executor
+
+    def build_catalog(self):
+        """Fingerprint the source images"""
+        self.catalog.build()
+        self.catalog.files = {
+            name: entry for name, entry in self.catalog.files.items()
+            if entry.mimetype.startswith('image/') and entry.mimetype != 'image/svg+xml'
+        }
+
+    def path(self, source_hash, width, fmt):
+        return os.path.join(self.cache_dir, source_hash[:2], f'{source_hash}-{width}.{fmt}')
+
+    def get(self, source_hash, open_source, width, fmt):
+        """Return the path of a derivative, rendering it first if needed"""
+        path = self.path(source_hash, width, fmt)
+        if os.path.isfile(path):
+            return path
+        return self.submit(source_hash, open_source, width, fmt).result(timeout=RENDER_TIMEOUT)
+
+    def submit(self, source_hash, open_source, width, fmt):
+        """Queue a render, reusing any render already in flight for the same key"""
+        key = (source_hash, width, fmt)
+        with self._lock:
+            future = self._pending.get(key)
+            if future is not None:
+                return future
+            future = self.executor().submit(
+                _render, open_source, self.path(source_hash, width, fmt), width, fmt, self.quality
+            )
+            self._pending[key] = future
+        future.add_done_callback(lambda _: self._forget(key))
+        return future
+
+    def prebuild(self, widths, fmt='webp', wait=False):
+        """Queue derivatives for every catalog image, or with `wait` render them on this thread"""
+        futures = []
+        for entry in self.catalog.files.values():
+            for width in widths:
+                path = self.path(entry.etag, width, fmt)
+                if os.path.isfile(path):
+                    continue
+                if wait:
+                    _render(_file_opener(entry.path), path, width, fmt, self.quality)
+                else:
+                    futures.append(self.submit(entry.etag, _file_opener(entry.path), width, fmt))
+        if futures:
+            logger.info(f"Queued {len(futures)} catalog image derivatives")
+        return futures
+
+    def _forget(self, key):
+        with self._lock:
+            self._pending.pop(key, None)
+
+
+def _file_opener(path):
+    return lambda: open(path, 'rb')
+
+
+def _render(open_source, path, width, fmt, quality):
+    """Resize (never upscale) and encode one derivative"""
+    if os.path.isfile(path):
+        return path
+
+    started = time.perf_counter()
+    pil_format, _ = FORMATS[fmt]
+    with open_source() as source, Image.open(source) as image:
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA')
+        if fmt == 'jpeg':
+            image = image.convert('RGB')
+        if width and image.width > width:
+            height = max(1, round(image.height * width / image.width))
+            image = image.resize((width, height), Image.LANCZOS)
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        image.save(tmp_path, pil_format, quality=quality, optimize=True)
+        os.replace(tmp_path, path)
+
+    logger.info(f"Rendered {os.path.basename(path)} in {(time.perf_counter() - started) * 1000:.0f}ms")
+    return path
+
+
+def init_image_derivatives(app):
+    """Create the derivative pipeline for the app (the catalog is indexed by build_image_derivatives)"""
+    app.extensions['image_derivatives'] = ImageDerivatives(
+        app.config['IMAGE_CATALOG_ROOT'],
+        app.config['IMAGE_DERIVATIVE_CACHE_DIR'],
+        app.config['IMAGE_DERIVATIVE_WIDTHS'],
+        max_workers=app.config['IMAGE_DERIVATIVE_WORKERS']
+    )
+
+
+def build_image_derivatives(app, wait=False):
+    """Index the catalog images and prebuild their thumbnails (rendered here with `wait`, else queued)"""
+    derivatives = app.extensions['image_derivatives']
+    derivatives.build_catalog()
+
+    if not derivatives.enabled:
+        app.logger.warning("Pillow is not installed, image derivatives are disabled")
+    elif app.config['IMAGE_DERIVATIVE_PREBUILD_WIDTHS']:
+        derivatives.prebuild(app.config['IMAGE_DERIVATIVE_PREBUILD_WIDTHS'], wait=wait)
+
+
+def get_image_derivatives():
+    """Get the derivative pipeline for the current app"""
+    return current_app.extensions['image_derivatives']
+
+
+def main():
+    """Prebuild catalog derivatives for every allowed width"""
+    logging.basicConfig(level=logging.INFO)
+    from configs.config import Config
+
+    if Image is None:
+        logger.info("❌ Pillow is not installed")
+        return False
+
+    derivatives = ImageDerivatives(
+        Config.IMAGE_CATALOG_ROOT,
+        Config.IMAGE_DERIVATIVE_CACHE_DIR,
+        Config.IMAGE_DERIVATIVE_WIDTHS,
+        max_workers=Config.IMAGE_DERIVATIVE_WORKERS
+    )
+    derivatives.build_catalog()
+    futures = derivatives.prebuild(sorted(derivatives.widths))
+    for future in futures:
+        future.result()
+    logger.info(f"✅ {len(futures)} derivatives built in {Config.IMAGE_DERIVATIVE_CACHE_DIR}")
+    return True
+
+
+if __name__ == '__main__':
+    main()
@@ -1,17 +1,19 @@
 """
 Script to list all users in the database with their roles and status.
 """
+import argparse
 from configs.database import db
+from services.repositories import UserRepository
 import logging
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def list_all_users():
+def list_all_users(role=None, limit=0):
     
-    # Get all users (excluding password hashes for security)
-    users = db.users.find({}, {'password': 0}).sort('created_at', -1)
+    # Stream only the listed columns, newest first (never password hashes)
+    users = UserRepository(db).page({'role': role} if role else {}, '-created_at', view='export', limit=limit)
     
     logger.info("\n" + "="*80)
     logger.info(f"{'USERNAME':<20} | {'EMAIL':<30} | {'ROLE':<10} | {'VERIFIED':<8} | CREATED AT")
@@ -31,4 +33,8 @@ def list_all_users():
     logger.info("="*80)
 
 if __name__ == "__main__":
-    list_all_users()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='List users with their roles and status')
+    parser.add_argument('--role', help='Only list users with this role')
+    parser.add_argument('--limit', type=int, default=0, help='List at most this many users')
+    args = parser.parse_args()
+    list_all_users(args.role, args.limit)
\ No newline at end of file
@@ -0,0 +1,204 @@
+"""
+Per-request performance metrics.
+
+Every request is counted and timed per route (method, URL rule and status),
+with its request / response sizes and the number in flight. MongoDB commands
+(through a pymongo CommandListener), password hashing, JSON serialization and
+email (queueing in the request, SMTP sends in the outbox worker) are timed as
+well. Everything is exported on /metrics in the Prometheus text format, which
+needs the prometheus_client package; under gunicorn set
+PROMETHEUS_MULTIPROC_DIR to an empty directory so all workers are reported.
+
+With SERVER_TIMING on, each response also says where its time went:
+
+    Server-Timing: db;dur=4.1;desc="3 commands", hash;dur=212.0, serialize;dur=0.4, app;dur=219.8
+"""
+import os
+import time
+from flask import Response, g, has_request_context, request
+from flask.json.provider import DefaultJSONProvider
+from pymongo.monitoring import CommandListener
+from configs.mongo import register_listener
+import logging
+
+try:
+    from prometheus_client import (
+        CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess
+    )
+except ImportError:  # /metrics needs prometheus_client; Server-Timing works without it
+    Histogram = None
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Server-Timing entries, in header order
+SEGMENTS = ('db', 'hash', 'serialize', 'email')
+
+# Set by init_metrics when METRICS_ENABLED and prometheus_client is installed
+_collecting = False
+
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+FAST_BUCKETS = (.0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5)
+
+if Histogram is not None:
+    REQUESTS = Counter('http_requests_total', 'HTTP requests', ['method', 'route', 'status'])
+    REQUEST_SECONDS = Histogram('http_request_duration_seconds', 'Time to produce a response', ['method', 'route'])
+    REQUEST_BYTES = Histogram('http_request_size_bytes', 'Request body size', ['method', 'route'], buckets=SIZE_BUCKETS)
+    RESPONSE_BYTES = Histogram('http_response_size_bytes', 'Response body size (unstreamed responses)',
+                               ['method', 'route'], buckets=SIZE_BUCKETS)
+    IN_PROGRESS = Gauge('http_requests_in_progress', 'Requests being handled', ['method', 'route'],
+                        multiprocess_mode='livesum')
+    MONGO_SECONDS = Histogram('mongodb_command_duration_seconds', 'MongoDB command round trips',
+                              ['command', 'outcome'], buckets=FAST_BUCKETS)
+    HASH_SECONDS = Histogram('password_hash_duration_seconds', 'Password hash / verify time, including queueing',
+                             ['operation'])
+    SERIALIZE_SECONDS = Histogram('json_serialize_duration_seconds', 'JSON encoding of response bodies',
+                                  buckets=FAST_BUCKETS)
+    SMTP_SECONDS = Histogram('smtp_send_duration_seconds', 'SMTP delivery of one outbox message', ['outcome'])
+
+
+def record_timing(segment, seconds):
+    """Add `seconds` to the current request's Server-Timing `segment` (no-op outside a request)"""
+    if has_request_context():
+        timings = g.get('_timings')
+        if timings is not None:
+            total, count = timings.get(segment, (0.0, 0))
+            timings[segment] = (total + seconds, count + 1)
+
+
+def observe_password_hash(operation, seconds):
+    """Record one password hash or verify call"""
+    if _collecting:
+        HASH_SECONDS.labels(operation).observe(seconds)
+    record_timing('hash', seconds)
+
+
+def observe_email_queued(seconds):
+    """Record the time a request spent queueing an email"""
+    record_timing('email', seconds)
+
+
+def observe_smtp_send(outcome, seconds):
+    """Record one SMTP delivery attempt from the outbox worker"""
+    if _collecting:
+        SMTP_SECONDS.labels(outcome).observe(seconds)
+
+
+class MongoCommandTimer(CommandListener):
+    """Times every MongoDB command, per command name and for the request that issued it"""
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        self._observe(event, 'ok')
+
+    def failed(self, event):
+        self._observe(event, 'error')
+
+    def _observe(self, event, outcome):
+        seconds = event.duration_micros / 1e6
+        if _collecting:
+            MONGO_SECONDS.labels(event.command_name, outcome).observe(seconds)
+        record_timing('db', seconds)
+
+
+class TimedJSONProvider(DefaultJSONProvider):
+    """Flask's JSON provider, timing each `dumps` (jsonify and streamed NDJSON lines alike)"""
+
+    def dumps(self, obj, **kwargs):
+        started = time.perf_counter()
+        try:
+            return super().dumps(obj, **kwargs)
+        finally:
+            seconds = time.perf_counter() - started
+            if _collecting:
+                SERIALIZE_SECONDS.observe(seconds)
+            record_timing('serialize', seconds)
+
+
+def server_timing(timings, total):
+    """Server-Timing header value for a request's {segment: (seconds, count)}"""
+    entries = []
+    for segment in SEGMENTS:
+        if segment in timings:
+            seconds, count = timings[segment]
+            entry = f'{segment};dur={seconds * 1000:.1f}'
+            if segment == 'db':
+                entry += f';desc="{count} command{"s" if count != 1 else ""}"'
+            entries.append(entry)
+    entries.append(f'app;dur={total * 1000:.1f}')
+    return ', '.join(entries)
+
+
+def _labels():
+    return request.method, request.url_rule.rule if request.url_rule else 'unmatched'
+
+
+class RequestMetrics:
+    """before / after / teardown request hooks recording each request"""
+
+    def __init__(self, server_timing=False):
+        self.server_timing = server_timing
+
+    def before_request(self):
+        g._request_started = time.perf_counter()
+        g._timings = {}
+        if _collecting:
+            IN_PROGRESS.labels(*_labels()).inc()
+            g._in_progress = True
+
+    def after_request(self, response):
+        started = g.get('_request_started')
+        if started is None:
+            return response
+        total = time.perf_counter() - started
+
+        if _collecting:
+            method, route = _labels()
+            REQUESTS.labels(method, route, str(response.status_code)).inc()
+            REQUEST_SECONDS.labels(method, route).observe(total)
+            REQUEST_BYTES.labels(method, route).observe(request.content_length or 0)
+            size = response.content_length
+            if size is None and response.is_sequence:
+                size = response.calculate_content_length()
+            if size is not None:
+                RESPONSE_BYTES.labels(method, route).observe(size)
+
+        if self.server_timing:
+            response.headers['Server-Timing'] = server_timing(g._timings, total)
+        return response
+
+    def teardown_request(self, _):
+        if g.pop('_in_progress', False):
+            IN_PROGRESS.labels(*_labels()).dec()
+
+
+def metrics_view():
+    """Prometheus text exposition of this process (or of every worker in multiprocess mode)"""
+    registry = REGISTRY
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    return Response(generate_latest(registry), mimetype=CONTENT_TYPE_LATEST)
+
+
+def init_metrics(app):
+    """Instrument every route of the app (blueprints included) and the MongoDB client"""
+    global _collecting
+    if app.config['METRICS_ENABLED']:
+        if Histogram is None:
+            logger.warning("METRICS_ENABLED is set but prometheus_client is not installed; /metrics is disabled")
+        else:
+            _collecting = True
+            app.add_url_rule('/metrics', 'metrics', metrics_view, methods=['GET'])
+
+    register_listener(MongoCommandTimer())
+    app.json = TimedJSONProvider(app)
+
+    metrics = RequestMetrics(server_timing=app.config['SERVER_TIMING'])
+    app.before_request(metrics.before_request)
+    app.after_request(metrics.after_request)
+    app.teardown_request(metrics.teardown_request)
+    app.extensions['request_metrics'] = metrics
+    return metrics
@@ -0,0 +1,210 @@
+"""
+Password hashing off the request threads.
+
+Hashes are computed in a small process pool so a burst of logins cannot stall
+every other request on a worker. At most PASSWORD_HASH_WORKERS +
+PASSWORD_HASH_QUEUE_SIZE hashes are in flight per worker; past that callers
+get `HasherBusy`, which routes turn into a 503 with Retry-After.
+
+The scheme (bcrypt, scrypt or pbkdf2) and its cost come from the config.
+Hashes made with other parameters still verify, and `verify` returns a fresh
+hash for them so logins upgrade stored passwords. Werkzeug hashes created
+before this service are verified the same way.
+"""
+import multiprocessing
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+import bcrypt
+from flask import current_app, jsonify
+from werkzeug.security import check_password_hash, generate_password_hash
+from services.metrics import observe_password_hash
+import logging
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Cost used when PASSWORD_HASH_COST is 0: bcrypt rounds, scrypt N, pbkdf2 iterations
+DEFAULT_COSTS = {'bcrypt': 12, 'scrypt': 32768, 'pbkdf2': 600000}
+
+
+class HasherBusy(Exception):
+    """Raised when the hashing pool has no free slot"""
+
+
+def _werkzeug_method(scheme, cost):
+    if scheme == 'scrypt':
+        return f'scrypt:{cost}:8:1'
+    return f'pbkdf2:sha256:{cost}'
+
+
+def hash_password(password, scheme, cost):
+    """Hash `password` with `scheme` at `cost` (runs in the pool)"""
+    if scheme == 'bcrypt':
+        return bcrypt.hashpw(password.encode(), bcrypt.gensalt(rounds=cost)).decode()
+    return generate_password_hash(password, method=_werkzeug_method(scheme, cost))
+
+
+def needs_rehash(stored, scheme, cost):
+    """Whether `stored` was made with a different scheme or cost than configured"""
+    if stored.startswith('$2'):
+        # $2b$<rounds>$<salt+hash>
+        return scheme != 'bcrypt' or int(stored.split('$')[2]) != cost
+    return scheme == 'bcrypt' or stored.split('$', 1)[0] != _werkzeug_method(scheme, cost)
+
+
+def verify_password(password, stored, scheme, cost):
+    """(matches, new hash if the stored one should be upgraded, else None) (runs in the pool)"""
+    if stored.startswith('$2'):
+        matches = bcrypt.checkpw(password.encode(), stored.encode())
+    else:
+        matches = check_password_hash(stored, password)
+    if matches and needs_rehash(stored, scheme, cost):
+        return True, hash_password(password, scheme, cost)
+    return matches, None
+
+
+class HashStats:
+    """Latency of recent hash / verify calls in this process"""
+
+    def __init__(self, window=1000):
+        self._lock = threading.Lock()
+        self._latencies = {'hash': deque(maxlen=window), 'verify': deque(maxlen=window)}
+        self.completed = {'hash': 0, 'verify': 0}
+        self.rejected = 0
+        self.rehashed = 0
+
+    def record(self, operation, seconds):
+        with self._lock:
+            self._latencies[operation].append(seconds)
+            self.completed[operation] += 1
+
+    def count(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def snapshot(self):
+        with self._lock:
+            result = {'rejected': self.rejected, 'rehashed': self.rehashed}
+            for operation, latencies in self._latencies.items():
+                ordered = sorted(latencies)
+                result[operation] = {
+                    'completed': self.completed[operation],
+                    'p50_ms': round(ordered[len(ordered) // 2] * 1000, 1) if ordered else None,
+                    'p95_ms': round(ordered[int(len(ordered) * 0.95)] * 1000, 1) if ordered else None,
+                    'max_ms': round(ordered[-1] * 1000, 1) if ordered else None
+                }
+            return result
+
+
+class PasswordHasher:
+    """Hashes and verifies passwords in a bounded process pool (inline when workers is 0)"""
+
+    def __init__(self, scheme='bcrypt', cost=0, workers=0, queue_size=8, timeout=10):
+        if scheme not in DEFAULT_COSTS:
+            raise ValueError(f"Unknown password hash scheme: {scheme}")
+        self.scheme = scheme
+        self.cost = cost or DEFAULT_COSTS[scheme]
+        self.workers = workers
+        self.timeout = timeout
+        self.stats = HashStats()
+        self._slots = threading.BoundedSemaphore(workers + queue_size) if workers else None
+        self._pool = None
+        self._pool_pid = None
+        self._lock = threading.Lock()
+
+    def pool(self):
+        """Process pool, created lazily so each forked server worker gets its own
+
+        Spawned children re-import the parent's __main__ (routes.app under `python -m
+        routes.app`), which is why importing the app must not start anything.
+        """
+        with self._lock:
+            if self._pool is None or self._pool_pid != os.getpid():
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context('spawn')
+                )
+                self._pool_pid = os.getpid()
+            return self._pool
+
+    def _discard_pool(self, pool):
+        """Drop a broken pool so the next call starts a new one"""
+        with self._lock:
+            if self._pool is pool:
+                self._pool = None
+        pool.shutdown(wait=False)
+
+    def _run_in_pool(self, pool, function, *args):
+        if not self._slots.acquire(blocking=False):
+            self.stats.count('rejected')
+            raise HasherBusy('Password hashing is saturated')
+        try:
+            future = pool.submit(function, *args)
+        except Exception:
+            self._slots.release()
+            raise
+        # The slot stays taken until the hash finishes, even if we stop waiting for it
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            raise HasherBusy('Password hashing timed out')
+
+    def _run(self, operation, function, *args):
+        started = time.perf_counter()
+        if not self.workers:
+            result = function(*args)
+        else:
+            pool = self.pool()
+            try:
+                result = self._run_in_pool(pool, function, *args)
+            except BrokenProcessPool:
+                # A child that died (e.g. OOM-killed) breaks the pool for good
+                logger.warning("Password hashing pool is broken, starting a new one")
+                self._discard_pool(pool)
+                result = self._run_in_pool(self.pool(), function, *args)
+        seconds = time.perf_counter() - started
+        self.stats.record(operation, seconds)
+        observe_password_hash(operation, seconds)
+        return result
+
+    def hash(self, password):
+        """Hash a new password with the configured scheme and cost"""
+        return self._run('hash', hash_password, password, self.scheme, self.cost)
+
+    def verify(self, password, stored):
+        """(matches, upgraded hash or None) for a login attempt"""
+        matches, new_hash = self._run('verify', verify_password, password, stored, self.scheme, self.cost)
+        if new_hash:
+            self.stats.count('rehashed')
+        return matches, new_hash
+
+    def snapshot(self):
+        return {'scheme': self.scheme, 'cost': self.cost, 'workers': self.workers, **self.stats.snapshot()}
+
+
+def init_password_hasher(app):
+    """Create the password hasher for the app"""
+    app.extensions['password_hasher'] = PasswordHasher(
+        scheme=app.config['PASSWORD_HASH_SCHEME'],
+        cost=app.config['PASSWORD_HASH_COST'],
+        workers=app.config['PASSWORD_HASH_WORKERS'],
+        queue_size=app.config['PASSWORD_HASH_QUEUE_SIZE'],
+        timeout=app.config['PASSWORD_HASH_TIMEOUT']
+    )
+
+
+def get_password_hasher():
+    """Get the password hasher for the current app"""
+    return current_app.extensions['password_hasher']
+
+
+def hasher_busy_response():
+    """503 asking the client to retry shortly, for when the hashing pool is saturated"""
+    response = jsonify({'error': 'Server is busy, please try again in a moment'})
+    response.headers['Retry-After'] = '1'
+    return response, 503
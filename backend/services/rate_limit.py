@@ -0,0 +1,205 @@
+"""
+Rate limiting for the public endpoints.
+
+Each policy is a token bucket ("10/minute" holds 10 tokens and refills 10 per
+minute) applied per client IP and, where the route names one, per account.
+The check runs before the view, so throttled requests never reach password
+hashing, database writes or the SMTP relay; they get a 429 with Retry-After.
+
+Buckets live in process memory by default. Set RATE_LIMIT_STORAGE_URL to a
+Redis URL (needs the `redis` package) to share them between workers and hosts.
+"""
+import math
+import re
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from flask import current_app, jsonify, request
+import logging
+
+try:
+    import redis
+except ImportError:  # Only needed for the shared store
+    redis = None
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+PERIODS = {'second': 1, 'minute': 60, 'hour': 3600, 'day': 86400}
+
+# Route policies: (config key for the IP limit, config key for the account limit)
+POLICIES = {
+    'login': ('RATE_LIMIT_LOGIN_IP', 'RATE_LIMIT_LOGIN_ACCOUNT'),
+    'register': ('RATE_LIMIT_REGISTER_IP', None),
+    'resend_verification': ('RATE_LIMIT_RESEND_IP', 'RATE_LIMIT_RESEND_ACCOUNT'),
+    'feedback': ('RATE_LIMIT_FEEDBACK_IP', None)
+}
+
+
+class Limit:
+    """A token bucket size and refill rate parsed from e.g. `10/minute` or `5/15minutes`"""
+
+    def __init__(self, spec):
+        match = re.fullmatch(r'\s*(\d+)\s*/\s*(\d*)\s*(second|minute|hour|day)s?\s*', spec)
+        if not match:
+            raise ValueError(f"Invalid rate limit: {spec!r}")
+        self.capacity = int(match.group(1))
+        self.period = int(match.group(2) or 1) * PERIODS[match.group(3)]
+        self.rate = self.capacity / self.period  # Tokens per second
+        self.spec = spec.strip()
+
+    def __repr__(self):
+        return f"Limit({self.spec!r})"
+
+
+class MemoryStore:
+    """Token buckets in this process, least recently used evicted past max_keys"""
+
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key, limit):
+        """Take a token; returns seconds to wait (0 when allowed)"""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (limit.capacity, now))
+            tokens = min(limit.capacity, tokens + (now - updated) * limit.rate)
+            if tokens >= 1:
+                tokens -= 1
+                wait = 0
+            else:
+                wait = (1 - tokens) / limit.rate
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return wait
+
+    def reset(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+# KEYS[1] = bucket; ARGV = capacity, tokens per second, now (seconds)
+_TAKE_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(bucket[1]) or capacity
+local updated = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated) * rate)
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    wait = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil((capacity - tokens) / rate * 1000) + 1000)
+return tostring(wait)
+"""
+
+
+class RedisStore:
+    """Token buckets in Redis (or anything speaking its protocol), shared by every worker"""
+
+    def __init__(self, url, prefix='ratelimit:'):
+        if redis is None:
+            raise RuntimeError('RATE_LIMIT_STORAGE_URL needs the redis package')
+        self.client = redis.Redis.from_url(url, socket_timeout=0.5, socket_connect_timeout=0.5)
+        self.prefix = prefix
+        self._take = self.client.register_script(_TAKE_SCRIPT)
+
+    def take(self, key, limit):
+        return float(self._take(keys=[self.prefix + key], args=[limit.capacity, limit.rate, time.time()]))
+
+    def reset(self):
+        for key in self.client.scan_iter(self.prefix + '*'):
+            self.client.delete(key)
+
+
+class RateLimiter:
+    """Applies the route policies against a bucket store"""
+
+    def __init__(self, app, store=None):
+        self.enabled = app.config['RATE_LIMIT_ENABLED']
+        self.proxy_count = app.config['RATE_LIMIT_PROXY_COUNT']
+        self.store = store or self._create_store(app.config['RATE_LIMIT_STORAGE_URL'])
+        self.policies = {}
+        for name, (ip_key, account_key) in POLICIES.items():
+            self.policies[name] = (
+                Limit(app.config[ip_key]),
+                Limit(app.config[account_key]) if account_key else None
+            )
+
+    @staticmethod
+    def _create_store(url):
+        if url:
+            logger.info('Rate limits shared through Redis')
+            return RedisStore(url)
+        return MemoryStore()
+
+    def client_ip(self):
+        """Client address, taken from X-Forwarded-For when behind RATE_LIMIT_PROXY_COUNT proxies"""
+        route = request.access_route
+        if self.proxy_count and len(route) >= self.proxy_count:
+            return route[-self.proxy_count]
+        return request.remote_addr or 'unknown'
+
+    def check(self, policy, account=None):
+        """Seconds the client must wait before `policy` allows another request, 0 if allowed now"""
+        if not self.enabled:
+            return 0
+        ip_limit, account_limit = self.policies[policy]
+        try:
+            wait = self.store.take(f"{policy}:ip:{self.client_ip()}", ip_limit)
+            if not wait and account and account_limit:
+                wait = self.store.take(f"{policy}:account:{account.strip().lower()}", account_limit)
+        except Exception as e:
+            # Fail open: an unreachable shared store must not take the API down
+            logger.warning(f"Rate limit check failed, allowing request: {e}")
+            return 0
+        return wait
+
+
+def init_rate_limiter(app):
+    """Create the rate limiter for the app"""
+    app.extensions['rate_limiter'] = RateLimiter(app)
+
+
+def get_rate_limiter():
+    """Get the rate limiter for the current app"""
+    return current_app.extensions['rate_limiter']
+
+
+def rate_limit(policy, account_field=None):
+    """Decorator applying a rate limit policy, per IP and per the JSON body's `account_field`"""
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            if request.method == 'OPTIONS':
+                # CORS preflights never reach the view's work
+                return f(*args, **kwargs)
+            account = None
+            if account_field:
+                data = request.get_json(silent=True)
+                value = data.get(account_field) if isinstance(data, dict) else None
+                account = value if isinstance(value, str) else None
+
+            wait = get_rate_limiter().check(policy, account)
+            if wait:
+                retry_after = max(1, math.ceil(wait))
+                logger.info(f"Rate limited {policy} request from {get_rate_limiter().client_ip()}")
+                response = jsonify({
+                    'error': 'Too many requests, please try again later',
+                    'retry_after': retry_after
+                })
+                response.headers['Retry-After'] = str(retry_after)
+                return response, 429
+            return f(*args, **kwargs)
+        return decorated_function
+    return decorator
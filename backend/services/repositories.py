@@ -0,0 +1,257 @@
+"""
+Data access for users, sessions and feedback. Wall designs are read and
+written by services/design_store.py (and services/async_design_store.py).
+
+Each repository has named projections ("views") so callers ask for exactly
+the fields they use: list endpoints read summaries and only single-document
+endpoints load the heavy `wall_designs` blobs. Repositories are cheap to
+construct, so handlers create them per call around the db they already use.
+
+They also work on a Motor database (routes/async_app.py): `find_one` then
+returns an awaitable and `cursor` an async cursor.
+"""
+import base64
+from bson import ObjectId, json_util
+from pymongo import ASCENDING, DESCENDING
+
+
+def encode_cursor(*values):
+    """Opaque keyset cursor from the sort key values of the last document on a page"""
+    payload = json_util.dumps(list(values)).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Sort key values from a cursor made by `encode_cursor`"""
+    try:
+        payload = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        values = json_util.loads(payload)
+    except Exception:
+        raise ValueError('Invalid cursor')
+    if not isinstance(values, list):
+        raise ValueError('Invalid cursor')
+    return values
+
+
+def keyset_after(field, descending, value, last_id):
+    """Query for the documents after (value, last_id) in (field, _id) order
+
+    Missing values sort as null: last when descending, first when ascending.
+    """
+    if descending:
+        if value is None:
+            return {field: None, '_id': {'$lt': last_id}}
+        return {'$or': [
+            {field: {'$lt': value}},
+            {field: value, '_id': {'$lt': last_id}},
+            {field: None}
+        ]}
+    if value is None:
+        return {'$or': [
+            {field: None, '_id': {'$gt': last_id}},
+            {field: {'$ne': None}}
+        ]}
+    return {'$or': [
+        {field: {'$gt': value}},
+        {field: value, '_id': {'$gt': last_id}}
+    ]}
+
+
+def _and(*clauses):
+    clauses = [clause for clause in clauses if clause]
+    if len(clauses) == 1:
+        return clauses[0]
+    return {'$and': clauses} if clauses else {}
+
+
+class Repository:
+    """Base class: a collection plus its named projections"""
+
+    collection_name = None
+    # view name -> projection dict, or None for the whole document
+    views = {}
+
+    def __init__(self, db):
+        self.db = db
+
+    @property
+    def collection(self):
+        return self.db[self.collection_name]
+
+    def projection(self, view):
+        if view not in self.views:
+            raise ValueError(f"Unknown {self.collection_name} view: {view}")
+        return self.views[view]
+
+    def find_one(self, query, view='full'):
+        return self.collection.find_one(query, self.projection(view))
+
+    def cursor(self, query, view='summary', sort=None, limit=0):
+        """Unread pymongo cursor, for callers that stream the results"""
+        cursor = self.collection.find(query, self.projection(view))
+        if sort:
+            cursor = cursor.sort(sort)
+        if limit:
+            cursor = cursor.limit(limit)
+        return cursor
+
+    def find(self, query, view='summary', sort=None, limit=0):
+        return list(self.cursor(query, view, sort, limit))
+
+
+class UserRepository(Repository):
+    collection_name = 'users'
+    views = {
+        # Safe to return to clients: never the password hash or tokens
+        'summary': {'password': 0, 'verification_token': 0, 'username_lower': 0, 'email_lower': 0},
+        # What /api/auth/status renders
+        'status': {'username': 1, 'email': 1, 'role': 1, 'email_verified': 1, 'created_at': 1, 'is_active': 1},
+        # What login needs to check credentials and build the response
+        'login': {'username': 1, 'email': 1, 'role': 1, 'password': 1, 'is_active': 1, 'created_at': 1, 'last_login': 1},
+        # Columns of the admin export
+        'export': {
+            'username': 1, 'email': 1, 'role': 1, 'email_verified': 1,
+            'is_active': 1, 'created_at': 1, 'last_login': 1
+        },
+        'full': None
+    }
+    # Fields the admin listing can sort by ("-" prefix for descending)
+    sort_fields = ('created_at', 'username', 'email', 'last_login')
+
+    def find_by_id(self, user_id, view='summary'):
+        if not ObjectId.is_valid(str(user_id)):
+            return None
+        return self.find_one({'_id': ObjectId(str(user_id))}, view)
+
+    @staticmethod
+    def normalize(value):
+        """Case-folded form stored in `username_lower` / `email_lower` for exact lookups"""
+        return value.strip().lower()
+
+    @classmethod
+    def lookup_fields(cls, username, email):
+        """Normalized lookup fields to store alongside `username` and `email`"""
+        return {'username_lower': cls.normalize(username), 'email_lower': cls.normalize(email)}
+
+    def find_by_login(self, identifier, view='login'):
+        """Find a user by username or email, ignoring case"""
+        key = self.normalize(identifier)
+        return self.find_one({'$or': [{'username_lower': key}, {'email_lower': key}]}, view)
+
+    def find_by_email(self, email, view='full', **query):
+        """Find a user by email, ignoring case"""
+        return self.find_one({'email_lower': self.normalize(email), **query}, view)
+
+    def find_existing(self, username, email, view='summary'):
+        """A user that already has this username or email, ignoring case"""
+        fields = self.lookup_fields(username, email)
+        return self.find_one({'$or': [{'username_lower': fields['username_lower']}, {'email_lower': fields['email_lower']}]}, view)
+
+    @classmethod
+    def parse_sort(cls, sort):
+        """(field, descending) from a sort such as `-created_at`"""
+        field = sort.lstrip('-')
+        if field not in cls.sort_fields:
+            raise ValueError(f"Cannot sort users by: {field}")
+        return field, sort.startswith('-')
+
+    def page(self, query=None, sort='-created_at', view='summary', limit=0, after=None):
+        """Cursor over the users matching `query` in `sort` order, resuming after `after`"""
+        field, descending = self.parse_sort(sort)
+        resume = None
+        if after:
+            values = decode_cursor(after)
+            if len(values) != 3 or values[0] != sort or not isinstance(values[2], ObjectId):
+                raise ValueError('Invalid cursor')
+            resume = keyset_after(field, descending, values[1], values[2])
+        direction = DESCENDING if descending else ASCENDING
+        return self.cursor(_and(query, resume), view, sort=[(field, direction), ('_id', direction)], limit=limit)
+
+    @classmethod
+    def page_cursor(cls, user, sort='-created_at'):
+        """Cursor that resumes after `user` (which must still have its ObjectId)"""
+        field, _ = cls.parse_sort(sort)
+        return encode_cursor(sort, user.get(field), user['_id'])
+
+
+class SessionRepository(Repository):
+    collection_name = 'sessions'
+    views = {
+        # Everything the session picker shows, without the designs
+        'summary': {
+            'user_id': 1, 'session_name': 1, 'room_type': 1, 'room_dimensions': 1,
+            'selected_wall': 1, 'created_at': 1, 'updated_at': 1
+        },
+        'full': None
+    }
+
+    # Keyset order for paging; served by the (user_id, updated_at, _id) index
+    page_order = [('updated_at', DESCENDING), ('_id', DESCENDING)]
+    # Fields clients send when saving or updating a session
+    client_fields = ('session_name', 'room_type', 'room_dimensions', 'wall_designs', 'selected_wall')
+
+    @classmethod
+    def fields_from(cls, data):
+        """The client-editable fields of a session from a request body"""
+        return {field: data.get(field) for field in cls.client_fields}
+
+    def page_for_user(self, user_id, view='summary', limit=0, after=None):
+        """Cursor over a user's sessions, most recently updated first, resuming after `after`"""
+        resume = None
+        if after:
+            values = decode_cursor(after)
+            if len(values) != 2 or not isinstance(values[1], ObjectId):
+                raise ValueError('Invalid cursor')
+            resume = keyset_after('updated_at', True, *values)
+        return self.cursor(_and({'user_id': user_id}, resume), view, sort=self.page_order, limit=limit)
+
+    @staticmethod
+    def page_cursor(session):
+        """Cursor that resumes after `session` (which must still have its ObjectId)"""
+        return encode_cursor(session.get('updated_at'), session['_id'])
+
+    def get_for_user(self, session_id, user_id, view='full'):
+        if not ObjectId.is_valid(session_id):
+            return None
+        return self.find_one({'_id': ObjectId(session_id), 'user_id': user_id}, view)
+
+
+
+class FeedbackRepository(Repository):
+    collection_name = 'feedback'
+    views = {
+        # Public feed: no reviewer email (the _id is kept for paging)
+        'public': {'email': 0},
+        'full': None
+    }
+    # Keyset order for paging; `date` is an ISO 8601 string, which sorts chronologically
+    page_order = [('date', DESCENDING), ('_id', DESCENDING)]
+
+    def page(self, view='public', limit=0, after=None):
+        """Cursor over feedback, newest first, resuming after `after`"""
+        resume = None
+        if after:
+            values = decode_cursor(after)
+            if len(values) != 2 or not isinstance(values[1], ObjectId):
+                raise ValueError('Invalid cursor')
+            resume = keyset_after('date', True, *values)
+        return self.cursor(resume or {}, view, sort=self.page_order, limit=limit)
+
+    @staticmethod
+    def page_cursor(entry):
+        """Cursor that resumes after `entry` (which must still have its ObjectId)"""
+        return encode_cursor(entry.get('date'), entry['_id'])
+
+    def rating_stats(self):
+        """Count, average and 1-5 histogram of the ratings"""
+        histogram = {str(rating): 0 for rating in range(1, 6)}
+        for row in self.collection.aggregate([{'$group': {'_id': '$rating', 'count': {'$sum': 1}}}]):
+            if str(row['_id']) in histogram:
+                histogram[str(row['_id'])] = row['count']
+        count = sum(histogram.values())
+        total = sum(int(rating) * n for rating, n in histogram.items())
+        return {
+            'count': count,
+            'average': round(total / count, 2) if count else None,
+            'histogram': histogram
+        }
@@ -0,0 +1,90 @@
+"""
+Local SMTP sink for development and tests.
+
+Accepts every message and keeps it in memory (and optionally writes each one
+to a directory as an .eml file) instead of delivering it. Point the app at it
+with MAIL_SERVER=localhost, MAIL_PORT=1025, MAIL_USE_TLS=false and no
+credentials:
+
+    pip install aiosmtpd
+    python -m services.smtp_sink --port 1025 --output instance/mail
+"""
+import argparse
+import os
+import threading
+import time
+from email import message_from_bytes
+import logging
+
+try:
+    from aiosmtpd.controller import Controller
+except ImportError:  # Only needed when running the sink
+    Controller = None
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+
+class SMTPSink:
+    """aiosmtpd handler that records received messages"""
+
+    def __init__(self, output_dir=None):
+        self.output_dir = output_dir
+        self.messages = []
+        self._received = threading.Condition()
+
+    async def handle_DATA(self, server, session, envelope):
+        message = message_from_bytes(envelope.content)
+        with self._received:
+            self.messages.append({
+                'from': envelope.mail_from,
+                'to': list(envelope.rcpt_tos),
+                'subject': message.get('Subject'),
+                'message': message
+            })
+            count = len(self.messages)
+            self._received.notify_all()
+
+        if self.output_dir:
+            os.makedirs(self.output_dir, exist_ok=True)
+            with open(os.path.join(self.output_dir, f'{time.time_ns()}.eml'), 'wb') as f:
+                f.write(envelope.content)
+        logger.info(f"Received message {count} for {', '.join(envelope.rcpt_tos)}: {message.get('Subject')}")
+        return '250 Message accepted for delivery'
+
+    def wait_for(self, count, timeout=10):
+        """Block until at least `count` messages have arrived; returns whether they did"""
+        with self._received:
+            return self._received.wait_for(lambda: len(self.messages) >= count, timeout)
+
+
+def start_sink(host='127.0.0.1', port=1025, output_dir=None):
+    """Start a sink in a background thread and return (controller, handler)"""
+    if Controller is None:
+        raise RuntimeError('aiosmtpd is not installed (pip install aiosmtpd)')
+    handler = SMTPSink(output_dir)
+    controller = Controller(handler, hostname=host, port=port)
+    controller.start()
+    return controller, handler
+
+
+def main():
+    """Run the sink in the foreground"""
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description='Local SMTP sink')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=1025)
+    parser.add_argument('--output', help='Directory to write received messages to')
+    args = parser.parse_args()
+
+    controller, _ = start_sink(args.host, args.port, args.output)
+    logger.info(f"SMTP sink listening on {args.host}:{args.port}, press Ctrl+C to stop")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        controller.stop()
+
+
+if __name__ == '__main__':
+    main()
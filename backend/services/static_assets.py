@@ -0,0 +1,167 @@
+"""
+Static file serving for the built frontend.
+
+Files under the static root are fingerprinted once at startup into an
+in-memory manifest (path -> content hash), so requests never touch the
+filesystem to find a file. Text assets get precompressed gzip/brotli
+variants, responses carry strong ETags, and Werkzeug handles
+If-None-Match and Range requests.
+"""
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+import threading
+from flask import current_app, request, send_file
+import logging
+
+try:
+    import brotli
+except ImportError:  # Brotli is optional, gzip is always available
+    brotli = None
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+TEXT_EXTENSIONS = {'.html', '.js', '.mjs', '.css', '.svg', '.json', '.txt', '.map', '.xml', '.webmanifest'}
+MIN_COMPRESS_SIZE = 1024  # Not worth compressing below 1KB
+
+# Vite emits content-hashed names such as assets/index-B1a2c3d4.js
+FINGERPRINTED_NAME = re.compile(r'^assets/.+-[0-9A-Za-z_-]{8,}\.\w+$')
+
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+REVALIDATE_CACHE_CONTROL = 'public, no-cache'
+
+VERSION_LENGTH = 12
+
+
+class StaticFile:
+    """Manifest entry for one static file"""
+
+    __slots__ = ('path', 'etag', 'version', 'mimetype', 'fingerprinted', 'variants')
+
+    def __init__(self, path, digest, mimetype, fingerprinted):
+        self.path = path
+        self.etag = digest
+        self.version = digest[:VERSION_LENGTH]
+        self.mimetype = mimetype
+        self.fingerprinted = fingerprinted
+        self.variants = {}
+
+
+class StaticAssets:
+    """Fingerprinted, precompressed view of a static directory"""
+
+    def __init__(self, root, cache_dir, precompress=True):
+        self.root = root
+        self.cache_dir = cache_dir
+        self.precompress = precompress
+        self.files = {}
+        self.built = False
+
+    def build(self):
+        """Hash every file under the root and prepare compressed variants"""
+        files = {}
+        if not os.path.isdir(self.root):
+            logger.warning(f"Static root {self.root} does not exist, no static files will be served")
+            self.files = files
+            self.built = True
+            return
+
+        for dirpath, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                name = os.path.relpath(path, self.root).replace(os.sep, '/')
+                mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+                entry = StaticFile(path, _hash_file(path), mimetype, bool(FINGERPRINTED_NAME.match(name)))
+                if self.precompress and os.path.splitext(filename)[1].lower() in TEXT_EXTENSIONS:
+                    self._compress(entry)
+                files[name] = entry
+
+        self.files = files
+        self.built = True
+        logger.info(f"Static manifest built: {len(files)} files from {self.root}")
+
+    def manifest(self):
+        """Map of path -> version, for building cache-busting `?v=` URLs"""
+        return {name: entry.version for name, entry in self.files.items()}
+
+    def send(self, name):
+        """Build a response for a static path, or return None if it is not in the manifest"""
+        entry = self.files.get(name)
+        if entry is None:
+            return None
+
+        path, etag, encoding = entry.path, entry.etag, None
+        # Ranges are served from the identity file so byte offsets stay meaningful
+        if entry.variants and not request.range:
+            for candidate in ('br', 'gzip'):
+                if candidate in entry.variants and request.accept_encodings[candidate]:
+                    path, etag, encoding = entry.variants[candidate], f'{entry.etag}-{candidate}', candidate
+                    break
+
+        response = send_file(path, mimetype=entry.mimetype, etag=etag, conditional=True)
+        # send_file names the file on disk, which for variants is the cache file
+        response.headers.pop('Content-Disposition', None)
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        if entry.variants:
+            response.vary.add('Accept-Encoding')
+
+        versioned = request.args.get('v') == entry.version
+        response.headers['Cache-Control'] = (
+            IMMUTABLE_CACHE_CONTROL if entry.fingerprinted or versioned else REVALIDATE_CACHE_CONTROL
+        )
+        return response
+
+    def _compress(self, entry):
+        """Write gzip/brotli variants to the cache dir, keyed by content hash"""
+        if os.path.getsize(entry.path) < MIN_COMPRESS_SIZE:
+            return
+
+        encoders = {'gzip': lambda data: gzip.compress(data, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            encoders['br'] = lambda data: brotli.compress(data, quality=11)
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        data = None
+        for encoding, encode in encoders.items():
+            variant_path = os.path.join(self.cache_dir, f'{entry.etag}.{encoding}')
+            if not os.path.exists(variant_path):
+                if data is None:
+                    with open(entry.path, 'rb') as f:
+                        data = f.read()
+                compressed = encode(data)
+                # Skip variants that do not save at least 10%
+                if len(compressed) > len(data) * 0.9:
+                    continue
+                # Workers without a preloading master may compress the same file at once
+                tmp_path = f'{variant_path}.{os.getpid()}.{threading.get_ident()}.tmp'
+                with open(tmp_path, 'wb') as f:
+                    f.write(compressed)
+                os.replace(tmp_path, variant_path)
+            entry.variants[encoding] = variant_path
+
+
+def _hash_file(path):
+    """SHA-256 of a file, read in chunks"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def init_static_assets(app):
+    """Create the static manifest for the app (built by `build()` before serving)"""
+    app.extensions['static_assets'] = StaticAssets(
+        app.config['STATIC_ROOT'],
+        app.config['STATIC_CACHE_DIR'],
+        precompress=app.config.get('STATIC_PRECOMPRESS', True)
+    )
+
+
+def get_static_assets():
+    """Get the static manifest for the current app"""
+    return current_app.extensions['static_assets']
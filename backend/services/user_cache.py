@@ -0,0 +1,219 @@
+"""
+Cache of the user fields needed by `/api/auth/status`.
+
+Entries live in an in-process LRU with a TTL, keyed by user_id, so repeated
+status checks are memory hits. Optionally a SQLite file shared by every
+worker on the host sits behind it (USER_CACHE_SHARED_PATH), capping the
+per-process TTL to USER_CACHE_LOCAL_TTL.
+
+Anything that changes these fields (role, activation, verification, delete)
+must call `invalidate_user(db, user_id)`. Besides dropping the local entry it
+records the user in the `user_cache_invalidations` collection, which every
+worker (on any host) reads at most once per USER_CACHE_SYNC_INTERVAL, so a
+deactivated user is signed out everywhere within about a second.
+"""
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+import bson
+from flask import current_app
+from pymongo.errors import PyMongoError
+from services.repositories import UserRepository
+import logging
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Cached marker for "no such user", so unknown ids are not re-queried either
+_MISSING = {}
+
+# Invalidations are read back this far before the last sync, for clock skew between
+# hosts and writes still in flight
+SYNC_OVERLAP = 2  # seconds
+
+
+class _SharedUserCache:
+    """SQLite-backed cache shared by the worker processes on one host"""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as connection:
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS users (user_id TEXT PRIMARY KEY, data BLOB, expires_at REAL)'
+            )
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=1)
+
+    def _connection(self):
+        # sqlite connections are per thread and must not cross a fork
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = self._connect()
+            self._local.connection, self._local.pid = connection, os.getpid()
+        return connection
+
+    def get(self, user_id):
+        row = self._connection().execute(
+            'SELECT data FROM users WHERE user_id = ? AND expires_at > ?', (user_id, time.time())
+        ).fetchone()
+        return None if row is None else bson.decode(row[0])
+
+    def set(self, user_id, value, ttl):
+        with self._connection() as connection:
+            connection.execute(
+                'INSERT OR REPLACE INTO users (user_id, data, expires_at) VALUES (?, ?, ?)',
+                (user_id, bson.encode(value), time.time() + ttl)
+            )
+
+    def delete(self, user_id):
+        with self._connection() as connection:
+            connection.execute('DELETE FROM users WHERE user_id = ?', (user_id,))
+
+
+class UserCache:
+    """TTL + LRU cache of projected user documents"""
+
+    def __init__(self, ttl=30, max_entries=10000, shared_path=None, local_ttl=5, sync_interval=1):
+        self.shared = _SharedUserCache(shared_path) if shared_path else None
+        self.ttl = ttl
+        self.local_ttl = min(ttl, local_ttl) if self.shared else ttl
+        self.max_entries = max_entries
+        self.sync_interval = sync_interval
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._synced_at = None
+        self.hits = 0
+        self.misses = 0
+
+    def get_user(self, db, user_id):
+        """Projected user document for `user_id`, or None if there is no such user"""
+        user_id = str(user_id)
+        self.sync(db)
+        value = self._get_local(user_id)
+        if value is None and self.shared is not None:
+            value = self._shared_call('get', user_id)
+            if value is not None:
+                self._set_local(user_id, value)
+
+        if value is None:
+            self.misses += 1
+            # Only the fields the status response needs
+            document = UserRepository(db).find_by_id(user_id, view='status')
+            value = document or _MISSING
+            self._set_local(user_id, value)
+            if self.shared is not None:
+                self._shared_call('set', user_id, value, self.ttl)
+        else:
+            self.hits += 1
+
+        return value or None
+
+    def invalidate(self, db, user_id):
+        """Drop a user here and tell every other worker to drop it too"""
+        user_id = str(user_id)
+        with self._lock:
+            self._entries.pop(user_id, None)
+        if self.shared is not None:
+            self._shared_call('delete', user_id)
+        if self.sync_interval:
+            try:
+                db.user_cache_invalidations.insert_one({'user_id': user_id, 'at': datetime.utcnow()})
+            except PyMongoError as e:
+                # The account change itself succeeded; other workers catch up within USER_CACHE_TTL
+                logger.warning(f"Could not broadcast user cache invalidation: {e}")
+
+    def sync(self, db):
+        """Drop users other workers invalidated since the last sync (at most once per sync_interval)"""
+        if not self.sync_interval:
+            return
+        now = time.time()
+        if self._synced_at is not None and now - self._synced_at < self.sync_interval:
+            return
+        # One request per process does the check; the others keep serving from the cache
+        if not self._sync_lock.acquire(blocking=False):
+            return
+        try:
+            since, self._synced_at = self._synced_at, now
+            if since is None:
+                # Nothing was cached before the first sync
+                return
+            invalidations = db.user_cache_invalidations.find(
+                {'at': {'$gte': datetime.utcfromtimestamp(since - SYNC_OVERLAP)}},
+                {'_id': 0, 'user_id': 1}
+            )
+            user_ids = {invalidation['user_id'] for invalidation in invalidations}
+        except PyMongoError as e:
+            logger.warning(f"User cache invalidation sync failed: {e}")
+            self._synced_at = since
+            return
+        finally:
+            self._sync_lock.release()
+
+        with self._lock:
+            for user_id in user_ids:
+                self._entries.pop(user_id, None)
+        # The shared file may hold the old document too (this host did not invalidate,
+        # or a sibling re-filled it with a read that raced the change)
+        if self.shared is not None:
+            for user_id in user_ids:
+                self._shared_call('delete', user_id)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _get_local(self, user_id):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+            return value
+
+    def _set_local(self, user_id, value):
+        with self._lock:
+            self._entries[user_id] = (value, time.monotonic() + self.local_ttl)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _shared_call(self, method, *args):
+        # The shared layer is best-effort; fall back to Mongo if it is unavailable
+        try:
+            return getattr(self.shared, method)(*args)
+        except sqlite3.Error as e:
+            logger.warning(f"Shared user cache {method} failed: {e}")
+            return None
+
+
+def init_user_cache(app):
+    """Create the user cache for the app"""
+    app.extensions['user_cache'] = UserCache(
+        ttl=app.config['USER_CACHE_TTL'],
+        max_entries=app.config['USER_CACHE_MAX_ENTRIES'],
+        shared_path=app.config['USER_CACHE_SHARED_PATH'] or None,
+        local_ttl=app.config['USER_CACHE_LOCAL_TTL'],
+        sync_interval=app.config['USER_CACHE_SYNC_INTERVAL']
+    )
+
+
+def get_user_cache():
+    """Get the user cache for the current app"""
+    return current_app.extensions['user_cache']
+
+
+def invalidate_user(db, user_id):
+    """Drop a user from every worker's cache after changing their account"""
+    get_user_cache().invalidate(db, user_id)
@@ -0,0 +1,75 @@
+"""
+Backfill `username_lower` / `email_lower` on existing users.
+
+Logins, registration and email verification look users up by these
+normalized fields with exact matches, so every user must have them. The
+backfill only touches users missing a field and is safe to run repeatedly.
+It runs as a migration of `python -m configs.schema apply`, which also builds
+the fields' unique indexes.
+"""
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from services.repositories import UserRepository
+import logging
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+LOOKUP_FIELDS = ('username_lower', 'email_lower')
+
+
+def find_conflicts(db, field):
+    """Values of `field` shared by more than one user (accounts differing only by case)"""
+    pipeline = [
+        {'$match': {field: {'$exists': True}}},
+        {'$group': {'_id': f'${field}', 'users': {'$push': '$_id'}, 'count': {'$sum': 1}}},
+        {'$match': {'count': {'$gt': 1}}}
+    ]
+    return list(db.users.aggregate(pipeline, allowDiskUse=True))
+
+
+def _write_batch(db, batch, ids, failed):
+    """Apply one backfill batch; ids the unique indexes rejected are added to `failed`"""
+    try:
+        return db.users.bulk_write(batch, ordered=False).modified_count
+    except BulkWriteError as e:
+        failed.extend(ids[error['index']] for error in e.details['writeErrors'])
+        return e.details['nModified']
+
+
+def backfill_lookup_fields(db, batch_size=1000):
+    """Set the normalized fields on users missing them; returns (updated count, ids that collided)"""
+    missing = {'$or': [{field: {'$exists': False}} for field in LOOKUP_FIELDS]}
+    updated = 0
+    failed = []
+    batch, ids = [], []
+    for user in db.users.find(missing, {'username': 1, 'email': 1}):
+        fields = UserRepository.lookup_fields(user.get('username') or '', user.get('email') or '')
+        batch.append(UpdateOne({'_id': user['_id']}, {'$set': fields}))
+        ids.append(user['_id'])
+        if len(batch) >= batch_size:
+            updated += _write_batch(db, batch, ids, failed)
+            batch, ids = [], []
+    if batch:
+        updated += _write_batch(db, batch, ids, failed)
+
+    if updated:
+        logger.info(f"Backfilled lookup fields on {updated} users")
+    return updated, failed
+
+
+def migrate_user_lookup(db):
+    """Backfill the lookup fields; False if accounts collide"""
+    _, failed = backfill_lookup_fields(db)
+    for user_id in failed:
+        logger.error(f"User {user_id} differs only by case from another account; rename it and run the migration again")
+
+    conflicts = []
+    for field in LOOKUP_FIELDS:
+        for conflict in find_conflicts(db, field):
+            conflicts.append(conflict)
+            logger.error(
+                f"Users {', '.join(str(user_id) for user_id in conflict['users'])} "
+                f"share {field} {conflict['_id']!r}; rename one and run the migration again"
+            )
+    return not (failed or conflicts)
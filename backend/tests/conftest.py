@@ -0,0 +1,7 @@
+import os
+import sys
+
+# Import the app's packages (configs, services, routes) the way routes/app.py does
+backend_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if backend_path not in sys.path:
+    sys.path.insert(0, backend_path)
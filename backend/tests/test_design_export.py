@@ -0,0 +1,39 @@
+"""
+Element geometry from stored designs is sanitized before the render pool sees it.
+"""
+import pytest
+from services.design_export import (
+    CANVAS_SIZE, MAX_ELEMENT_SIZE, MIN_OFFSET, build_render_specs, render_wall
+)
+
+
+def element_spec(**element):
+    specs = build_render_specs({'front': {'elements': [{'type': 'frame', **element}]}})
+    return specs[0][1]['elements'][0]
+
+
+@pytest.mark.parametrize('value', ['nan', 'inf', '-inf', float('nan'), float('inf'), 10 ** 400, 'wide', None, [1]])
+def test_non_finite_and_non_numeric_values_fall_back_to_defaults(value):
+    element = element_spec(x=value, y=value, width=value, height=value, rotation=value)
+    assert (element['x'], element['y'], element['rotation']) == (0, 0, 0)
+    assert (element['width'], element['height']) == (100, 100)
+
+
+def test_sizes_and_offsets_are_clamped_to_the_canvas():
+    element = element_spec(x=1e9, y=-1e9, width=100000, height=-5)
+    assert element['x'] == CANVAS_SIZE[0]
+    assert element['y'] == MIN_OFFSET
+    assert (element['width'], element['height']) == (MAX_ELEMENT_SIZE, 1)
+
+
+def test_numeric_strings_and_rotation_are_normalized():
+    element = element_spec(x='12.5', width='40', rotation=-90)
+    assert (element['x'], element['width'], element['rotation']) == (12.5, 40, 270)
+
+
+def test_oversized_element_renders_at_canvas_size():
+    pytest.importorskip('PIL')
+    spec = build_render_specs({'front': {'elements': [
+        {'type': 'frame', 'x': 'nan', 'y': -1e12, 'width': 100000, 'height': 100000, 'rotation': 'inf'}
+    ]}})[0][1]
+    assert render_wall(spec).startswith(b'\x89PNG')
@@ -0,0 +1,239 @@
+"""
+Token bucket limits: bucket math in both stores, Retry-After, per-account keys,
+X-Forwarded-For handling and one throttled request through Flask.
+"""
+import pytest
+from flask import Flask, jsonify
+from services import rate_limit
+from services.rate_limit import Limit, MemoryStore, RateLimiter, RedisStore, init_rate_limiter
+
+
+class FakeClock:
+    """Stands in for the `time` module inside services.rate_limit"""
+
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def monotonic(self):
+        return self.now
+
+    def time(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(rate_limit, 'time', clock)
+    return clock
+
+
+@pytest.fixture(params=['memory', 'redis'])
+def store(request, clock, monkeypatch):
+    if request.param == 'memory':
+        return MemoryStore()
+    fakeredis = pytest.importorskip('fakeredis')
+    pytest.importorskip('lupa')  # fakeredis runs the Lua script through lupa
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr(
+        rate_limit.redis.Redis, 'from_url', lambda url, **kwargs: fakeredis.FakeRedis(server=server)
+    )
+    return RedisStore('redis://rate-limit-test')
+
+
+def make_app(**config):
+    app = Flask(__name__)
+    app.config.from_object('configs.config.Config')
+    app.config.update({
+        'RATE_LIMIT_ENABLED': True,
+        'RATE_LIMIT_STORAGE_URL': '',
+        'RATE_LIMIT_PROXY_COUNT': 0,
+        'RATE_LIMIT_LOGIN_IP': '100/minute',
+        'RATE_LIMIT_LOGIN_ACCOUNT': '100/minute',
+        **config
+    })
+    init_rate_limiter(app)
+
+    @app.route('/login', methods=['POST'])
+    @rate_limit.rate_limit('login', account_field='username')
+    def login():
+        return jsonify({'ok': True})
+
+    return app
+
+
+@pytest.mark.parametrize('spec, capacity, period', [
+    ('10/minute', 10, 60),
+    ('5/15minutes', 5, 900),
+    (' 3 / 2 hours ', 3, 7200),
+    ('1/second', 1, 1)
+])
+def test_limit_parses_capacity_and_period(spec, capacity, period):
+    limit = Limit(spec)
+    assert (limit.capacity, limit.period) == (capacity, period)
+    assert limit.rate == pytest.approx(capacity / period)
+
+
+@pytest.mark.parametrize('spec', ['10', '10/fortnight', 'ten/minute', '10/minute/ip'])
+def test_limit_rejects_invalid_specs(spec):
+    with pytest.raises(ValueError):
+        Limit(spec)
+
+
+def test_bucket_allows_a_burst_then_waits_for_refill(store, clock):
+    limit = Limit('3/minute')  # one token every 20 seconds
+
+    assert [store.take('k', limit) for _ in range(3)] == [0, 0, 0]
+    assert store.take('k', limit) == pytest.approx(20)
+
+    # Denied requests take nothing, so the wait shrinks as time passes
+    clock.advance(15)
+    assert store.take('k', limit) == pytest.approx(5)
+    clock.advance(5)
+    assert store.take('k', limit) == 0
+    assert store.take('k', limit) == pytest.approx(20)
+
+
+def test_bucket_refills_no_further_than_capacity(store, clock):
+    limit = Limit('2/minute')
+    store.take('k', limit)
+    store.take('k', limit)
+
+    clock.advance(3600)
+    assert [store.take('k', limit) for _ in range(2)] == [0, 0]
+    assert store.take('k', limit) == pytest.approx(30)
+
+
+def test_buckets_are_independent_per_key(store, clock):
+    limit = Limit('1/minute')
+    assert store.take('a', limit) == 0
+    assert store.take('a', limit) > 0
+    assert store.take('b', limit) == 0
+
+
+def test_reset_empties_every_bucket(store, clock):
+    limit = Limit('1/minute')
+    store.take('k', limit)
+    store.reset()
+    assert store.take('k', limit) == 0
+
+
+def test_memory_store_evicts_least_recently_used(clock):
+    store = MemoryStore(max_keys=2)
+    limit = Limit('1/minute')
+    store.take('a', limit)
+    store.take('b', limit)
+    store.take('a', limit)  # 'b' is now the least recently used
+    store.take('c', limit)
+
+    assert store.take('a', limit) > 0
+    assert store.take('b', limit) == 0
+
+
+def test_redis_buckets_expire_once_full_again(clock, monkeypatch):
+    fakeredis = pytest.importorskip('fakeredis')
+    pytest.importorskip('lupa')
+    client = fakeredis.FakeRedis()
+    monkeypatch.setattr(rate_limit.redis.Redis, 'from_url', lambda url, **kwargs: client)
+    store = RedisStore('redis://rate-limit-test')
+
+    store.take('k', Limit('3/minute'))
+    # One token to refill at 20s each, plus a second of slack
+    assert 20000 < client.pttl('ratelimit:k') <= 21000
+
+
+class RecordingStore:
+    def __init__(self, wait=0):
+        self.wait = wait
+        self.keys = []
+
+    def take(self, key, limit):
+        self.keys.append(key)
+        return self.wait
+
+
+def test_account_keys_ignore_case_and_surrounding_space():
+    app = make_app()
+    store = RecordingStore()
+    limiter = RateLimiter(app, store=store)
+    with app.test_request_context('/login', environ_base={'REMOTE_ADDR': '10.0.0.1'}):
+        limiter.check('login', '  Bob@Example.COM ')
+        limiter.check('login', 'bob@example.com')
+
+    assert store.keys == ['login:ip:10.0.0.1', 'login:account:bob@example.com'] * 2
+
+
+def test_account_is_not_charged_once_the_ip_is_throttled():
+    app = make_app()
+    store = RecordingStore(wait=5)
+    limiter = RateLimiter(app, store=store)
+    with app.test_request_context('/login', environ_base={'REMOTE_ADDR': '10.0.0.1'}):
+        assert limiter.check('login', 'bob') == 5
+    assert store.keys == ['login:ip:10.0.0.1']
+
+
+@pytest.mark.parametrize('proxy_count, forwarded_for, expected', [
+    # Without trusted proxies the header is ignored (it is client-controlled)
+    (0, '1.1.1.1', '10.0.0.1'),
+    # One proxy: the address it appended, not whatever the client put before it
+    (1, '6.6.6.6, 1.1.1.1', '1.1.1.1'),
+    (2, '6.6.6.6, 1.1.1.1, 172.16.0.5', '1.1.1.1'),
+    # Fewer entries than proxies: the request did not come through all of them
+    (2, '1.1.1.1', '10.0.0.1'),
+    (1, None, '10.0.0.1')
+])
+def test_client_ip_honours_rate_limit_proxy_count(proxy_count, forwarded_for, expected):
+    app = make_app(RATE_LIMIT_PROXY_COUNT=proxy_count)
+    headers = {'X-Forwarded-For': forwarded_for} if forwarded_for else {}
+    with app.test_request_context('/login', headers=headers, environ_base={'REMOTE_ADDR': '10.0.0.1'}):
+        assert app.extensions['rate_limiter'].client_ip() == expected
+
+
+def test_throttled_request_gets_429_with_retry_after(clock):
+    app = make_app(RATE_LIMIT_LOGIN_IP='2/minute')
+    client = app.test_client()
+
+    assert client.post('/login', json={'username': 'bob'}).status_code == 200
+    assert client.post('/login', json={'username': 'bob'}).status_code == 200
+    response = client.post('/login', json={'username': 'bob'})
+    assert response.status_code == 429
+    assert response.headers['Retry-After'] == '30'
+    assert response.get_json()['retry_after'] == 30
+
+    # Retry-After is rounded up to whole seconds, never below 1
+    clock.advance(29.9)
+    response = client.post('/login', json={'username': 'bob'})
+    assert response.status_code == 429
+    assert response.headers['Retry-After'] == '1'
+
+    clock.advance(0.1)
+    assert client.post('/login', json={'username': 'bob'}).status_code == 200
+
+
+def test_account_limit_applies_across_ips(clock):
+    app = make_app(RATE_LIMIT_LOGIN_ACCOUNT='1/minute')
+    client = app.test_client()
+
+    assert client.post('/login', json={'username': 'Bob'}, environ_base={'REMOTE_ADDR': '10.0.0.1'}).status_code == 200
+    response = client.post('/login', json={'username': 'bob '}, environ_base={'REMOTE_ADDR': '10.0.0.2'})
+    assert response.status_code == 429
+    assert response.headers['Retry-After'] == '60'
+
+
+def test_disabled_limiter_never_throttles(clock):
+    app = make_app(RATE_LIMIT_ENABLED=False, RATE_LIMIT_LOGIN_IP='1/minute')
+    client = app.test_client()
+    assert [client.post('/login', json={}).status_code for _ in range(3)] == [200, 200, 200]
+
+
+def test_store_errors_fail_open(clock):
+    class BrokenStore:
+        def take(self, key, limit):
+            raise ConnectionError('redis is down')
+
+    app = make_app()
+    app.extensions['rate_limiter'] = RateLimiter(app, store=BrokenStore())
+    assert app.test_client().post('/login', json={'username': 'bob'}).status_code == 200
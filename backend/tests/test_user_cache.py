@@ -0,0 +1,57 @@
+"""
+Cross-worker invalidation of the user cache, including the shared SQLite layer.
+"""
+import time
+import pytest
+from bson import ObjectId
+from services.user_cache import UserCache
+
+mongomock = pytest.importorskip('mongomock')
+
+
+@pytest.fixture
+def db():
+    db = mongomock.MongoClient().db
+    db.users.insert_one({'_id': ObjectId(), 'username': 'bob', 'email': 'bob@example.com', 'role': 'user', 'is_active': True})
+    return db
+
+
+def wait_for_sync(*caches):
+    time.sleep(max(cache.sync_interval for cache in caches) * 2)
+
+
+def test_sync_drops_users_invalidated_on_another_host_from_the_shared_file(db, tmp_path):
+    user_id = str(db.users.find_one()['_id'])
+    # Two workers on this host share one SQLite file; the change is made on another host
+    path = str(tmp_path / 'users.sqlite')
+    first = UserCache(shared_path=path, sync_interval=0.05)
+    second = UserCache(shared_path=path, sync_interval=0.05)
+    elsewhere = UserCache(sync_interval=0.05)
+
+    assert first.get_user(db, user_id)['is_active'] is True
+    assert second.get_user(db, user_id)['is_active'] is True
+
+    db.users.update_one({'_id': ObjectId(user_id)}, {'$set': {'is_active': False}})
+    elsewhere.invalidate(db, user_id)
+    wait_for_sync(first, second)
+
+    assert first.get_user(db, user_id)['is_active'] is False
+    assert second.get_user(db, user_id)['is_active'] is False
+
+
+def test_sync_drops_a_shared_entry_refilled_by_a_racing_read(db, tmp_path):
+    user_id = str(db.users.find_one()['_id'])
+    path = str(tmp_path / 'users.sqlite')
+    first = UserCache(shared_path=path, sync_interval=0.05)
+    second = UserCache(shared_path=path, sync_interval=0.05)
+    first.get_user(db, user_id)
+    second.get_user(db, user_id)
+
+    stale = dict(first.get_user(db, user_id))
+    db.users.update_one({'_id': ObjectId(user_id)}, {'$set': {'role': 'admin'}})
+    first.invalidate(db, user_id)
+    # A read that started before the change writes the old document back afterwards
+    first.shared.set(user_id, stale, first.ttl)
+    wait_for_sync(first, second)
+
+    assert second.get_user(db, user_id)['role'] == 'admin'
@@ -17,13 +17,17 @@ const AdminPanel = ({ user, onClose }) => {
   const [activeTab, setActiveTab] = useState('dashboard');
   // RTK Query hooks
   const { data: statsData, isLoading: isLoadingStats, refetch: refetchStats } = useGetAdminStatsQuery();
-  const { data: usersData = [], isLoading: isLoadingUsers, refetch: refetchUsers } = useGetAdminUsersQuery();
+  const [searchTerm, setSearchTerm] = useState('');
+  const [userQuery, setUserQuery] = useState('');
+  // `after` cursor of the page shown, and of each page before it (for "Previous")
+  const [userPageAfter, setUserPageAfter] = useState(undefined);
+  const [previousUserPages, setPreviousUserPages] = useState([]);
+  const { data: usersData = [], isLoading: isLoadingUsers, refetch: refetchUsers } = useGetAdminUsersQuery({ q: userQuery, after: userPageAfter });
   const [createAdminUser] = useCreateAdminUserMutation();
   const [deleteAdminUser] = useDeleteAdminUserMutation();
   const [promoteAdminUser] = usePromoteAdminUserMutation();
   const [demoteAdminUser] = useDemoteAdminUserMutation();
   
-  const [searchTerm, setSearchTerm] = useState('');
   const [isLoading, setIsLoading] = useState(false);
   const [error, setError] = useState('');
   
@@ -144,12 +148,32 @@ const AdminPanel = ({ user, onClose }) => {
     );
   };
 
-  // Filter users based on search term
-  const filteredUsers = users.filter(user => 
-    user.username.toLowerCase().includes(searchTerm.toLowerCase()) ||
-    user.email.toLowerCase().includes(searchTerm.toLowerCase()) ||
-    user.role.toLowerCase().includes(searchTerm.toLowerCase())
-  );
+  // Search usernames/emails on the server once typing pauses
+  useEffect(() => {
+    const timer = setTimeout(() => setUserQuery(searchTerm.trim()), 300);
+    return () => clearTimeout(timer);
+  }, [searchTerm]);
+
+  // A new search starts again from its first page
+  useEffect(() => {
+    setUserPageAfter(undefined);
+    setPreviousUserPages([]);
+  }, [userQuery]);
+
+  // The server returns one page of matches
+  const filteredUsers = users;
+  const hasMoreUsers = Boolean(usersData.next_cursor);
+
+  const showNextUsers = () => {
+    setPreviousUserPages(pages => [...pages, userPageAfter]);
+    setUserPageAfter(usersData.next_cursor);
+  };
+
+  const showPreviousUsers = () => {
+    setUserPageAfter(previousUserPages[previousUserPages.length - 1]);
+    setPreviousUserPages(pages => pages.slice(0, -1));
+  };
+  const exportUrl = `${API_BASE_URL}/api/admin/users/export${userQuery ? `?q=${encodeURIComponent(userQuery)}` : ''}`;
 
   // Refetch data when tab changes
   useEffect(() => {
@@ -160,6 +184,28 @@ const AdminPanel = ({ user, onClose }) => {
     }
   }, [activeTab, refetchStats, refetchUsers]);
 
+  // Daily counts from the stats document as a small bar chart
+  const renderTrend = (title, series = []) => {
+    const max = Math.max(1, ...series.map(day => day.count));
+    const total = series.reduce((sum, day) => sum + day.count, 0);
+    return (
+      <div className="stat-card trend-card">
+        <h4>{title}</h4>
+        <div className="trend-total">{total} in the last {series.length} days</div>
+        <div className="trend-bars">
+          {series.map(day => (
+            <div
+              key={day.date}
+              className="trend-bar"
+              style={{ height: `${(day.count / max) * 100}%` }}
+              title={`${day.date}: ${day.count}`}
+            />
+          ))}
+        </div>
+      </div>
+    );
+  };
+
   const renderDashboard = () => {
     console.log('Stats data:', statsData);
     
@@ -199,6 +245,17 @@ const AdminPanel = ({ user, onClose }) => {
                 {(stats.total_users - (stats.admin_users || 0)) || 0}
               </div>
             </div>
+            <div className="stat-card">
+              <h4>✅ Verified Users</h4>
+              <div className="stat-value">{stats.verified_users || 0}</div>
+            </div>
+            {renderTrend('🆕 Signups per day', stats.signups_per_day)}
+            {renderTrend('🗂️ Sessions per day', stats.sessions_per_day)}
+            {stats.generated_at && (
+              <div className="stats-updated">
+                Updated {new Date(stats.generated_at).toLocaleTimeString()}
+              </div>
+            )}
           </div>
         ) : (
           <div className="no-data">No statistics data available</div>
@@ -214,19 +271,17 @@ const AdminPanel = ({ user, onClose }) => {
         <div className="search-container">
           <input
             type="text"
-            placeholder="Search users by name, email, or role..."
+            placeholder="Search users by username or email prefix..."
             value={searchTerm}
             onChange={(e) => setSearchTerm(e.target.value)}
             className="search-input"
           />
           <span className="search-icon">🔍</span>
         </div>
+        <a className="export-users-link" href={exportUrl} download>
+          ⬇️ Export CSV
+        </a>
       </div>
-      {searchTerm && (
-        <div className="search-results-info">
-          Showing {filteredUsers.length} of {users.length} users
-        </div>
-      )}
       {isLoading ? (
         <div className="loading">Loading users...</div>
       ) : error ? (
@@ -283,6 +338,17 @@ const AdminPanel = ({ user, onClose }) => {
           )}
         </div>
       )}
+      {(hasMoreUsers || previousUserPages.length > 0) && (
+        <div className="users-pagination">
+          <button className="page-btn" onClick={showPreviousUsers} disabled={previousUserPages.length === 0}>
+            ← Previous
+          </button>
+          <span className="page-number">Page {previousUserPages.length + 1}</span>
+          <button className="page-btn" onClick={showNextUsers} disabled={!hasMoreUsers}>
+            Next →
+          </button>
+        </div>
+      )}
     </div>
   );
 
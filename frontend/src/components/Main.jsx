@@ -4,6 +4,7 @@ import { v4 as uuidv4 } from "uuid";
 import { useNavigate } from "react-router-dom";
 import { 
   useSaveWallDesignsMutation,
+  usePatchWallDesignsMutation,
   useGetWallDesignsQuery,
   useGetSessionsQuery,
   useGetSessionQuery,
@@ -20,6 +21,7 @@ import AlertModal from "./AlertModal";
 import InputModal from "./InputModal";
 import AdminPanel from "./AdminPanel";
 import { API_BASE_URL } from '../config';
+import { buildDesignPatch } from '../utils/designPatch';
 import "./Main.css";
 
 // Helper to generate a random color (same as in Canvas.jsx)
@@ -272,19 +274,40 @@ const Main = ({ user, onLogout }) => {
   const [saveWallDesigns, { isLoading: isSaving }] = useSaveWallDesignsMutation();
   const { data: wallDesignsData, isLoading: isLoadingWallDesigns } = useGetWallDesignsQuery();
 
+  const [patchWallDesigns] = usePatchWallDesignsMutation();
+  // Last state acknowledged by the backend, used to send patches instead of full saves
+  const lastSavedRef = useRef(null);
+
   // Function to save wall designs to backend
   const saveWallDesignsToBackend = useCallback(async (designs) => {
+    const lastSaved = lastSavedRef.current;
+    const meta = JSON.stringify({ roomType, roomDimensions, selectedWall });
     try {
-      await saveWallDesigns({
+      if (lastSaved && lastSaved.revision > 0 && lastSaved.meta === meta) {
+        const operations = buildDesignPatch(lastSaved.designs, designs);
+        if (operations && operations.length === 0) return;
+        if (operations) {
+          try {
+            const result = await patchWallDesigns({ baseRevision: lastSaved.revision, operations }).unwrap();
+            lastSavedRef.current = { designs, meta, revision: result.revision };
+            return;
+          } catch (patchError) {
+            // Stale revision or unsupported change - fall back to a full save
+            console.warn('Wall design patch rejected, sending full design:', patchError);
+          }
+        }
+      }
+      const result = await saveWallDesigns({
         wallDesigns: designs,
         roomType,
         roomDimensions,
         selectedWall
       }).unwrap();
+      lastSavedRef.current = { designs, meta, revision: result.revision };
     } catch (error) {
       console.error('Error saving wall designs to backend:', error);
     }
-  }, [roomType, roomDimensions, selectedWall, saveWallDesigns]);
+  }, [roomType, roomDimensions, selectedWall, saveWallDesigns, patchWallDesigns]);
 
   // Load wall designs from backend on component mount
   useEffect(() => {
@@ -293,6 +316,15 @@ const Main = ({ user, onLogout }) => {
       setRoomType(wallDesignsData.roomType || "");
       setRoomDimensions(wallDesignsData.roomDimensions || { length: 8, width: 8, height: 4 });
       setSelectedWall(wallDesignsData.selectedWall || "");
+      lastSavedRef.current = {
+        designs: wallDesignsData.wallDesigns,
+        meta: JSON.stringify({
+          roomType: wallDesignsData.roomType || "",
+          roomDimensions: wallDesignsData.roomDimensions || { length: 8, width: 8, height: 4 },
+          selectedWall: wallDesignsData.selectedWall || ""
+        }),
+        revision: wallDesignsData.revision || 0
+      };
     }
   }, [wallDesignsData]);
 
@@ -3,6 +3,8 @@ import Cropper from "react-easy-crop";
 import html2canvas from "html2canvas";
 import AlertModal from "./AlertModal";
 import { useNavigate } from 'react-router-dom';
+import { thumbnailUrl, fallbackToOriginal } from '../utils/thumbnails';
+import { API_BASE_URL } from '../config';
 
 const initialFrames = [
   { type: "rectangle", label: "Square" },
@@ -224,6 +226,25 @@ const Sidebar = ({ addFrame, addSticker, stickers, stickerCategories = [], setWa
       }
 
       console.log(`Found ${editedWalls.length} edited walls:`, editedWalls.map(([wall]) => wall));
+
+      // Prefer the server-rendered export of the saved design; render in the browser if it is unavailable
+      try {
+        const response = await fetch(`${API_BASE_URL}/api/designs/wall-designs/export`, { credentials: 'include' });
+        if (response.ok) {
+          const zipBlob = await response.blob();
+          const link = document.createElement('a');
+          link.href = URL.createObjectURL(zipBlob);
+          link.download = `all-wall-designs-${new Date().toISOString().slice(0, 19).replace(/:/g, '-')}.zip`;
+          document.body.appendChild(link);
+          link.click();
+          document.body.removeChild(link);
+          showAlert('Success', `All wall designs downloaded successfully! ${editedWalls.length} wall(s) included.`, 'success');
+          return;
+        }
+        console.warn(`Server export unavailable (${response.status}), rendering in the browser`);
+      } catch (error) {
+        console.warn('Server export failed, rendering in the browser:', error);
+      }
       
       // Create a zip file to contain all wall designs
       const JSZip = await import('jszip');
@@ -635,11 +656,14 @@ const Sidebar = ({ addFrame, addSticker, stickers, stickerCategories = [], setWa
                 name={`wallpaper-${design.name.toLowerCase().replace(/\s+/g, '-')}`}
                 onClick={() => setWallpaper(design.path)}
                 style={{
+                  position: "relative",
+                  overflow: "hidden",
+                  padding: 0,
                   width: 56,
                   height: 56,
                   border: "1px solid #ccc",
                   borderRadius: 8,
-                  background: `url(${design.path}) center/cover`,
+                  background: "#fff",
                   cursor: "pointer",
                   fontSize: 10,
                   color: "white",
@@ -652,7 +676,14 @@ const Sidebar = ({ addFrame, addSticker, stickers, stickerCategories = [], setWa
                 title={design.name}
                 aria-label={`Select ${design.name} wallpaper`}
               >
-                {design.name}
+                {/* Small WebP swatch instead of the full-size wallpaper, like the sticker tiles */}
+                <img
+                  src={thumbnailUrl(design.path)}
+                  onError={fallbackToOriginal(design.path)}
+                  alt=""
+                  style={{ position: "absolute", inset: 0, width: "100%", height: "100%", objectFit: "cover" }}
+                />
+                <span style={{ position: "relative" }}>{design.name}</span>
               </button>
             ))}
           </div>
@@ -788,7 +819,8 @@ const Sidebar = ({ addFrame, addSticker, stickers, stickerCategories = [], setWa
         {(stickers[selectedCategory] || []).map((src) => (
           <img
             key={src}
-            src={src}
+            src={thumbnailUrl(src)}
+            onError={fallbackToOriginal(src)}
             alt={`Sticker from ${selectedCategory} category`}
             className="sticker-thumb"
             onClick={() => isSelectionComplete && addSticker(src)}
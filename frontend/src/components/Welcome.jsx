@@ -35,6 +35,7 @@ const Welcome = ({ onLogin, onRegister }) => {
 
   // Map the feedback data to match the expected format
   const feedbackList = feedbackResponse.data || [];
+  const ratingStats = feedbackResponse.stats;
 
   const reviewsPerPage = 3;
   const totalReviewPages = Math.ceil(feedbackList.length / reviewsPerPage);
@@ -365,6 +366,11 @@ const Welcome = ({ onLogin, onRegister }) => {
         {/* Reviews Section */}
         <div className="reviews-section">
           <h2 className="section-title">What Our Users Say</h2>
+          {ratingStats?.count > 0 && (
+            <p className="reviews-summary">
+              ★ {ratingStats.average} average from {ratingStats.count} review{ratingStats.count > 1 ? 's' : ''}
+            </p>
+          )}
           {feedbackList.length > 0 ? (
             <div className="reviews-carousel">
               <button 
@@ -143,7 +143,11 @@ export const apiSlice = createApi({
     }),
     
     getAdminUsers: builder.query({
-      query: () => '/api/admin/users',
+      // Server-side search on username/email prefix; returns one page plus next_cursor
+      query: ({ q = '', after } = {}) => ({
+        url: '/api/admin/users',
+        params: { ...(q && { q }), ...(after && { after }) },
+      }),
       providesTags: ['Users'],
     }),
     
@@ -205,6 +209,14 @@ export const apiSlice = createApi({
       invalidatesTags: ['WallDesign'],
     }),
     
+    patchWallDesigns: builder.mutation({
+      query: ({ baseRevision, operations }) => ({
+        url: '/api/designs/wall-designs',
+        method: 'PATCH',
+        body: { baseRevision, operations },
+      }),
+    }),
+    
     getWallDesigns: builder.query({
       query: () => '/api/designs/wall-designs',
       providesTags: ['WallDesign'],
@@ -231,6 +243,7 @@ export const {
   useSaveDesignMutation,
   useGetDesignsQuery,
   useSaveWallDesignsMutation,
+  usePatchWallDesignsMutation,
   useGetWallDesignsQuery,
   useLazyGetWallDesignsQuery,
   // Feedback
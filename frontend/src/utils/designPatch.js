@@ -0,0 +1,54 @@
+// Builds element-level patch operations for PATCH /api/designs/wall-designs
+// by diffing the last saved wall designs against the current ones.
+
+const WALLS = ['front', 'back', 'left', 'right'];
+const MOVE_FIELDS = ['x', 'y'];
+const RESIZE_FIELDS = ['width', 'height', 'x', 'y'];
+
+const changedFields = (before, after) => {
+  const keys = new Set([...Object.keys(before), ...Object.keys(after)]);
+  return [...keys].filter((key) => JSON.stringify(before[key]) !== JSON.stringify(after[key]));
+};
+
+// Returns a list of operations, or null when the change cannot be expressed
+// as a patch (e.g. an element's image or style changed) and a full save is needed.
+export const buildDesignPatch = (previous, current) => {
+  const operations = [];
+
+  for (const wall of WALLS) {
+    const before = previous?.[wall] || { elements: [], wallpaper: null };
+    const after = current?.[wall] || { elements: [], wallpaper: null };
+
+    if ((before.wallpaper || null) !== (after.wallpaper || null)) {
+      operations.push({ op: 'set_wallpaper', wall, wallpaper: after.wallpaper || null });
+    }
+
+    const beforeById = new Map((before.elements || []).map((el) => [el.id, el]));
+    const afterIds = new Set((after.elements || []).map((el) => el.id));
+
+    for (const el of before.elements || []) {
+      if (!afterIds.has(el.id)) {
+        operations.push({ op: 'delete', wall, id: el.id });
+      }
+    }
+
+    for (const el of after.elements || []) {
+      const old = beforeById.get(el.id);
+      if (!old) {
+        operations.push({ op: 'add', wall, element: el });
+        continue;
+      }
+      const fields = changedFields(old, el);
+      if (fields.length === 0) continue;
+      if (fields.every((field) => MOVE_FIELDS.includes(field))) {
+        operations.push({ op: 'move', wall, id: el.id, x: el.x, y: el.y });
+      } else if (fields.every((field) => RESIZE_FIELDS.includes(field))) {
+        operations.push({ op: 'resize', wall, id: el.id, width: el.width, height: el.height, x: el.x, y: el.y });
+      } else {
+        return null;
+      }
+    }
+  }
+
+  return operations;
+};
@@ -0,0 +1,16 @@
+import { API_BASE_URL } from '../config';
+
+// Resized WebP variant of a catalog image (e.g. "/images/candle1.png"),
+// rendered and cached by GET /api/assets/<path>?w=&fmt=webp.
+export const thumbnailUrl = (path, width = 128) => {
+  if (!path || !path.startsWith('/') || !API_BASE_URL) return path;
+  const base = API_BASE_URL.replace(/\/+$/, '');
+  return `${base}/api/assets${path}?w=${width}&fmt=webp`;
+};
+
+// <img onError> handler that falls back to the original image once
+export const fallbackToOriginal = (path) => (e) => {
+  if (e.currentTarget.src !== new URL(path, window.location.href).href) {
+    e.currentTarget.src = path;
+  }
+};